@@ -1,56 +1,128 @@
-import datetime
-import pytz
-
+import numpy as np
+import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
+import column_schema
+from service_time import ServiceTime
+from sorted_key_index import SortedKeyIndex
+
+# The columns the TimestampEncoder parses the timestamps into
+TIME_COLUMNS = ['epoch_seconds', 'service_date']
+
 
 class ActualsAdder(BaseEstimator, TransformerMixin):
     def __init__(self, actuals_frame):
         self.actuals_frame = actuals_frame
 
+    # Deduplicating the actuals, finding their service dates and sorting them
+    # by trip and service date doesn't depend on the datapoints being
+    # transformed, so it's done once here. Each (trip, service date) is given
+    # an integer key, and the actuals for each key end up contiguous.
     def fit(self, X, y=None):
+        actuals = self._add_service_date(self._load_actuals(), 'time')
+        trip_codes, trip_ids = pd.factorize(actuals['gtfs_trip_id'])
+        service_dates = actuals['service_date'].to_numpy()
+
+        self.trip_ids_ = pd.Index(np.asarray(trip_ids))
+        self.first_service_date_ = service_dates.min() \
+            if len(service_dates) else 0
+        self.n_service_dates_ = service_dates.max() - \
+            self.first_service_date_ + 1 if len(service_dates) else 0
+
+        keys = self._keys(trip_codes, service_dates)
+        order = np.argsort(keys, kind='stable')
+        self.actuals_ = actuals.iloc[order].reset_index(drop=True)
+        self.actuals_index_ = SortedKeyIndex(keys[order])
         return self
 
-    # Join actuals to a set of vehicle datapoints
+    # Join actuals to a set of vehicle datapoints. Each datapoint gathers the
+    # actuals for its trip on its service date, keeping only the ones that
+    # happen after it, so the columns of the joined frame are only built for
+    # the rows that are kept.
     def transform(self, vehicle_datapoints, y=None):
-        actuals = self._load_actuals()
-
-        vehicle_datapoints["gtfs_trip_id"] = \
-            vehicle_datapoints["gtfs_trip_id"].astype(str)
-        vehicle_datapoints["timestamp"] = \
-            vehicle_datapoints["timestamp"].apply(
-                lambda str: datetime.datetime.strptime(
-                    str,
-                    "%Y-%m-%dT%H:%M:%S.%fZ"
-                ).replace(tzinfo=pytz.UTC).timestamp()
+        vehicle_datapoints = vehicle_datapoints.assign(
+            gtfs_trip_id=column_schema.strings(
+                vehicle_datapoints["gtfs_trip_id"]
             )
-        self._add_service_date(actuals, 'time')
-        self._add_service_date(vehicle_datapoints, 'timestamp')
+        )
+        epoch_seconds, service_dates = self._vehicle_times(vehicle_datapoints)
+        keys = self._keys(
+            column_schema.positions(
+                self.trip_ids_,
+                vehicle_datapoints["gtfs_trip_id"]
+            ),
+            service_dates
+        )
 
-        merged_frame = vehicle_datapoints.merge(
-            actuals,
-            how="inner",
-            on=['gtfs_trip_id', 'service_date']
+        vehicle_rows, actual_rows = self.actuals_index_.gather(keys)
+        actual_seconds_from_now = \
+            self.actuals_["time"].to_numpy()[actual_rows] - \
+            epoch_seconds[vehicle_rows]
+        is_future = actual_seconds_from_now > 0
+        # Label the rows by their position among all the matches, as the
+        # index of a merge that was then filtered would be
+        joined_index = np.flatnonzero(is_future)
+
+        left = vehicle_datapoints.drop(
+            ["timestamp"] + TIME_COLUMNS,
+            axis=1,
+            errors="ignore"
         )
-        merged_frame["actual_seconds_from_now"] = \
-            merged_frame["time"] - merged_frame["timestamp"]
-        merged_frame = merged_frame.drop(
-            [
-                "timestamp",
-                "time",
-                'service_date'
-            ], axis=1
+        right = self.actuals_.drop(
+            ["gtfs_trip_id", "service_date", "time"],
+            axis=1
+        )
+        overlapping = left.columns.intersection(right.columns)
+        left = left.rename(
+            {column: f"{column}_x" for column in overlapping},
+            axis="columns"
+        )
+        right = right.rename(
+            {column: f"{column}_y" for column in overlapping},
+            axis="columns"
         )
-        merged_frame = merged_frame.query("actual_seconds_from_now > 0")
 
+        merged_frame = pd.concat(
+            [
+                left.iloc[vehicle_rows[is_future]].set_axis(joined_index),
+                right.iloc[actual_rows[is_future]].set_axis(joined_index)
+            ],
+            axis=1
+        )
+        merged_frame["actual_seconds_from_now"] = \
+            actual_seconds_from_now[is_future]
         return merged_frame.dropna()
 
+    # The epoch seconds and service date of each datapoint, as added by the
+    # TimestampEncoder, or parsed from the timestamps without it
+    def _vehicle_times(self, vehicle_datapoints):
+        if set(TIME_COLUMNS).issubset(vehicle_datapoints.columns):
+            return tuple(
+                vehicle_datapoints[column].to_numpy()
+                for column in TIME_COLUMNS
+            )
+        vehicle_times = ServiceTime(vehicle_datapoints["timestamp"])
+        return vehicle_times.epoch_seconds(), vehicle_times.service_dates()
+
     def _add_service_date(self, dataframe, series_name):
-        dataframe['service_date'] = dataframe[series_name].apply(
-            self._service_date_for_timestamp
-        )
+        dataframe['service_date'] = ServiceTime(
+            dataframe[series_name]
+        ).service_dates()
         return dataframe
 
+    # Combine trip codes and service dates into one integer key, or -1 for
+    # unknown trips and dates outside those of the actuals
+    def _keys(self, trip_codes, service_dates):
+        date_offsets = np.asarray(service_dates) - self.first_service_date_
+        known = (np.asarray(trip_codes) >= 0) & \
+            (date_offsets >= 0) & (date_offsets < self.n_service_dates_)
+        return np.where(
+            known,
+            np.asarray(trip_codes, dtype=np.int64) * self.n_service_dates_ +
+            date_offsets,
+            -1
+        )
+
     # Build a dataframe from prediction analyzer logs, dropping actuals without
     # times, commuter rail trips, and duplicates (which we get because we log
     # both from dev-green and prod).
@@ -59,26 +131,24 @@ class ActualsAdder(BaseEstimator, TransformerMixin):
             ['event_type', 'stop_id', 'time', 'trip_id', 'vehicle_id'],
             axis=1
         )
-        raw_frame['stop_id'] = raw_frame['stop_id'].astype('str')
+        raw_frame['stop_id'] = column_schema.strings(raw_frame['stop_id'])
         dropped_frame = raw_frame.dropna(subset=["time"])
-        is_subway = dropped_frame["trip_id"].apply(lambda x: x[0:3] != "CR-")
-        subway_actuals = dropped_frame[is_subway].drop_duplicates()
+        is_subway = ~column_schema.strings(dropped_frame["trip_id"]). \
+            str.startswith("CR-")
+        subway_actuals = dropped_frame[is_subway]
+        subway_actuals = subway_actuals[~self._duplicated(subway_actuals)]
         subway_actuals = subway_actuals.rename(
             {"trip_id": "gtfs_trip_id", "stop_id": "destination_gtfs_id"},
             axis="columns"
         )
         subway_actuals["gtfs_trip_id"] = \
-            subway_actuals["gtfs_trip_id"].astype(str)
+            column_schema.strings(subway_actuals["gtfs_trip_id"])
         return subway_actuals
 
-    def _service_date_for_timestamp(self, timestamp):
-        # Service days run 3 AM to 3 AM, so adjust the time by 3 hours
-        adjusted_timestamp = timestamp - 10800
-        utc_adjusted_time = datetime. \
-            datetime. \
-            utcfromtimestamp(adjusted_timestamp). \
-            replace(tzinfo=pytz.UTC)
-        adjusted_time = utc_adjusted_time.astimezone(
-            pytz.timezone('America/New_York')
-        )
-        return adjusted_time.toordinal()
+    # Find duplicate rows by comparing integer codes for each column rather
+    # than the values themselves
+    def _duplicated(self, frame):
+        codes = pd.DataFrame({
+            column: pd.factorize(frame[column])[0] for column in frame.columns
+        })
+        return codes.duplicated().to_numpy()
@@ -0,0 +1,247 @@
+import argparse
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+from sklearn.dummy import DummyRegressor
+
+import column_schema
+from model_evaluator import ModelEvaluator
+from subway_pipeline import SubwayPipeline
+from synthetic_data import SyntheticDataGenerator
+
+# Times and memory-profiles each transformer, the full SubwayPipeline.load and
+# ModelEvaluator on a directory of input CSVs, such as one written by
+# SyntheticDataGenerator, and stores the results as JSON named after the
+# current commit so that runs can be compared across commits.
+#
+#     python benchmark.py generate /tmp/bench --vehicle-rows 1000000
+#     python benchmark.py run /tmp/bench
+#     python benchmark.py memory /tmp/bench
+#     python benchmark.py compare benchmark_results/<a>.json \
+#         benchmark_results/<b>.json
+
+INPUT_FILES = {
+    'actuals_path': 'pa_datapoints.csv',
+    'locations_path': 'locations.csv',
+    'patterns_path': 'patterns.csv',
+    'terminals_path': 'terminal_datapoints.csv',
+    'vehicles_path': 'vehicle_datapoints.csv'
+}
+
+
+class Benchmark:
+    def __init__(self, data_dir, results_dir='benchmark_results', repeat=3):
+        self.data_dir = data_dir
+        self.results_dir = results_dir
+        self.repeat = repeat
+
+    # Run every case and return the results, keyed by case name. Wall time
+    # is the best of repeat untraced runs, and peak memory comes from one
+    # more run under tracemalloc, so tracing doesn't skew the timings.
+    def run(self):
+        paths = self._paths()
+        results = {}
+        results['read_inputs'] = self._measure(
+            lambda: SubwayPipeline(**paths).read_inputs()
+        )
+        results['read_locations'] = self._measure(
+            lambda: SubwayPipeline(**paths).locations_frame
+        )
+
+        subway_pipeline = SubwayPipeline(**paths)
+        results['subway_pipeline.load'] = self._measure(subway_pipeline.load)
+        matrix = subway_pipeline.load()
+
+        # Time each step on the output of the fitted steps before it. The
+        # final transformer keeps the order of its input rows, so the last
+        # feature frame lines up with the matrix.
+        frame = subway_pipeline.vehicle_datapoints()
+        for name, step in subway_pipeline.pipeline_.steps:
+            def fit_transform(frame=frame, step=step):
+                return step.fit_transform(frame.copy())
+
+            results[name] = self._measure(fit_transform, frame)
+            if name != 'final_transformer':
+                frame = fit_transform()
+
+        features, labels = subway_pipeline.features_and_labels(matrix)
+        model = DummyRegressor().fit(features, labels)
+        segments = {
+            'route': frame['vehicle_id_x'].str[0].to_numpy(),
+            'time_bin': frame['time_bin'].to_numpy(),
+            'day_of_week': frame['day_of_week'].to_numpy()
+        }
+        results['model_evaluator'] = self._measure(
+            lambda: ModelEvaluator(
+                model,
+                features,
+                labels,
+                segments=segments
+            ).breakdown()
+        )
+        return results
+
+    # Memory of the inputs as read and of the output of each feature step,
+    # with their compact types and as they would be with wide ones
+    def memory_report(self):
+        return column_schema.memory_report(self._stage_frames())
+
+    def _stage_frames(self):
+        subway_pipeline = SubwayPipeline(**self._paths())
+        frame = subway_pipeline.vehicle_datapoints()
+        yield 'actuals', subway_pipeline.actuals_frame
+        yield 'terminals', subway_pipeline.terminals_frame
+        yield 'vehicles', frame
+
+        subway_pipeline.load()
+        for name, step in subway_pipeline.pipeline_.steps[:-1]:
+            frame = step.fit_transform(frame)
+            yield name, frame
+
+    # Store results as JSON named after the commit they were run at
+    def save(self, results):
+        commit, dirty = self._commit()
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = os.path.join(
+            self.results_dir,
+            f"{commit}{'-dirty' if dirty else ''}.json"
+        )
+        with open(path, 'w') as results_file:
+            json.dump({
+                'commit': commit,
+                'dirty': dirty,
+                'run_at': datetime.now(timezone.utc).isoformat(),
+                'data_dir': os.path.abspath(self.data_dir),
+                'input_rows': self._input_rows(),
+                'results': results
+            }, results_file, indent=2)
+        return path
+
+    def _measure(self, function, input_frame=None):
+        seconds = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            output = function()
+            seconds.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            function()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'seconds': min(seconds),
+            'peak_bytes': peak_bytes,
+            'rows_out': self._n_rows(output)
+        }
+        if input_frame is not None:
+            result['rows_in'] = len(input_frame)
+        return result
+
+    def _paths(self):
+        return {
+            key: os.path.join(self.data_dir, filename)
+            for key, filename in INPUT_FILES.items()
+        }
+
+    def _n_rows(self, output):
+        return output.shape[0] if hasattr(output, 'shape') else None
+
+    def _input_rows(self):
+        input_rows = {}
+        for key, filename in INPUT_FILES.items():
+            with open(os.path.join(self.data_dir, filename), 'rb') as file:
+                input_rows[key] = sum(1 for _ in file) - 1
+        return input_rows
+
+    def _commit(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+            status = subprocess.run(
+                ['git', 'status', '--porcelain', '--untracked-files=no'],
+                capture_output=True, text=True, check=True
+            ).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown', False
+        return commit, bool(status.strip())
+
+
+# Compare two stored runs case by case. Ratios above 1 mean the head run was
+# slower or used more memory than the base run.
+def compare(base_path, head_path):
+    runs = []
+    for path in [base_path, head_path]:
+        with open(path) as results_file:
+            runs.append(json.load(results_file)['results'])
+    base, head = runs
+
+    cases = [case for case in base if case in head]
+    comparison = pd.DataFrame({
+        'base_seconds': [base[case]['seconds'] for case in cases],
+        'head_seconds': [head[case]['seconds'] for case in cases],
+        'base_peak_mb': [base[case]['peak_bytes'] / 2**20 for case in cases],
+        'head_peak_mb': [head[case]['peak_bytes'] / 2**20 for case in cases]
+    }, index=pd.Index(cases, name='case'))
+    comparison['time_ratio'] = \
+        comparison['head_seconds'] / comparison['base_seconds']
+    comparison['memory_ratio'] = comparison['head_peak_mb'] / \
+        comparison['base_peak_mb'].replace(0, np.nan)
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate')
+    generate.add_argument('data_dir')
+    generate.add_argument('--vehicle-rows', type=int, default=100000)
+    generate.add_argument('--vehicles-per-route', type=int, default=20)
+    generate.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run')
+    run.add_argument('data_dir')
+    run.add_argument('--results-dir', default='benchmark_results')
+    run.add_argument('--repeat', type=int, default=3)
+
+    memory = commands.add_parser('memory')
+    memory.add_argument('data_dir')
+
+    compare_runs = commands.add_parser('compare')
+    compare_runs.add_argument('base')
+    compare_runs.add_argument('head')
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        SyntheticDataGenerator.for_vehicle_rows(
+            args.vehicle_rows,
+            vehicles_per_route=args.vehicles_per_route,
+            seed=args.seed
+        ).write(args.data_dir)
+    elif args.command == 'run':
+        benchmark = Benchmark(args.data_dir, args.results_dir, args.repeat)
+        results = benchmark.run()
+        print(pd.DataFrame(results).T.to_string())
+        print(benchmark.save(results))
+    elif args.command == 'memory':
+        print(Benchmark(args.data_dir).memory_report().to_string(
+            float_format='{:.3f}'.format
+        ))
+    else:
+        print(compare(args.base, args.head).to_string())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+# The columns of each input that the transformers use, and the compact types
+# they're read as. Types are applied once, when the inputs are read, and the
+# transformers keep them rather than converting back to strings:
+#
+# - IDs, loc_ids, event types and timestamps repeat across many rows, so
+#   they're categorical: each row holds a small integer code, and each string
+#   is stored once.
+# - Continuous features are float32.
+# - Epoch times and generations stay float64 and int64, since float32 can't
+#   hold them to the second, and columns whose type is None are left to
+#   pandas.
+#
+# The locations and patterns are small reference tables whose IDs are
+# rewritten as they're translated, so the IDs are kept as plain strings.
+
+ACTUALS_COLUMNS = {
+    'event_type': 'category',
+    'stop_id': 'category',
+    'time': 'float64',
+    'trip_id': 'category',
+    'vehicle_id': 'category'
+}
+LOCATIONS_COLUMNS = {
+    'default_rt': 'float32',
+    'gtfs_stop_id': str,
+    'latitude': 'float64',
+    'line': str,
+    'loc_id': str,
+    'longitude': 'float64',
+    'next_loc_ids': str
+}
+PATTERNS_COLUMNS = {
+    'pattern_id': None,
+    'terminal_stop': str
+}
+TERMINALS_COLUMNS = {
+    'automatic': None,
+    'generation': None,
+    'terminal_stop_id': 'category',
+    'timestamp': 'category'
+}
+VEHICLES_COLUMNS = {
+    'current_location_id': 'category',
+    'generation': None,
+    'gtfs_trip_id': 'category',
+    'length_of_time_at_current_location': 'float32',
+    'ocs_trip_id': 'category',
+    'offset_departure_seconds_from_now': 'float32',
+    'pattern_id': None,
+    'timestamp': 'category',
+    'vehicle_id': 'category'
+}
+# The columns of predictions.csv.gz, which PredictionsDataset reads a chunk at
+# a time into Parquet. Each chunk has to be read as the same types, so the
+# IDs are strings even where they look like numbers, and times and counts are
+# float64, which keeps them whether or not a chunk has missing values. Any
+# other column is read as a string.
+PREDICTIONS_COLUMNS = {
+    'predictions_arrival_time': 'float64',
+    'predictions_boarding_status': str,
+    'predictions_departure_time': 'float64',
+    'predictions_direction_id': 'float64',
+    'predictions_file_timestamp': 'float64',
+    'predictions_id': str,
+    'predictions_route_id': str,
+    'predictions_stop_id': str,
+    'predictions_stop_sequence': 'float64',
+    'predictions_stops_away': 'float64',
+    'predictions_trip_id': str,
+    'predictions_vehicle_event_id': str,
+    'predictions_vehicle_id': str,
+    've_arrival_time': 'float64',
+    've_departure_time': 'float64',
+    've_id': str
+}
+
+# Types of the columns the transformers derive. Day of the week, time bin and
+# the unreachable flag fit in a byte, and so do the n-hot location flags. The
+# epoch seconds and service date of each timestamp are only passed on to the
+# ActualsAdder, which drops them.
+FEATURE_COLUMNS = {
+    'day_of_week': 'int8',
+    'epoch_seconds': 'float64',
+    'scheduled_run_seconds': 'float32',
+    'scheduled_run_unreachable': 'int8',
+    'service_date': 'int32',
+    'time_bin': 'int8'
+}
+LOCATION_FLAG_DTYPE = np.uint8
+
+
+# Cast the columns of a frame that are in the schema to their compact types,
+# for frames that weren't read with them, such as those parsed from logs
+def compact(frame, columns):
+    dtypes = {
+        column: column_type
+        for column, column_type in columns.items()
+        if column_type is not None and column in frame.columns and
+        frame[column].dtype != column_type
+    }
+    return frame.astype(dtypes) if dtypes else frame
+
+
+# Concatenate frames, keeping categorical columns categorical. pandas falls
+# back to strings when the frames' categories differ, as they do for chunks
+# read separately, so the categories are unioned first.
+def concat(frames):
+    frames = list(frames)
+    categorical = [
+        column for column in frames[0].columns
+        if all(
+            isinstance(frame[column].dtype, pd.CategoricalDtype)
+            for frame in frames
+        )
+    ]
+    for column in categorical:
+        categories = frames[0][column].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(
+                frame[column].cat.categories,
+                sort=False
+            )
+        frames = [
+            frame.assign(**{
+                column: frame[column].cat.set_categories(categories)
+            })
+            for frame in frames
+        ]
+    return pd.concat(frames, ignore_index=True)
+
+
+# The values as strings. Categoricals of strings are returned as they are,
+# and other categoricals only have their categories converted.
+def strings(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        if pd.api.types.is_string_dtype(values.cat.categories.dtype):
+            return values
+        return values.cat.rename_categories(
+            values.cat.categories.astype(str)
+        )
+    return values.astype(str)
+
+
+# The position of each value in index, or -1 for values that aren't in it.
+# Categoricals are looked up by category rather than row by row.
+def positions(index, values):
+    index = pd.Index(index)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        category_positions = np.append(
+            index.get_indexer(values.cat.categories),
+            -1
+        )
+        return category_positions[values.cat.codes.to_numpy()]
+    return index.get_indexer(values)
+
+
+# Memory in MB of each frame of a sequence of (name, frame) pairs, as it is
+# and as it would be with every column widened to the types pandas infers,
+# strings for categoricals and 64 bits for numbers. Each frame is measured as
+# it comes, so a generator can hand over frames that later stages modify.
+def memory_report(frames):
+    rows = []
+    for name, frame in frames:
+        rows.append({
+            'stage': name,
+            'rows': len(frame),
+            'columns': len(frame.columns),
+            'wide_mb': _memory_mb(_widened(frame)),
+            'compact_mb': _memory_mb(frame)
+        })
+    report = pd.DataFrame(
+        rows,
+        columns=['stage', 'rows', 'columns', 'wide_mb', 'compact_mb']
+    ).set_index('stage')
+    report['ratio'] = report['compact_mb'] / report['wide_mb']
+    return report
+
+
+def _widened(frame):
+    dtypes = {}
+    for column, dtype in frame.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtypes[column] = dtype.categories.dtype
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[column] = 'float64'
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(dtype):
+            dtypes[column] = 'int64'
+    return frame.astype(dtypes)
+
+
+def _memory_mb(frame):
+    return frame.memory_usage(deep=True).sum() / 2**20
@@ -0,0 +1,93 @@
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Keeps a feature matrix in CSR form, with its labels and feature names, as
+# .npy files in a directory. Opening them memory-maps the arrays rather than
+# reading them, so a training or evaluation job only pages in what it touches,
+# and every process that opens the same files shares one copy of them through
+# the page cache.
+#
+#     directory/matrix.json        shape and feature names
+#     directory/data.npy           CSR values
+#     directory/indices.npy        CSR column indices
+#     directory/indptr.npy         CSR row pointers
+#     directory/labels.npy
+
+CSR_ARRAYS = ['data', 'indices', 'indptr']
+
+
+class FeatureMatrixFiles:
+    def __init__(self, directory):
+        self.directory = directory
+
+    # Dense features are converted to CSR first. Writing over a matrix
+    # removes its matrix.json first and writes it again last, so a directory
+    # without it holds an incomplete matrix. Each array is written under a
+    # temporary name and then renamed over the old one, so files that
+    # readers have memory-mapped are never truncated; they keep the old
+    # arrays until they open the matrix again.
+    def write(self, features, labels, feature_names):
+        features = csr_matrix(features)
+        labels = np.asarray(labels)
+        if labels.shape != (features.shape[0],):
+            raise ValueError(
+                f"Expected {features.shape[0]} labels, got {labels.shape}"
+            )
+        if len(feature_names) != features.shape[1]:
+            raise ValueError(
+                f"Expected {features.shape[1]} feature names, got "
+                f"{len(feature_names)}"
+            )
+
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            os.remove(self._path('matrix.json'))
+        except FileNotFoundError:
+            pass
+        arrays = {name: getattr(features, name) for name in CSR_ARRAYS}
+        arrays['labels'] = labels
+        for name, array in arrays.items():
+            with self._replacing(f'{name}.npy', 'wb') as array_file:
+                np.save(array_file, array)
+        with self._replacing('matrix.json', 'w') as matrix_file:
+            json.dump(
+                {
+                    'shape': list(features.shape),
+                    'feature_names': [str(name) for name in feature_names]
+                },
+                matrix_file
+            )
+
+    # Return the features as a CSR matrix over memory-mapped arrays, the
+    # memory-mapped labels, and the feature names. The arrays are read-only,
+    # so anything that would modify the matrix in place has to copy it first.
+    def open(self):
+        with open(self._path('matrix.json')) as matrix_file:
+            description = json.load(matrix_file)
+        features = csr_matrix(
+            tuple(
+                np.load(self._path(f'{name}.npy'), mmap_mode='r')
+                for name in CSR_ARRAYS
+            ),
+            shape=tuple(description['shape']),
+            copy=False
+        )
+        labels = np.load(self._path('labels.npy'), mmap_mode='r')
+        return features, labels, description['feature_names']
+
+    # Write a file under a temporary name and rename it into place once it's
+    # complete
+    @contextmanager
+    def _replacing(self, filename, mode):
+        path = self._path(filename)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, mode) as temporary_file:
+            yield temporary_file
+        os.replace(temporary_path, path)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
@@ -0,0 +1,261 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import column_schema
+from service_time import ServiceTime
+
+# Keeps feature rows on disk, partitioned by service date, so that each day's
+# exports only cost the features of the new data. The raw vehicle datapoints,
+# terminal datapoints and actuals are kept alongside the features for each
+# service date, so that a date can be recomputed when actuals for its trips
+# turn up in a later export. A manifest records the generations processed for
+# each date and the raw parts that belong to it; parts that aren't in the
+# manifest (say, from an update that was interrupted) are ignored.
+#
+#     store_dir/manifest.json
+#     store_dir/features/service_date=2019-05-17/features.parquet
+#     store_dir/raw/vehicles/service_date=2019-05-17/<part>.parquet
+#     store_dir/raw/terminals/service_date=2019-05-17/<part>.parquet
+#     store_dir/raw/actuals/service_date=2019-05-17/<part>.parquet
+
+RAW_KINDS = ['vehicles', 'terminals', 'actuals']
+# The columns that tell one actual apart from another
+ACTUAL_KEY = ['trip_id', 'stop_id', 'event_type', 'time']
+
+
+class FeatureStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    # Add the datapoints read by a SubwayPipeline from a new set of exports.
+    # Generations already in the store are skipped, the features of the
+    # service dates with new vehicle datapoints are computed, and dates that
+    # were already in the store are recomputed if new actuals arrived for
+    # them. Returns the dates that were computed.
+    def update(self, subway_pipeline):
+        if subway_pipeline.sparse_locations:
+            raise ValueError(
+                "Feature stores hold dense locations, so they can't be "
+                "updated with sparse_locations"
+            )
+        manifest = self._read_manifest(subway_pipeline.route)
+        dates = manifest['service_dates']
+
+        # The vehicle datapoints are stored with the epoch seconds of their
+        # timestamps, so that computing their features doesn't parse the
+        # timestamps again
+        vehicles = subway_pipeline.vehicle_datapoints()
+        vehicle_times = ServiceTime(vehicles['timestamp'])
+        vehicles = vehicles.assign(
+            epoch_seconds=vehicle_times.epoch_seconds().astype(
+                column_schema.FEATURE_COLUMNS['epoch_seconds']
+            )
+        )
+        vehicle_dates = vehicle_times.iso_service_dates()
+        processed = np.array(
+            [g for date in dates.values() for g in date['generations']],
+            dtype=np.int64
+        )
+        is_new = ~np.isin(vehicles['generation'].to_numpy(), processed)
+        generation_dates = pd.Series(
+            vehicle_dates[is_new],
+            index=vehicles['generation'].to_numpy()[is_new]
+        ).groupby(level=0).first()
+
+        # Only the route's own vehicles are kept, but every new generation
+        # counts as processed
+        on_route = column_schema.strings(vehicles['vehicle_id']).str[0] == \
+            subway_pipeline.route
+        vehicles = vehicles[is_new & on_route]
+        vehicle_dates = vehicle_dates[is_new & on_route]
+
+        terminals = subway_pipeline.terminals_frame
+        terminals = terminals[terminals['generation'].isin(
+            generation_dates.index
+        )]
+        terminal_dates = generation_dates[terminals['generation']].to_numpy()
+
+        actuals = subway_pipeline.actuals_frame.dropna(subset=['time'])
+        actual_dates = ServiceTime(actuals['time']).iso_service_dates()
+
+        # Actuals turn up in every export that overlaps their trips, so only
+        # those that aren't stored yet are kept, and only dates that were
+        # already computed and got new actuals are recomputed
+        new_dates = set(generation_dates)
+        late_dates = set()
+        for date in sorted(set(actual_dates)):
+            stored_parts = dates.get(date, self._empty_entry())['parts']
+            new_actuals = self._unstored_actuals(
+                date,
+                stored_parts['actuals'],
+                actuals[actual_dates == date]
+            )
+            if new_actuals.empty:
+                continue
+            entry = dates.setdefault(date, self._empty_entry())
+            entry['parts']['actuals'].append(
+                self._write_raw_part('actuals', date, new_actuals)
+            )
+            if entry['generations']:
+                late_dates.add(date)
+
+        for kind, frame, frame_dates in [
+            ('vehicles', vehicles, vehicle_dates),
+            ('terminals', terminals, terminal_dates)
+        ]:
+            for date in sorted(set(frame_dates)):
+                part = self._write_raw_part(
+                    kind,
+                    date,
+                    frame[frame_dates == date]
+                )
+                entry = dates.setdefault(date, self._empty_entry())
+                entry['parts'][kind].append(part)
+
+        for date in sorted(new_dates):
+            entry = dates.setdefault(date, self._empty_entry())
+            entry['generations'] += \
+                generation_dates[generation_dates == date].index.tolist()
+
+        computed = sorted(new_dates | late_dates)
+        for date in computed:
+            dates[date]['feature_rows'] = self._compute_features(
+                subway_pipeline,
+                date,
+                dates[date]['parts']
+            )
+        self._write_manifest(manifest)
+        return computed
+
+    # The feature rows, with their labels, for service dates from start_date
+    # to end_date inclusive. Dates can be datetime.dates or ISO strings, and
+    # either end can be left open.
+    def select(self, start_date=None, end_date=None):
+        start_date = self._iso_date(start_date)
+        end_date = self._iso_date(end_date)
+        dates = self._read_manifest()['service_dates']
+
+        frames = [
+            pd.read_parquet(self._features_path(date))
+            for date in sorted(dates)
+            if dates[date]['feature_rows'] and
+            (start_date is None or date >= start_date) and
+            (end_date is None or date <= end_date)
+        ]
+        if not frames:
+            raise ValueError("No feature rows in the store for those dates")
+        return column_schema.concat(frames)
+
+    # The number of generations and feature rows for each service date
+    def summary(self):
+        dates = self._read_manifest()['service_dates']
+        return pd.DataFrame(
+            [
+                (date, len(entry['generations']), entry['feature_rows'])
+                for date, entry in sorted(dates.items())
+            ],
+            columns=['service_date', 'generations', 'feature_rows']
+        )
+
+    def _compute_features(self, subway_pipeline, date, parts):
+        raw = {
+            kind: self._read_raw_parts(kind, date, parts[kind])
+            for kind in RAW_KINDS
+        }
+        if raw['vehicles'] is None:
+            return 0
+
+        for kind in ['terminals', 'actuals']:
+            if raw[kind] is None:
+                raw[kind] = getattr(subway_pipeline, f'{kind}_frame').iloc[0:0]
+        feature_frame = subway_pipeline.feature_frame(
+            raw['vehicles'],
+            raw['terminals'],
+            raw['actuals']
+        )
+
+        path = self._features_path(date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        feature_frame.to_parquet(temporary_path, index=False)
+        os.replace(temporary_path, path)
+        return len(feature_frame)
+
+    def _write_raw_part(self, kind, date, frame):
+        directory = self._partition_dir('raw', kind, date)
+        os.makedirs(directory, exist_ok=True)
+        part = f"{uuid.uuid4().hex}.parquet"
+        frame.to_parquet(os.path.join(directory, part), index=False)
+        return part
+
+    # The actuals of a service date that aren't among its stored parts
+    def _unstored_actuals(self, date, parts, actuals):
+        stored = self._read_raw_parts('actuals', date, parts)
+        if stored is None:
+            return actuals
+        return actuals[
+            ~self._actual_keys(actuals).isin(self._actual_keys(stored))
+        ]
+
+    def _actual_keys(self, actuals):
+        return pd.MultiIndex.from_arrays(
+            [actuals[column].astype(str) for column in ACTUAL_KEY[:-1]] +
+            [actuals['time'].to_numpy(np.float64)]
+        )
+
+    def _read_raw_parts(self, kind, date, parts):
+        if not parts:
+            return None
+        directory = self._partition_dir('raw', kind, date)
+        return column_schema.concat(
+            pd.read_parquet(os.path.join(directory, part)) for part in parts
+        )
+
+    def _read_manifest(self, route=None):
+        path = os.path.join(self.store_dir, 'manifest.json')
+        if not os.path.isfile(path):
+            return {'route': route, 'service_dates': {}}
+
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if route is not None and manifest['route'] != route:
+            raise ValueError(
+                f"The store holds route {manifest['route']}, not {route}"
+            )
+        return manifest
+
+    # Written last, and atomically, so that the store only ever points at
+    # complete parts
+    def _write_manifest(self, manifest):
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = os.path.join(self.store_dir, 'manifest.json')
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, path)
+
+    def _empty_entry(self):
+        return {
+            'generations': [],
+            'parts': {kind: [] for kind in RAW_KINDS},
+            'feature_rows': 0
+        }
+
+    def _features_path(self, date):
+        return os.path.join(
+            self._partition_dir('features', None, date),
+            'features.parquet'
+        )
+
+    def _partition_dir(self, area, kind, date):
+        parts = [self.store_dir, area] + ([kind] if kind else [])
+        return os.path.join(*parts, f'service_date={date}')
+
+    def _iso_date(self, date):
+        if date is None or isinstance(date, str):
+            return date
+        return date.isoformat()
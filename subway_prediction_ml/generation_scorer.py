@@ -0,0 +1,327 @@
+import itertools
+import json
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pandas as pd
+
+import column_schema
+from scheduled_run_time_adder import UNREACHABLE_RUN_SECONDS
+from service_time import ServiceTime
+from sorted_key_index import SortedKeyIndex
+
+# Scores the vehicles of a single generation with a model trained on the
+# features of a loaded SubwayPipeline. Everything that doesn't depend on the
+# generation (pattern terminals, category codes, column positions, scaler
+# parameters) is worked out once up front, so scoring is only a handful of
+# index lookups that fill a preallocated feature buffer, with no merges.
+
+VEHICLE_COLUMNS = [
+    'automatic',
+    'current_location_id',
+    'day_of_week',
+    'length_of_time_at_current_location',
+    'offset_departure_seconds_from_now',
+    'terminal_gtfs_id',
+    'time_bin'
+]
+DESTINATION_COLUMNS = ['destination_gtfs_id', 'event_type']
+
+
+class GenerationScorer:
+    def __init__(
+        self,
+        subway_pipeline,
+        model,
+        destinations=None,
+        capacity=1024,
+        latency_window=10000
+    ):
+        steps = subway_pipeline.pipeline_.named_steps
+        self.model = model
+
+        self._route = steps['route_filter'].route
+        self._offset_seconds_encoder = steps['offset_seconds_encoder']
+        terminal_modes_adder = steps['terminal_modes_adder']
+        self._patterns = terminal_modes_adder.pattern_ids_
+        self._pattern_terminals = terminal_modes_adder.pattern_terminals_
+        self._terminal_gtfs_ids = terminal_modes_adder.terminal_gtfs_ids_
+        self._locations_adder = steps['locations_adder']
+        self._track_graph = steps['scheduled_run_time_adder'].track_graph \
+            if 'scheduled_run_time_adder' in steps else None
+        self._locations = pd.Index(
+            self._locations_adder.all_locs_sorted()
+        )
+        self._build_layout(steps['final_transformer'])
+        self._destinations = self._destination_pairs(destinations)
+
+        self._features = np.zeros((capacity, self._n_features))
+        self._latencies = deque(maxlen=latency_window)
+
+    # Predict the seconds until each destination event for every vehicle of
+    # one generation. Vehicles that the pipeline would drop, because they're
+    # on another route or their terminal has no terminal mode datapoint, are
+    # left out. A vehicle whose terminal has several terminal mode datapoints
+    # is scored once for each, as the pipeline repeats it.
+    def predict_generation(self, vehicle_rows, terminal_rows):
+        started = time.perf_counter()
+
+        vehicles = self._vehicle_values(vehicle_rows, terminal_rows)
+        n_vehicles = len(vehicles['vehicle_id'])
+        n_destinations = len(self._destinations['destination_gtfs_id'])
+        features = self._feature_rows(n_vehicles * n_destinations)
+
+        values = {
+            column: np.repeat(vehicles[column], n_destinations)
+            for column in VEHICLE_COLUMNS
+        }
+        values.update({
+            column: np.tile(self._destinations[column], n_vehicles)
+            for column in DESTINATION_COLUMNS
+        })
+        if self._track_graph is not None:
+            run_seconds = self._track_graph.run_seconds(
+                values['current_location_id'],
+                values['destination_gtfs_id']
+            )
+            unreachable = np.isnan(run_seconds)
+            values['scheduled_run_seconds'] = np.where(
+                unreachable,
+                UNREACHABLE_RUN_SECONDS,
+                run_seconds
+            )
+            values['scheduled_run_unreachable'] = unreachable
+        occupancy = np.zeros(len(self._locations))
+        occupied = self._locations_adder.location_columns(
+            vehicles['current_location_id']
+        )
+        occupancy[occupied[occupied >= 0]] = 1.0
+        self._fill(features, values, occupancy)
+
+        predictions = pd.DataFrame({
+            'vehicle_id': np.repeat(vehicles['vehicle_id'], n_destinations),
+            'gtfs_trip_id': np.repeat(
+                vehicles['gtfs_trip_id'],
+                n_destinations
+            ),
+            'destination_gtfs_id': values['destination_gtfs_id'],
+            'event_type': values['event_type'],
+            'predicted_seconds': self.model.predict(features)
+            if len(features) else np.zeros(0)
+        })
+        self._latencies.append(time.perf_counter() - started)
+        return predictions
+
+    # Median and 99th percentile latency of recent calls, in milliseconds
+    def latency_percentiles(self):
+        if not self._latencies:
+            return {'count': 0, 'p50': None, 'p99': None}
+
+        p50, p99 = np.percentile(np.array(self._latencies) * 1000, [50, 99])
+        return {'count': len(self._latencies), 'p50': p50, 'p99': p99}
+
+    # A minimal local HTTP wrapper. POST a JSON object with "vehicles" and
+    # "terminals" lists of records to get back the predictions as records,
+    # or GET the latency percentiles. A request that isn't such an object, or
+    # whose records lack the columns scoring needs, gets a 400 with the
+    # error. Requests are handled one at a time, since they share the
+    # feature buffer.
+    def serve(self, host='127.0.0.1', port=8080):
+        self._server(host, port).serve_forever()
+
+    def _server(self, host, port):
+        scorer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._respond(scorer.latency_percentiles())
+
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    body = json.loads(self.rfile.read(length))
+                    predictions = scorer.predict_generation(
+                        pd.DataFrame(body['vehicles']),
+                        pd.DataFrame(body['terminals'])
+                    )
+                except (KeyError, TypeError, ValueError) as error:
+                    self._respond({'error': repr(error)}, status=400)
+                    return
+                self._respond(predictions.to_dict(orient='records'))
+
+            def _respond(self, payload, status=200):
+                encoded = json.dumps(payload, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return HTTPServer((host, port), Handler)
+
+    # Work out where each block of the final transformer's output lands in
+    # the feature buffer, leaving out the label column.
+    def _build_layout(self, final_transformer):
+        self._categorical_blocks = []
+        self._occupancy_start = None
+        self._scaled_block = None
+
+        label_columns = final_transformer.output_indices_['pass']
+        label_width = label_columns.stop - label_columns.start
+        for name, transformer, columns in final_transformer.transformers_:
+            output_columns = final_transformer.output_indices_[name]
+            start = output_columns.start
+            if start >= label_columns.stop:
+                start -= label_width
+
+            if name == 'pass' or transformer == 'drop':
+                continue
+            elif hasattr(transformer, 'categories_'):
+                for column, categories in \
+                        zip(columns, transformer.categories_):
+                    self._categorical_blocks.append(
+                        (column, pd.Index(categories), start)
+                    )
+                    start += len(categories)
+            elif name == 'locations':
+                self._occupancy_start = start
+            elif name == 'remainder':
+                self._scaled_block = self._scaled_columns(
+                    transformer,
+                    pd.Index(final_transformer.feature_names_in_)[columns]
+                    if np.asarray(columns).dtype.kind in 'biu'
+                    else columns,
+                    start
+                )
+            else:
+                raise ValueError(f"Can't score with transformer {name}")
+
+        self._n_features = final_transformer.output_indices_['remainder']. \
+            stop - label_width
+
+    def _scaled_columns(self, scaler, names, start):
+        known = set(VEHICLE_COLUMNS).union(self._locations)
+        if self._track_graph is not None:
+            known.update(
+                ['scheduled_run_seconds', 'scheduled_run_unreachable']
+            )
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise ValueError(f"Can't score with columns {unknown}")
+
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(len(names))
+        scale = scaler.scale_ if scaler.with_std else np.ones(len(names))
+        location_codes = self._locations.get_indexer(names)
+        is_location = location_codes >= 0
+        return {
+            'values': [
+                (name, start + i, mean[i], scale[i])
+                for i, name in enumerate(names)
+                if not is_location[i]
+            ],
+            'location_columns': start + np.flatnonzero(is_location),
+            'location_codes': location_codes[is_location],
+            'location_mean': mean[is_location],
+            'location_scale': scale[is_location]
+        }
+
+    # Default to every combination of destination and event type the model
+    # was trained on
+    def _destination_pairs(self, destinations):
+        if destinations is None:
+            categories = {
+                column: categories
+                for column, categories, _ in self._categorical_blocks
+            }
+            destinations = itertools.product(
+                categories['destination_gtfs_id'],
+                categories['event_type']
+            )
+
+        stops, event_types = zip(*destinations) if destinations else ((), ())
+        return {
+            'destination_gtfs_id': np.array(stops, dtype=object),
+            'event_type': np.array(event_types, dtype=object)
+        }
+
+    # Gather the per-vehicle values the model needs, keeping only vehicles
+    # on the route whose terminal has a terminal mode in this generation.
+    # Terminal modes are joined the way TerminalModesAdder joins them, so a
+    # vehicle is repeated for each of its terminal's modes.
+    def _vehicle_values(self, vehicle_rows, terminal_rows):
+        vehicle_rows = vehicle_rows[
+            column_schema.strings(vehicle_rows['vehicle_id']).str[0] ==
+            self._route
+        ]
+        pattern_codes = column_schema.positions(
+            self._patterns,
+            vehicle_rows['pattern_id']
+        )
+        terminal_codes = np.where(
+            pattern_codes >= 0,
+            self._pattern_terminals[pattern_codes],
+            -1
+        )
+        terminal_modes = SortedKeyIndex(column_schema.positions(
+            self._terminal_gtfs_ids,
+            column_schema.strings(terminal_rows['terminal_stop_id'])
+        ))
+        vehicle_positions, terminal_mode_rows = \
+            terminal_modes.gather(terminal_codes)
+
+        vehicle_rows = vehicle_rows.iloc[vehicle_positions]
+        times = ServiceTime(vehicle_rows['timestamp'])
+        offsets = self._offset_seconds_encoder.transform(pd.DataFrame({
+            'offset_departure_seconds_from_now':
+                vehicle_rows['offset_departure_seconds_from_now'].to_numpy()
+        }))
+        return {
+            'vehicle_id': vehicle_rows['vehicle_id'].to_numpy(),
+            'gtfs_trip_id': vehicle_rows['gtfs_trip_id'].to_numpy(),
+            'automatic':
+                terminal_rows['automatic'].to_numpy()[terminal_mode_rows],
+            'current_location_id':
+                vehicle_rows['current_location_id'].to_numpy(),
+            'day_of_week': times.weekdays(),
+            'length_of_time_at_current_location':
+                vehicle_rows['length_of_time_at_current_location'].to_numpy(),
+            'offset_departure_seconds_from_now':
+                offsets['offset_departure_seconds_from_now'].to_numpy(),
+            'terminal_gtfs_id':
+                self._terminal_gtfs_ids[terminal_codes[vehicle_positions]],
+            'time_bin': times.time_bins()
+        }
+
+    # A zeroed view of the first n_rows of the feature buffer, which grows
+    # if a generation ever needs more rows than it has
+    def _feature_rows(self, n_rows):
+        if n_rows > len(self._features):
+            self._features = np.zeros((n_rows, self._n_features))
+        features = self._features[:n_rows]
+        features[:] = 0.0
+        return features
+
+    def _fill(self, features, values, occupancy):
+        rows = np.arange(len(features))
+        for column, categories, start in self._categorical_blocks:
+            codes = categories.get_indexer(values[column])
+            known = codes >= 0
+            features[rows[known], start + codes[known]] = 1.0
+
+        if self._occupancy_start is not None:
+            features[
+                :,
+                self._occupancy_start:self._occupancy_start + len(occupancy)
+            ] = occupancy
+
+        # The dense location columns are the same for every row, so they're
+        # scaled once as a block and broadcast
+        if self._scaled_block is not None:
+            block = self._scaled_block
+            features[:, block['location_columns']] = (
+                occupancy[block['location_codes']] - block['location_mean']
+            ) / block['location_scale']
+            for name, column, mean, scale in block['values']:
+                features[:, column] = (values[name] - mean) / scale
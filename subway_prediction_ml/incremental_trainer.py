@@ -0,0 +1,133 @@
+import os
+import pickle
+
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from feature_matrix_files import FeatureMatrixFiles
+
+# Trains a model a chunk of feature rows at a time with partial_fit, so that
+# the training data is bounded by the chunk size rather than by memory. The
+# chunks come either from a SubwayPipeline, which computes and scales them as
+# it goes, or from FeatureMatrixFiles written by an earlier load.
+#
+# With a checkpoint_path, the model, the final transformer and scaler that
+# encoded its chunks, and the number of chunks trained are pickled after every
+# chunk. from_checkpoint picks the model back up, either to carry on with new
+# data in the same encoding or, with resume, to skip the chunks of an
+# interrupted run that were already trained, and predict scores new
+# datapoints with it.
+
+
+class IncrementalTrainer:
+    def __init__(self, model=None, chunksize=100000, checkpoint_path=None):
+        self.model = model if model is not None else SGDRegressor()
+        if not hasattr(self.model, 'partial_fit'):
+            raise ValueError(
+                f"{type(self.model).__name__} can't be trained incrementally "
+                "because it has no partial_fit"
+            )
+        self.chunksize = chunksize
+        self.checkpoint_path = checkpoint_path
+        self.scaler = None
+        self.final_transformer = None
+        self.chunks_ = 0
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path):
+        with open(checkpoint_path, 'rb') as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+        trainer = cls(
+            checkpoint['model'],
+            checkpoint['chunksize'],
+            checkpoint_path
+        )
+        trainer.scaler = checkpoint['scaler']
+        trainer.final_transformer = checkpoint.get('final_transformer')
+        trainer.chunks_ = checkpoint['chunks']
+        return trainer
+
+    # Train on the features and labels that the SubwayPipeline computes for
+    # each chunk of its vehicle datapoints. The final transformer and the
+    # scaler of the remainder are kept with the model, since new data has to
+    # be encoded and scaled the same way.
+    def fit_pipeline(self, subway_pipeline, resume=False):
+        if self.scaler is None:
+            self.scaler = StandardScaler()
+        if self.final_transformer is None:
+            self.final_transformer = subway_pipeline.streaming_transformer()
+        skip_chunks = self.chunks_ if resume else 0
+        return self._fit_chunks(
+            subway_pipeline.stream_training_chunks(
+                self.chunksize,
+                scaler=self.scaler,
+                skip_chunks=skip_chunks,
+                final_transformer=self.final_transformer
+            ),
+            skip_chunks
+        )
+
+    # Predict the seconds until each event for a batch of vehicle datapoints,
+    # encoded by the SubwayPipeline as the model's training chunks were,
+    # without updating the scaler
+    def predict(self, subway_pipeline, vehicle_datapoints):
+        if self.final_transformer is None:
+            raise ValueError(
+                "Only a model trained with fit_pipeline can score datapoints"
+            )
+        features, _ = subway_pipeline.streaming_features_and_labels(
+            vehicle_datapoints,
+            self.final_transformer,
+            self.scaler
+        )
+        return self.model.predict(features)
+
+    # Train on a feature matrix written by SubwayPipeline.load, reading it a
+    # chunk of rows at a time from the memory-mapped files
+    def fit_matrix_files(self, output_dir, resume=False):
+        features, labels, _ = FeatureMatrixFiles(output_dir).open()
+        skip_chunks = self.chunks_ if resume else 0
+        return self._fit_chunks(
+            (
+                (
+                    features[start:start + self.chunksize],
+                    np.asarray(labels[start:start + self.chunksize])
+                )
+                for start in range(
+                    skip_chunks * self.chunksize,
+                    features.shape[0],
+                    self.chunksize
+                )
+            ),
+            skip_chunks
+        )
+
+    # chunks_ counts the chunks trained in this run, including any skipped
+    # because an interrupted run already trained them
+    def _fit_chunks(self, chunks, skip_chunks):
+        self.chunks_ = skip_chunks
+        for features, labels in chunks:
+            self.model.partial_fit(features, labels)
+            self.chunks_ += 1
+            self._write_checkpoint()
+        return self
+
+    # Written to a temporary file first, so that a run killed part way
+    # through leaves the previous checkpoint intact
+    def _write_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        temporary_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as checkpoint_file:
+            pickle.dump(
+                {
+                    'model': self.model,
+                    'scaler': self.scaler,
+                    'final_transformer': self.final_transformer,
+                    'chunks': self.chunks_,
+                    'chunksize': self.chunksize
+                },
+                checkpoint_file
+            )
+        os.replace(temporary_path, self.checkpoint_path)
@@ -0,0 +1,66 @@
+import glob
+import hashlib
+import os
+import pandas as pd
+
+# Caches CSV inputs as Parquet files (which requires pyarrow), keeping only
+# the columns the transformers use. Entries are keyed by the source file's
+# path, size and modification time, so a source file that changes is read
+# from CSV again and its stale entry replaced.
+
+
+class InputCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    # Read the given columns of a CSV file, from the cache if it has a fresh
+    # entry for it. Columns missing from the file are ignored.
+    def read_csv(self, path, columns, dtype=None):
+        entry_path = self._entry_path(path, columns, dtype)
+        if os.path.isfile(entry_path):
+            return pd.read_parquet(entry_path)
+
+        frame = pd.read_csv(
+            path,
+            usecols=set(columns).__contains__,
+            dtype=dtype
+        )
+        self._write_entry(path, entry_path, frame)
+        return frame
+
+    def _entry_path(self, path, columns, dtype):
+        stat = os.stat(path)
+        version = repr((
+            stat.st_size,
+            stat.st_mtime_ns,
+            sorted(columns),
+            sorted((dtype or {}).items(), key=repr)
+        ))
+        return os.path.join(
+            self.cache_dir,
+            f"{self._entry_prefix(path)}{self._digest(version)}.parquet"
+        )
+
+    def _entry_prefix(self, path):
+        source = os.path.abspath(path)
+        name = os.path.splitext(os.path.basename(source))[0]
+        return f"{name}-{self._digest(source)}-"
+
+    # Write through a temporary file so that a reader never sees a partial
+    # entry, then remove any older entries for the same source file.
+    def _write_entry(self, path, entry_path, frame):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        frame.to_parquet(temporary_path, index=False)
+        os.replace(temporary_path, entry_path)
+
+        pattern = os.path.join(
+            glob.escape(self.cache_dir),
+            f"{glob.escape(self._entry_prefix(path))}*.parquet"
+        )
+        for stale_path in glob.glob(pattern):
+            if stale_path != entry_path:
+                os.remove(stale_path)
+
+    def _digest(self, value):
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+import column_schema
+
+# Interns every loc_id in the locations frame to an integer code, built once
+# and shared by the transformers. Codes are ordered by line and then by
+# loc_id, so each route's locations are a contiguous range of codes, in the
+# same order as its n-hot location columns. The GTFS ID of each location's
+# parent stop is worked out up front too, so translating or encoding a whole
+# column is one hash lookup per distinct value and a gather.
+#
+# A loc_id listed more than once keeps the line of its first row, and
+# translates to the parent stop of its last row that is a stop, as a
+# dictionary of stops would. Locations without a line all belong to the route
+# None.
+
+# Platforms whose predictions are made for their parent stop
+PARENT_STOPS = {
+    "Alewife-01": "70061",
+    "Alewife-02": "70061",
+    "Braintree-01": "70105",
+    "Braintree-02": "70105",
+    "Forest Hills-01": "70001",
+    "Forest Hills-02": "70001",
+    "Oak Grove-01": "70036",
+    "Oak Grove-02": "70036",
+    "Government Center-Brattle": "70202"
+}
+
+
+class LocationRegistry:
+    def __init__(self, locations_frame):
+        locations = locations_frame.drop_duplicates(subset='loc_id')
+        locations = locations[locations['loc_id'].notna()]
+        loc_ids = locations['loc_id'].to_numpy(dtype=object)
+        lines = locations['line'].fillna('').to_numpy(dtype=object) \
+            if 'line' in locations.columns \
+            else np.full(len(locations), '', dtype=object)
+        order = np.lexsort((loc_ids.astype(str), lines.astype(str)))
+
+        self.loc_ids = loc_ids[order]
+        self._index = pd.Index(self.loc_ids)
+        self._gtfs_ids = self._last_gtfs_ids(locations_frame)
+        route_names, starts, counts = np.unique(
+            lines[order].astype(str),
+            return_index=True,
+            return_counts=True
+        )
+        self._routes = {
+            route: slice(start, start + count)
+            for route, start, count in zip(route_names, starts, counts)
+        }
+
+    def __len__(self):
+        return len(self.loc_ids)
+
+    # The range of codes of a route's locations, or of all of them for
+    # route None. Routes without locations get an empty range.
+    def route_codes(self, route=None):
+        if route is None:
+            return slice(0, len(self.loc_ids))
+        return self._routes.get(route, slice(0, 0))
+
+    # The loc_ids of a route, or all of them, in code order
+    def route_loc_ids(self, route=None):
+        return self.loc_ids[self.route_codes(route)]
+
+    # The code of each loc_id in a column, or -1 for unknown loc_ids
+    def encode(self, loc_ids):
+        return column_schema.positions(self._index, pd.Series(loc_ids))
+
+    # The parent stop's GTFS ID of each loc_id in a column, or None for
+    # unknown loc_ids and locations that aren't stops
+    def translate(self, loc_ids):
+        return np.append(self._gtfs_ids, None)[self.encode(loc_ids)]
+
+    # The parent stop's GTFS ID of the last row of each loc_id that is a
+    # stop, in code order
+    def _last_gtfs_ids(self, locations_frame):
+        locations = locations_frame[locations_frame['loc_id'].notna()]
+        stops = pd.Series(
+            self._parent_gtfs_ids(locations),
+            index=locations['loc_id'].to_numpy(dtype=object)
+        ).dropna()
+        stops = stops[~stops.index.duplicated(keep='last')]
+        gtfs_ids = stops.reindex(self.loc_ids).to_numpy(dtype=object)
+        return np.where(pd.isna(gtfs_ids), None, gtfs_ids)
+
+    # The GTFS ID of each location's parent stop, or None
+    def _parent_gtfs_ids(self, locations):
+        if 'gtfs_stop_id' not in locations.columns:
+            return np.full(len(locations), None, dtype=object)
+        gtfs_stop_ids = locations['gtfs_stop_id']
+        is_stop = (gtfs_stop_ids.notna() & (gtfs_stop_ids != '0')).to_numpy()
+        parent_stops = gtfs_stop_ids.replace(PARENT_STOPS). \
+            to_numpy(dtype=object)
+        return np.where(is_stop, parent_stops, None)
@@ -1,81 +1,141 @@
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from scipy.sparse import csr_matrix, vstack
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from column_schema import LOCATION_FLAG_DTYPE
+from location_registry import LocationRegistry
+
 
 class LocationsAdder(BaseEstimator, TransformerMixin):
-    def __init__(self, locations_frame, route=None):
+    # Pass the pipeline's LocationRegistry to share its codes, rather than
+    # building one from the locations frame
+    def __init__(
+        self,
+        locations_frame,
+        route=None,
+        sparse=False,
+        location_registry=None
+    ):
         self.locations_frame = locations_frame
-        self._all_locs_sorted = None
-        self._route = route
+        self.route = route
+        self.sparse = sparse
+        self.location_registry = location_registry
+        self._own_registry = None
+        self._layout = None
 
     def fit(self, vehicle_datapoints, y=None):
+        self._registry()
         return self
 
-    def transform(self, vehicle_datapoints, y=None):
-        n_hot_locations = self._n_hot_vehicle_locations_by_generation(
-            vehicle_datapoints
-        )
+    # The final transformer gathers n-hot rows from the pipeline's own adder
+    # through n_hot_locations, so the deep copies sklearn makes of its
+    # parameters when fitting keep this adder rather than its occupancy at
+    # the time of fitting
+    def __deepcopy__(self, memo):
+        return self
 
-        generations = vehicle_datapoints["generation"].to_list()
+    # In sparse mode the datapoints pass through unchanged, and the n-hot
+    # block is gathered later with n_hot_locations.
+    def transform(self, vehicle_datapoints, y=None):
+        self.generations_, self.occupancy_ = \
+            self._occupancy_by_generation(vehicle_datapoints)
+        if self.sparse:
+            return vehicle_datapoints
 
-        n_hot_per_row_list_of_lists = list(
-            map(
-                lambda generation: n_hot_locations[generation], generations
-            )
-        )
         n_hot_per_row = pd.DataFrame(
-            n_hot_per_row_list_of_lists,
-            columns=self.all_locs_sorted()
+            self.n_hot_locations(vehicle_datapoints).toarray(),
+            columns=self.all_locs_sorted(),
+            index=vehicle_datapoints.index
         )
-        return vehicle_datapoints.join(n_hot_per_row, how="inner")
+        return pd.concat([vehicle_datapoints, n_hot_per_row], axis=1)
 
-    # Return array of all location IDs in lexicographical order
+    # Return the route's location IDs, or all of them without a route, in
+    # lexicographical order
     def all_locs_sorted(self):
-        if self._all_locs_sorted is None:
-            if self._route:
-                filtered_locations_frame = self.locations_frame.query(
-                    f"line == '{self._route}'"
-                )
-            else:
-                filtered_locations_frame = self.locations_frame
-
-            self._all_locs_sorted = sorted(
-                filtered_locations_frame["loc_id"].__array__()
-            )
-
-        return self._all_locs_sorted
-
-    # Builds a map of generations to the list of n-hot encoded vehicle
-    # positions for that generation.
-    def _n_hot_vehicle_locations_by_generation(self, vehicle_datapoints):
-        grouped_frame = vehicle_datapoints.groupby(by="generation")
-
-        occupied_locations_by_generation = {}
-        generational_n_hot_locations = {}
-
-        for generation in grouped_frame:
-            generation_id = generation[0]
-            locations = generation[1]["current_location_id"]
-
-            occupied_locations_by_generation[generation_id] = set()
-            for location in locations:
-                occupied_locations_by_generation[generation_id].add(location)
-
-            generational_n_hot_locations[generation_id] = defaultdict(
-                lambda: 0.0
-            )
-            for location in occupied_locations_by_generation[generation_id]:
-                generational_n_hot_locations[generation_id].update(
-                    {location: 1.0}
-                )
-
-        generational_n_hot_location_lists = {}
-        for generation in generational_n_hot_locations:
-            location_map = generational_n_hot_locations[generation]
-            n_hot_columns = []
-            for location in self.all_locs_sorted():
-                n_hot_columns.append(location_map[location])
-                generational_n_hot_location_lists[generation] = n_hot_columns
-
-        return generational_n_hot_location_lists
+        return list(self._route_layout()[0])
+
+    # The n-hot column of each location ID, or -1 for locations that aren't
+    # on the route
+    def location_columns(self, loc_ids):
+        codes = self._registry().encode(loc_ids)
+        route_codes = self._registry().route_codes(self.route)
+        on_route = (codes >= route_codes.start) & (codes < route_codes.stop)
+        return self._route_layout()[1][
+            np.where(on_route, codes - route_codes.start, -1)
+        ]
+
+    # Gather the CSR n-hot location rows for the generation of each
+    # datapoint. Generations not seen by the last transform get an empty row.
+    def n_hot_locations(self, datapoints):
+        generation_codes = self.generations_.get_indexer(
+            datapoints["generation"]
+        )
+        return self.occupancy_[generation_codes]
+
+    # The names of the n-hot location columns, in the form FunctionTransformer
+    # expects of its feature_names_out
+    def n_hot_feature_names(self, transformer, input_features):
+        return np.asarray(self.all_locs_sorted(), dtype=object)
+
+    # Take over the occupancy of adders that each transformed a separate set
+    # of generations, so that n_hot_locations can gather rows for all of them
+    def combine(self, locations_adders):
+        generations = [adder.generations_ for adder in locations_adders]
+        self.generations_ = generations[0].append(generations[1:]) \
+            if generations else pd.Index([])
+        self.occupancy_ = vstack(
+            [adder.occupancy_[:-1] for adder in locations_adders] +
+            [csr_matrix(
+                (1, len(self.all_locs_sorted())),
+                dtype=LOCATION_FLAG_DTYPE
+            )],
+            format="csr"
+        )
+        return self
+
+    # Builds a CSR matrix with one row per generation and one column per
+    # location, marking the locations occupied by a vehicle in that
+    # generation. The extra last row is left empty so that a code of -1
+    # gathers zeros.
+    def _occupancy_by_generation(self, vehicle_datapoints):
+        generation_codes, generations = pd.factorize(
+            vehicle_datapoints["generation"]
+        )
+        location_codes = self.location_columns(
+            vehicle_datapoints["current_location_id"]
+        )
+        occupied = (generation_codes >= 0) & (location_codes >= 0)
+
+        occupancy = csr_matrix(
+            (
+                np.ones(
+                    np.count_nonzero(occupied),
+                    dtype=LOCATION_FLAG_DTYPE
+                ),
+                (generation_codes[occupied], location_codes[occupied])
+            ),
+            shape=(len(generations) + 1, len(self.all_locs_sorted()))
+        )
+        occupancy.data[:] = 1.0
+        return pd.Index(generations), occupancy
+
+    # The route's loc_ids in lexicographical order, and the column of each of
+    # the route's codes, with a trailing -1 for codes off the route. A route's
+    # codes are already in loc_id order, but all of them are ordered by line
+    # first.
+    def _route_layout(self):
+        if self._layout is None:
+            loc_ids = self._registry().route_loc_ids(self.route)
+            order = np.argsort(loc_ids.astype(str), kind='stable')
+            columns = np.full(len(order) + 1, -1, dtype=np.int64)
+            columns[order] = np.arange(len(order))
+            self._layout = (loc_ids[order], columns)
+        return self._layout
+
+    def _registry(self):
+        if self.location_registry is not None:
+            return self.location_registry
+        if self._own_registry is None:
+            self._own_registry = LocationRegistry(self.locations_frame)
+        return self._own_registry
@@ -0,0 +1,136 @@
+import gzip
+import itertools
+import pandas as pd
+
+# Parses ml_datapoint log lines into typed frames, one per kind of event,
+# with the same columns as the Splunk CSV exports. Lines can come straight
+# from a log file or from the _raw column of an export. Each line is split
+# once into its key=value tokens, and the columns are gathered and typed from
+# those.
+
+VEHICLE_FIELDS = {
+    'current_location_id': 'str',
+    'generation': 'numeric',
+    'gtfs_trip_id': 'str',
+    'length_of_time_at_current_location': 'numeric',
+    'ocs_trip_id': 'str',
+    'offset_departure_seconds_from_now': 'numeric',
+    'pattern_id': 'numeric',
+    'timestamp': 'str',
+    'vehicle_id': 'str'
+}
+TERMINAL_FIELDS = {
+    'automatic': 'bool',
+    'generation': 'numeric',
+    'terminal_stop_id': 'str',
+    'timestamp': 'str'
+}
+ACTUAL_FIELDS = {
+    'event_type': 'str',
+    'stop_id': 'str',
+    'time': 'numeric',
+    'trip_id': 'str',
+    'vehicle_id': 'str'
+}
+MISSING_VALUES = ['', 'nil']
+
+
+class MlDatapointParser:
+    def __init__(self, chunksize=1000000):
+        self.chunksize = chunksize
+
+    # Parse a sequence of log lines into a dict of vehicle, terminal and
+    # actuals frames. Lines that aren't ml_datapoints are ignored.
+    def parse_lines(self, lines):
+        lines = pd.Series(lines, dtype='str')
+        is_datapoint = lines.str.contains(' ml_datapoint ', regex=False)
+        is_vehicle = lines.str.contains(' vehicle_datapoint ', regex=False)
+        is_terminal = lines.str.contains(' terminal_datapoint ', regex=False)
+
+        return {
+            'vehicles': self._parse_fields(lines[is_vehicle], VEHICLE_FIELDS),
+            'terminals': self._parse_fields(
+                lines[is_terminal],
+                TERMINAL_FIELDS
+            ),
+            'actuals': self._parse_fields(
+                lines[is_datapoint & ~is_vehicle & ~is_terminal],
+                ACTUAL_FIELDS
+            )
+        }
+
+    # Parse any mix of Splunk CSV exports and log files, telling them apart by
+    # their extension
+    def read(self, paths):
+        return self._concat(
+            self.read_splunk_export(path)
+            if path.endswith('.csv') or path.endswith('.csv.gz')
+            else self.read_log(path)
+            for path in paths
+        )
+
+    # Parse a plain or gzipped log file, a chunk of lines at a time
+    def read_log(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as log_file:
+            lines = (line.rstrip('\n') for line in log_file)
+            chunks = iter(
+                lambda: list(itertools.islice(lines, self.chunksize)),
+                []
+            )
+            return self._concat(self.parse_lines(chunk) for chunk in chunks)
+
+    # Parse the _raw column of a Splunk CSV export, skipping all the other
+    # columns
+    def read_splunk_export(self, path):
+        chunks = pd.read_csv(
+            path,
+            usecols=['_raw'],
+            dtype={'_raw': 'str'},
+            chunksize=self.chunksize
+        )
+        return self._concat(
+            self.parse_lines(chunk['_raw']) for chunk in chunks
+        )
+
+    def _concat(self, parsed_chunks):
+        frames = {'vehicles': [], 'terminals': [], 'actuals': []}
+        for parsed in parsed_chunks:
+            for kind, frame in parsed.items():
+                if len(frame):
+                    frames[kind].append(frame)
+
+        empty = self.parse_lines([])
+        return {
+            kind: pd.concat(kind_frames, ignore_index=True)
+            if kind_frames else empty[kind]
+            for kind, kind_frames in frames.items()
+        }
+
+    def _parse_fields(self, lines, fields):
+        records = [
+            dict(
+                token.split('=', 1)
+                for token in line.split(' ') if '=' in token
+            )
+            for line in lines
+        ]
+        return pd.DataFrame({
+            field: self._typed(self._values(records, field), field_type)
+            for field, field_type in fields.items()
+        })
+
+    def _values(self, records, field):
+        values = pd.Series(
+            [record.get(field) for record in records],
+            dtype='str'
+        )
+        return values.mask(values.isin(MISSING_VALUES))
+
+    def _typed(self, values, field_type):
+        if field_type == 'numeric':
+            return pd.to_numeric(values, errors='coerce')
+        elif field_type == 'bool':
+            return values.str.lower().eq('true').astype(bool)
+        else:
+            return values
@@ -1,60 +1,167 @@
 import numpy as np
-from sklearn.metrics import mean_squared_error
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Accuracy bins follow the tolerances of the Prediction Analyzer: a
+# prediction is accurate if its error falls within the bounds for how far
+# away the actual event was.
+HORIZON_BIN_EDGES = np.array([180, 360, 720])
+HORIZON_BIN_NAMES = np.array(['0-3', '3-6', '6-12', '12+'])
+MIN_ACCURACY_BOUNDS = np.array([-60, -90, -150, -240])
+MAX_ACCURACY_BOUNDS = np.array([60, 120, 210, 360])
 
 
 class ModelEvaluator:
-    def __init__(self, model, features, labels):
+    # segments is an optional frame (or dict of arrays) with one row per
+    # label, such as route, time_bin and day_of_week, to break the metrics
+    # down by
+    def __init__(self, model, features, labels, segments=None):
         self.model = model
         self.features = features
-        self.labels = labels
-        self.predictions = self.model.predict(self.features)
+        self.labels = np.asarray(labels, dtype=float)
+        self.predictions = np.asarray(self.model.predict(self.features))
+        self.segments = pd.DataFrame(segments) if segments is not None \
+            else pd.DataFrame(index=range(len(self.labels)))
         self._binned_accuracy = None
         self._rmse = None
 
+        horizon_bins = np.searchsorted(
+            HORIZON_BIN_EDGES,
+            self.labels,
+            side='right'
+        )
+        errors = self.predictions - self.labels
+        self._horizon_bins = horizon_bins
+        self._in_bounds = (errors >= MIN_ACCURACY_BOUNDS[horizon_bins]) & \
+            (errors <= MAX_ACCURACY_BOUNDS[horizon_bins])
+        self._squared_errors = errors ** 2
+
     def binned_accuracy(self):
-        self._binned_accuracy = self._binned_accuracy or \
-            self._calculate_binned_accuracy()
+        if self._binned_accuracy is None:
+            self._binned_accuracy = self._in_bounds.mean()
         return self._binned_accuracy
 
     def rmse(self):
-        self._rmse = self._rmse or self._calculate_rmse()
+        if self._rmse is None:
+            self._rmse = np.sqrt(self._squared_errors.mean())
         return self._rmse
 
-    def _calculate_binned_accuracy(self):
-        min_accuracy_bounds = map(self._min_accuracy_bounds, self.labels)
-        max_accuracy_bounds = map(self._max_accuracy_bounds, self.labels)
-        errors = self.predictions - self.labels
-        self._in_bounds = [
-            error >= min and error <= max
-            for (error, min, max) in zip(
-                errors,
-                min_accuracy_bounds,
-                max_accuracy_bounds
-            )
+    # Count, binned accuracy and RMSE for every value of every segment
+    # column, plus the horizon bin of each label, as one frame indexed by
+    # segment and value. Pass by, a list of segment columns (which can
+    # include horizon_bin), to break them down by every combination of those
+    # columns' values instead, indexed by the columns. Horizon bins are in
+    # the order of their edges.
+    def breakdown(self, by=None):
+        segments = self.segments.assign(horizon_bin=pd.Categorical.from_codes(
+            self._horizon_bins,
+            categories=HORIZON_BIN_NAMES,
+            ordered=True
+        ))
+        if by is not None:
+            return self._grouped_metrics(segments[list(by)])
+
+        metrics = []
+        for segment in segments.columns:
+            segment_metrics = self._grouped_metrics(segments[[segment]])
+            metrics.append(segment_metrics.reset_index(names='value').assign(
+                segment=segment
+            ))
+        return pd.concat(metrics, ignore_index=True). \
+            set_index(['segment', 'value'])
+
+    # The metrics of each combination of the segment columns' values that
+    # some label has, in the order of the values
+    def _grouped_metrics(self, segments):
+        factorized = [
+            pd.factorize(values, sort=True) for _, values in segments.items()
         ]
-        n_within_bounds = len(list(filter(lambda x: x, self._in_bounds))) * 1.0
-        return n_within_bounds / len(self._in_bounds)
-
-    def _calculate_rmse(self):
-        mse = mean_squared_error(self.labels, self.predictions)
-        return np.sqrt(mse)
-
-    def _max_accuracy_bounds(self, seconds):
-        if seconds < 180:
-            return 60
-        elif seconds < 360:
-            return 120
-        elif seconds < 720:
-            return 210
-        else:
-            return 360
-
-    def _min_accuracy_bounds(self, seconds):
-        if seconds < 180:
-            return -60
-        elif seconds < 360:
-            return -90
-        elif seconds < 720:
-            return -150
+        codes = np.column_stack([codes for codes, _ in factorized])
+        known = (codes >= 0).all(axis=1)
+        groups, group_codes = np.unique(
+            codes[known],
+            axis=0,
+            return_inverse=True
+        )
+        group_codes = group_codes.ravel()
+        counts = np.bincount(group_codes, minlength=len(groups))
+        n_in_bounds = np.bincount(
+            group_codes,
+            weights=self._in_bounds[known],
+            minlength=len(groups)
+        )
+        squared_errors = np.bincount(
+            group_codes,
+            weights=self._squared_errors[known],
+            minlength=len(groups)
+        )
+        index = pd.MultiIndex.from_arrays(
+            [
+                uniques.take(groups[:, i])
+                for i, (_, uniques) in enumerate(factorized)
+            ],
+            names=segments.columns.tolist()
+        )
+        return pd.DataFrame(
+            {
+                'count': counts,
+                'binned_accuracy': n_in_bounds / counts,
+                'rmse': np.sqrt(squared_errors / counts)
+            },
+            index=index if index.nlevels > 1 else index.get_level_values(0)
+        )
+
+    # Percentile bootstrap confidence intervals for binned accuracy and
+    # RMSE. The resamples are split across a pool of processes, each with
+    # its own independent random stream, so the result only depends on
+    # random_state and n_jobs.
+    def confidence_intervals(
+        self,
+        n_resamples=1000,
+        confidence=0.95,
+        n_jobs=None,
+        random_state=None
+    ):
+        n_jobs = n_jobs or 1
+        seeds = np.random.SeedSequence(random_state).spawn(n_jobs)
+        resamples_per_job = np.diff(
+            np.linspace(0, n_resamples, n_jobs + 1).astype(int)
+        )
+        jobs = [
+            (self._in_bounds, self._squared_errors, n, seed)
+            for n, seed in zip(resamples_per_job, seeds)
+        ]
+
+        if n_jobs == 1:
+            results = [_bootstrap(*jobs[0])]
         else:
-            return -240
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                results = list(executor.map(_bootstrap, *zip(*jobs)))
+
+        accuracies = np.concatenate([result[0] for result in results])
+        rmses = np.concatenate([result[1] for result in results])
+        tail = (1 - confidence) / 2 * 100
+        return {
+            'binned_accuracy': tuple(
+                np.percentile(accuracies, [tail, 100 - tail]).tolist()
+            ),
+            'rmse': tuple(np.percentile(rmses, [tail, 100 - tail]).tolist())
+        }
+
+
+# Resample the rows n_resamples times, drawing the indices in batches to
+# bound memory on large held-out sets
+def _bootstrap(in_bounds, squared_errors, n_resamples, seed, batch_rows=10**7):
+    rng = np.random.default_rng(seed)
+    n_rows = len(in_bounds)
+    batch_size = max(1, batch_rows // max(n_rows, 1))
+    accuracies = np.empty(n_resamples)
+    rmses = np.empty(n_resamples)
+
+    for start in range(0, n_resamples, batch_size):
+        stop = min(start + batch_size, n_resamples)
+        rows = rng.integers(0, n_rows, size=(stop - start, n_rows))
+        accuracies[start:stop] = in_bounds[rows].mean(axis=1)
+        rmses[start:stop] = np.sqrt(squared_errors[rows].mean(axis=1))
+
+    return accuracies, rmses
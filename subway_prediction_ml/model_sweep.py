@@ -0,0 +1,254 @@
+import errno
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import ParameterGrid, train_test_split
+from sklearn.svm import LinearSVR
+
+from feature_matrix_files import FeatureMatrixFiles
+from model_evaluator import ModelEvaluator
+
+# Fits a grid of models to one set of feature matrices and ranks them. The
+# datapoints are transformed once, split into training and test rows, and
+# kept as FeatureMatrixFiles in a cache keyed by a fingerprint of the input
+# files and the pipeline's parameters, so later sweeps over the same data
+# skip the transformation entirely. The candidates are fitted in a pool of
+# processes that memory-map the cached matrices rather than each getting a
+# copy, and each process can be capped to a share of memory so that a
+# greedy candidate fails on its own instead of taking the machine down. The
+# workers are spawned rather than forked, so that they start out small
+# instead of inheriting everything the parent process has allocated; scripts
+# that run a sweep need an if __name__ == '__main__' guard.
+
+# The models tried in Predictions.ipynb, by name, with the grid of parameters
+# to try for each. A third element of True densifies the features before
+# fitting, which trees need to be fitted in reasonable time.
+DEFAULT_CANDIDATES = {
+    'linear_regression': (LinearRegression(), {}),
+    'random_forest': (
+        RandomForestRegressor(n_estimators=10, random_state=0),
+        {'max_depth': [None, 20]},
+        True
+    ),
+    'svm': (
+        LinearSVR(dual=False, loss='squared_epsilon_insensitive'),
+        {'epsilon': [0], 'C': [0.1, 1.0]}
+    )
+}
+
+LEADERBOARD_COLUMNS = [
+    'model',
+    'params',
+    'rmse',
+    'binned_accuracy',
+    'fit_seconds',
+    'predict_seconds',
+    'error'
+]
+
+
+class ModelSweep:
+    def __init__(
+        self,
+        candidates=None,
+        cache_dir='sweep_cache',
+        test_size=0.2,
+        random_state=42,
+        n_jobs=None,
+        memory_limit_mb=None
+    ):
+        self.candidates = candidates if candidates is not None \
+            else DEFAULT_CANDIDATES
+        self.cache_dir = cache_dir
+        self.test_size = test_size
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.memory_limit_mb = memory_limit_mb
+
+    # Fit every candidate to the training rows of the SubwayPipeline's
+    # datapoints and return a leaderboard, best RMSE on the test rows first.
+    # Candidates that run out of memory are listed last with their error.
+    def run(self, subway_pipeline):
+        matrix_dirs = self.matrix_dirs(subway_pipeline)
+        jobs = [
+            (name, estimator, params, matrix_dirs, any(dense))
+            for name, (estimator, grid, *dense) in self.candidates.items()
+            for params in ParameterGrid(grid)
+        ]
+
+        n_jobs = min(self.n_jobs or os.cpu_count() or 1, len(jobs))
+        if n_jobs <= 1 and self.memory_limit_mb is None:
+            results = [_fit_candidate(*job) for job in jobs]
+        else:
+            results = self._fit_in_pool(jobs, n_jobs)
+
+        return pd.DataFrame(results, columns=LEADERBOARD_COLUMNS). \
+            sort_values(['rmse', 'model'], na_position='last'). \
+            reset_index(drop=True)
+
+    # A worker that dies outright, as one over its memory cap can, breaks
+    # the whole pool. The candidates it took down with it are fitted again
+    # in a pool each, so that only the one that died is marked as failed.
+    def _fit_in_pool(self, jobs, n_jobs):
+        results = self._map_in_pool(jobs, n_jobs)
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self._map_in_pool([jobs[i]], 1)[0] or \
+                    _failed(jobs[i][0], jobs[i][2], "worker process died")
+        return results
+
+    # Results of the jobs, with None for those lost to a broken pool
+    def _map_in_pool(self, jobs, n_jobs):
+        with ProcessPoolExecutor(
+            max_workers=max(n_jobs, 1),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_limit_memory,
+            initargs=(self.memory_limit_mb,)
+        ) as executor:
+            futures = [executor.submit(_fit_candidate, *job) for job in jobs]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool:
+                    results.append(None)
+        return results
+
+    # The directories of the cached training and test FeatureMatrixFiles for
+    # the SubwayPipeline's datapoints, transforming them first if they
+    # aren't cached yet. FeatureMatrixFiles(matrix_dirs['test']).open()
+    # gives back the held-out rows, for plotting without transforming again.
+    def matrix_dirs(self, subway_pipeline):
+        entry_dir = os.path.join(
+            self.cache_dir,
+            self._fingerprint(subway_pipeline)
+        )
+        matrix_dirs = {
+            split: os.path.join(entry_dir, split)
+            for split in ['train', 'test']
+        }
+        if not all(
+            os.path.isfile(os.path.join(matrix_dir, 'matrix.json'))
+            for matrix_dir in matrix_dirs.values()
+        ):
+            self._write_matrices(subway_pipeline, matrix_dirs)
+        return matrix_dirs
+
+    # The encoding and scaler are fitted to all the rows before they are
+    # split, as the notebook's pipeline was
+    def _write_matrices(self, subway_pipeline, matrix_dirs):
+        features, labels = subway_pipeline.features_and_labels(
+            subway_pipeline.load()
+        )
+        feature_names = subway_pipeline.feature_names()
+        train_rows, test_rows = train_test_split(
+            np.arange(features.shape[0]),
+            test_size=self.test_size,
+            random_state=self.random_state
+        )
+        for split, rows in [('train', train_rows), ('test', test_rows)]:
+            FeatureMatrixFiles(matrix_dirs[split]).write(
+                features[np.sort(rows)],
+                labels[np.sort(rows)],
+                feature_names
+            )
+
+    # Like the InputCache, input files are identified by their path, size
+    # and modification time rather than by hashing their contents
+    def _fingerprint(self, subway_pipeline):
+        paths = subway_pipeline.log_paths or [
+            subway_pipeline.actuals_path,
+            subway_pipeline.locations_path,
+            subway_pipeline.patterns_path,
+            subway_pipeline.terminals_path,
+            subway_pipeline.vehicles_path
+        ]
+        inputs = []
+        for path in paths:
+            stat = os.stat(path)
+            inputs.append(
+                [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+            )
+        key = json.dumps({
+            'inputs': inputs,
+            'route': subway_pipeline.route,
+            'scheduled_run_times': subway_pipeline.scheduled_run_times,
+            'sparse_locations': subway_pipeline.sparse_locations,
+            'sparse_output': subway_pipeline.sparse_output,
+            'test_size': self.test_size,
+            'random_state': self.random_state
+        }, sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+# Cap the private memory of a worker process, so that allocations past it
+# fail in that worker. The memory-mapped matrices are shared, and don't count
+# towards it.
+def _limit_memory(memory_limit_mb):
+    if memory_limit_mb is None:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard_limit != resource.RLIM_INFINITY:
+        limit = min(limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard_limit))
+
+
+# Fit one candidate and score it on the test rows. ModelEvaluator makes the
+# predictions, so predict_seconds covers scoring them too.
+def _fit_candidate(name, estimator, params, matrix_dirs, dense=False):
+    try:
+        train_features, train_labels, _ = \
+            FeatureMatrixFiles(matrix_dirs['train']).open()
+        test_features, test_labels, _ = \
+            FeatureMatrixFiles(matrix_dirs['test']).open()
+        if dense:
+            train_features = train_features.toarray()
+            test_features = test_features.toarray()
+        model = clone(estimator).set_params(**params)
+
+        started = time.perf_counter()
+        model.fit(train_features, train_labels)
+        fitted = time.perf_counter()
+        evaluator = ModelEvaluator(model, test_features, test_labels)
+        predicted = time.perf_counter()
+
+        return [
+            name,
+            json.dumps(params, sort_keys=True),
+            evaluator.rmse(),
+            evaluator.binned_accuracy(),
+            fitted - started,
+            predicted - fitted,
+            None
+        ]
+    except (MemoryError, OSError) as error:
+        # Only running out of memory is a failure of the candidate; anything
+        # else, like a bad parameter, is a mistake in the sweep and is
+        # raised. Mapping the matrices past the cap fails with ENOMEM.
+        if isinstance(error, OSError) and error.errno != errno.ENOMEM:
+            raise
+        return _failed(name, params, repr(error))
+
+
+def _failed(name, params, error):
+    return [
+        name,
+        json.dumps(params, sort_keys=True),
+        np.nan,
+        np.nan,
+        np.nan,
+        np.nan,
+        error
+    ]
@@ -1,6 +1,26 @@
 import numpy as np
+import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
+# Offsets are binned by the upper edges below, with "negative" for anything
+# under 0 and "nan" for missing offsets
+OFFSET_EDGES = np.arange(0, 5001, 500)
+OFFSET_LABELS = [
+    "nan",
+    "negative",
+    "0-500",
+    "500-1000",
+    "1000-1500",
+    "1500-2000",
+    "2000-2500",
+    "2500-3000",
+    "3000-3500",
+    "3500-4000",
+    "4000-4500",
+    "4500-5000",
+    "5000+"
+]
+
 
 class OffsetSecondsEncoder(BaseEstimator, TransformerMixin):
     def __init__(self):
@@ -9,37 +29,20 @@ class OffsetSecondsEncoder(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    # The bins come back as a categorical column, so each row only holds a
+    # small integer code for its label
     def transform(self, vehicle_datapoints, y=None):
         vehicle_datapoints['offset_departure_seconds_from_now'] = \
-            vehicle_datapoints['offset_departure_seconds_from_now'].apply(
-                self._encode_offset
+            self._encode_offsets(
+                vehicle_datapoints['offset_departure_seconds_from_now']
             )
         return vehicle_datapoints
 
-    def _encode_offset(self, offset):
-        if np.isnan(offset):
-            return "nan"
-        elif offset < 0:
-            return "negative"
-        elif offset < 500:
-            return "0-500"
-        elif offset < 1000:
-            return "500-1000"
-        elif offset < 1500:
-            return "1000-1500"
-        elif offset < 2000:
-            return "1500-2000"
-        elif offset < 2500:
-            return "2000-2500"
-        elif offset < 3000:
-            return "2500-3000"
-        elif offset < 3500:
-            return "3000-3500"
-        elif offset < 4000:
-            return "3500-4000"
-        elif offset < 4500:
-            return "4000-4500"
-        elif offset < 5000:
-            return "4500-5000"
-        else:
-            return "5000+"
+    def _encode_offsets(self, offsets):
+        offsets = pd.to_numeric(offsets).to_numpy(dtype=float)
+        codes = np.where(
+            np.isnan(offsets),
+            0,
+            np.digitize(offsets, OFFSET_EDGES) + 1
+        ).astype(np.int8)
+        return pd.Categorical.from_codes(codes, categories=OFFSET_LABELS)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from prediction_featurizer import ACCURACY_BIN_NAMES, PredictionFeaturizer
+
+# The error-correction model of Predictions.ipynb as a batch scorer. The model
+# learns the error of each prediction, the seconds between the predicted and
+# the actual arrival, from the PredictionFeaturizer's features, and its
+# ml_arrival_time is the predicted arrival corrected by that error. Scoring
+# works a chunk of records at a time, such as PredictionsDataset.chunks
+# yields, so tens of millions of predictions are scored in bounded memory,
+# and route_accuracy only keeps running totals per route between chunks.
+
+# Accuracy bounds of the Prediction Analyzer for each accuracy bin, in
+# seconds of error. Predictions outside of the scored bins are never
+# accurate.
+MIN_ACCURACY_BOUNDS = np.array([np.inf, -60, -90, -150, -240, np.inf])
+MAX_ACCURACY_BOUNDS = np.array([-np.inf, 60, 120, 210, 360, -np.inf])
+
+ROUTE_ACCURACY_COLUMNS = [
+    'count',
+    'prediction_accuracy',
+    'ml_accuracy',
+    'prediction_rmse',
+    'ml_rmse'
+]
+
+
+class PredictionErrorScorer:
+    def __init__(self, model=None, featurizer=None):
+        self.model = model if model is not None else LinearRegression()
+        self.featurizer = featurizer if featurizer is not None \
+            else PredictionFeaturizer()
+
+    # Fit the featurizer and the model to the predictions that have an
+    # actual arrival time
+    def fit(self, predictions):
+        labels = self._errors(predictions, 'predictions_arrival_time')
+        has_actual = ~np.isnan(labels)
+        features = self.featurizer.fit_transform(predictions)
+        self.model.fit(features[has_actual], labels[has_actual])
+        return self
+
+    # The scores of a chunk of predictions, on the chunk's index: the
+    # corrected ml_arrival_time, its ml_error, the accuracy bin, and whether
+    # the original and corrected predictions were accurate. Errors and
+    # accuracy need an actual arrival time; without one, the errors are NaN
+    # and neither prediction counts as accurate.
+    def score(self, predictions):
+        bins = self.featurizer.accuracy_bins(predictions)
+        ml_arrival_times = \
+            predictions['predictions_arrival_time'].to_numpy(np.float64) + \
+            self.model.predict(self.featurizer.transform(predictions))
+        ml_errors = \
+            predictions['ve_arrival_time'].to_numpy(np.float64) - \
+            ml_arrival_times
+        prediction_errors = \
+            self._errors(predictions, 'predictions_arrival_time')
+
+        return pd.DataFrame(
+            {
+                'ml_arrival_time': ml_arrival_times,
+                'ml_error': ml_errors,
+                'accuracy_bin': ACCURACY_BIN_NAMES[bins],
+                'prediction_accurate': self._accurate(bins, prediction_errors),
+                'ml_accurate': self._accurate(bins, ml_errors)
+            },
+            index=predictions.index
+        )
+
+    # Scores of each chunk in turn
+    def score_chunks(self, chunks):
+        for chunk in chunks:
+            yield self.score(chunk)
+
+    # Accuracy and RMSE of the original and corrected predictions for each
+    # route, over every chunk of predictions, counting the predictions that
+    # have an actual arrival time
+    def route_accuracy(self, chunks):
+        totals = {}
+        for chunk in chunks:
+            scores = self.score(chunk)
+            has_actual = ~np.isnan(scores['ml_error'].to_numpy())
+            codes, routes = pd.factorize(
+                chunk['predictions_route_id'].to_numpy()[has_actual]
+            )
+            prediction_errors = \
+                self._errors(chunk, 'predictions_arrival_time')[has_actual]
+            ml_errors = scores['ml_error'].to_numpy()[has_actual]
+            sums = np.column_stack([
+                np.bincount(codes, minlength=len(routes)),
+                np.bincount(
+                    codes,
+                    weights=scores['prediction_accurate'].
+                    to_numpy()[has_actual],
+                    minlength=len(routes)
+                ),
+                np.bincount(
+                    codes,
+                    weights=scores['ml_accurate'].to_numpy()[has_actual],
+                    minlength=len(routes)
+                ),
+                np.bincount(
+                    codes,
+                    weights=prediction_errors ** 2,
+                    minlength=len(routes)
+                ),
+                np.bincount(
+                    codes,
+                    weights=ml_errors ** 2,
+                    minlength=len(routes)
+                )
+            ])
+            for route, route_sums in zip(routes, sums):
+                totals[route] = totals.get(route, 0) + route_sums
+
+        routes = sorted(totals)
+        sums = np.array([totals[route] for route in routes]). \
+            reshape(len(routes), len(ROUTE_ACCURACY_COLUMNS))
+        counts = sums[:, 0]
+        return pd.DataFrame(
+            {
+                'count': counts.astype(np.int64),
+                'prediction_accuracy': sums[:, 1] / counts,
+                'ml_accuracy': sums[:, 2] / counts,
+                'prediction_rmse': np.sqrt(sums[:, 3] / counts),
+                'ml_rmse': np.sqrt(sums[:, 4] / counts)
+            },
+            index=pd.Index(routes, name='predictions_route_id'),
+            columns=ROUTE_ACCURACY_COLUMNS
+        )
+
+    # Seconds between the arrival time in the given column and the actual
+    # arrival, NaN without either
+    def _errors(self, predictions, arrival_time_column):
+        return predictions['ve_arrival_time'].to_numpy(np.float64) - \
+            predictions[arrival_time_column].to_numpy(np.float64)
+
+    # NaN errors fall outside of any bounds
+    def _accurate(self, bins, errors):
+        return (errors >= MIN_ACCURACY_BOUNDS[bins]) & \
+            (errors <= MAX_ACCURACY_BOUNDS[bins])
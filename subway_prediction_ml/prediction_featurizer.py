@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from service_time import ServiceTime
+
+# Turns prediction records, as in PredictionsDataset, into the features of
+# the error-correction model in Predictions.ipynb: whether the train was
+# stopped at the station, how many stops away it was, and one-hot columns for
+# the stop, the day of the week, the accuracy bin and the 15-minute time bin
+# of the prediction. Every column is computed from whole arrays and the CSR
+# matrix is built straight from the codes, without copying the frame.
+#
+# The day and time bin are in Eastern time. Stops that weren't seen in fit
+# get no stop column, and predictions without a file timestamp no day or time
+# bin column, rather than failing the whole batch.
+
+# A prediction's accuracy bin is given by how far ahead of the predicted
+# arrival it was made, as in the Prediction Analyzer. Predictions made more
+# than 30 seconds after the arrival or 30 or more minutes before it, and
+# those without an arrival time, are outside of the bins it scores.
+ACCURACY_BIN_EDGES = np.array([-30, 180, 360, 720, 1800])
+ACCURACY_BIN_NAMES = np.array(['na-', '0-3', '3-6', '6-12', '12-30', 'na+'])
+N_WEEKDAYS = 7
+N_TIME_BINS = 96
+
+
+class PredictionFeaturizer(BaseEstimator, TransformerMixin):
+    def fit(self, X, y=None):
+        self.stop_ids_ = np.sort(
+            np.asarray(pd.unique(X['predictions_stop_id'].dropna()))
+        )
+        return self
+
+    def transform(self, X, y=None):
+        n_rows = len(X)
+        weekdays, time_bins, known_time = self._local_times(X)
+        n_stops = len(self.stop_ids_)
+        stop_codes = pd.Index(self.stop_ids_).get_indexer(
+            X['predictions_stop_id']
+        )
+        known_stop = stop_codes >= 0
+
+        # Each row has its two passthrough values and a one in each one-hot
+        # group, except the stop group for unknown stops
+        columns = [
+            np.zeros(n_rows, dtype=np.int64),
+            np.ones(n_rows, dtype=np.int64),
+            2 + stop_codes,
+            2 + n_stops + weekdays,
+            2 + n_stops + N_WEEKDAYS + self.accuracy_bins(X),
+            2 + n_stops + N_WEEKDAYS + len(ACCURACY_BIN_NAMES) +
+            time_bins
+        ]
+        values = [
+            X['predictions_boarding_status'].notna().to_numpy(np.float64),
+            X['predictions_stops_away'].to_numpy(np.float64),
+            np.ones(n_rows),
+            np.ones(n_rows),
+            np.ones(n_rows),
+            np.ones(n_rows)
+        ]
+        entries = np.ones((n_rows, len(columns)), dtype=bool)
+        entries[:, 2] = known_stop
+        entries[:, 3] = known_time
+        entries[:, 5] = known_time
+
+        return csr_matrix(
+            (
+                np.column_stack(values)[entries],
+                np.column_stack(columns)[entries].astype(np.int32),
+                np.concatenate([[0], np.cumsum(entries.sum(axis=1))])
+            ),
+            shape=(n_rows, self.n_features())
+        )
+
+    # Index into ACCURACY_BIN_NAMES of each prediction's accuracy bin
+    def accuracy_bins(self, X):
+        horizon = X['predictions_arrival_time'].to_numpy(np.float64) - \
+            X['predictions_file_timestamp'].to_numpy(np.float64)
+        return np.digitize(horizon, ACCURACY_BIN_EDGES)
+
+    # The Eastern day of the week and time bin of each prediction, zero for
+    # those without a file timestamp, and which predictions have one
+    def _local_times(self, X):
+        timestamps = X['predictions_file_timestamp']
+        known_time = timestamps.notna().to_numpy()
+        service_time = ServiceTime(timestamps[known_time])
+        weekdays = np.zeros(len(X), dtype=np.int64)
+        time_bins = np.zeros(len(X), dtype=np.int64)
+        weekdays[known_time] = service_time.local_weekdays()
+        time_bins[known_time] = service_time.local_time_bins()
+        return weekdays, time_bins, known_time
+
+    def n_features(self):
+        return 2 + len(self.stop_ids_) + N_WEEKDAYS + \
+            len(ACCURACY_BIN_NAMES) + N_TIME_BINS
+
+    # Named like the notebook's ColumnTransformer would name them
+    def get_feature_names_out(self, input_features=None):
+        return np.array(
+            ['is_stopped', 'predictions_stops_away'] +
+            [f'predictions_stop_id_{stop}' for stop in self.stop_ids_] +
+            [f'predictions_day_of_week_{day}' for day in range(N_WEEKDAYS)] +
+            [f'accuracy_bin_{name}' for name in ACCURACY_BIN_NAMES] +
+            [
+                f'predictions_time_bin_{time_bin}'
+                for time_bin in range(N_TIME_BINS)
+            ],
+            dtype=object
+        )
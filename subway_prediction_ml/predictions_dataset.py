@@ -0,0 +1,231 @@
+import functools
+import json
+import operator
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from column_schema import PREDICTIONS_COLUMNS
+from service_time import ServiceTime
+
+# Converts predictions.csv.gz, as exported from the prediction analyzer, into
+# a Parquet dataset partitioned by route and service date, so that loading a
+# route or a window of dates only reads those partitions. The CSV is read a
+# chunk at a time, so converting it never holds the whole file in memory.
+# Filters on the prediction horizon and error are pushed down into the scan
+# too, and Parquet's row group statistics skip whatever they can.
+#
+#     dataset_dir/_source.json
+#     dataset_dir/predictions_route_id=Red/service_date=2019-05-17/*.parquet
+#
+# Every chunk is read with the types in column_schema.PREDICTIONS_COLUMNS, so
+# that the types don't depend on what the first rows happen to hold. Each
+# row also gets its predictions_error, the seconds between the predicted and
+# the actual arrival, so the notebook's error bounds can be pushed down.
+
+# Where the dataset records the CSV it was converted from. The scan skips
+# files starting with an underscore.
+SOURCE_FILE = '_source.json'
+PARTITIONING = ds.partitioning(
+    pa.schema([
+        ('predictions_route_id', pa.string()),
+        ('service_date', pa.string())
+    ]),
+    flavor='hive'
+)
+
+
+class PredictionsDataset:
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+
+    def exists(self):
+        return os.path.isdir(self.dataset_dir)
+
+    # Convert the CSV, unless the dataset was already converted from it. The
+    # size and modification time of the CSV are kept in the dataset's
+    # SOURCE_FILE, and a CSV that differs from them is converted again. The
+    # dataset is written next to where it belongs and moved into place once
+    # complete.
+    def convert(self, csv_path, chunksize=1000000, overwrite=False):
+        source = self._source(csv_path)
+        if self.exists() and not overwrite and \
+                self._converted_source() == source:
+            return self
+
+        temporary_dir = f"{self.dataset_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        dtype = self._column_types(csv_path)
+        schema = pa.schema(
+            [
+                (column, pa.string() if column_type is str else pa.float64())
+                for column, column_type in dtype.items()
+            ] +
+            [
+                ('predictions_error', pa.float64()),
+                ('service_date', pa.string())
+            ]
+        )
+        for chunk_number, chunk in enumerate(pd.read_csv(
+            csv_path,
+            dtype=dtype,
+            chunksize=chunksize
+        )):
+            ds.write_dataset(
+                pa.Table.from_pandas(
+                    self._with_derived_columns(chunk),
+                    schema=schema,
+                    preserve_index=False
+                ),
+                temporary_dir,
+                format='parquet',
+                partitioning=PARTITIONING,
+                basename_template=f'part-{chunk_number}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore'
+            )
+
+        os.makedirs(temporary_dir, exist_ok=True)
+        with open(os.path.join(temporary_dir, SOURCE_FILE), 'w') as \
+                source_file:
+            json.dump(source, source_file)
+        shutil.rmtree(self.dataset_dir, ignore_errors=True)
+        os.replace(temporary_dir, self.dataset_dir)
+        return self
+
+    # Read the predictions for the given routes and service dates, from
+    # start_date to end_date inclusive, as a dataframe. horizon_seconds
+    # keeps predictions made between so many seconds before and after the
+    # predicted arrival, exclusive, and error_seconds keeps those whose error
+    # is between the given bounds, inclusive. Both drop predictions without
+    # the times they need. Only the given columns are read, if any are given.
+    def load(
+        self,
+        routes=None,
+        start_date=None,
+        end_date=None,
+        horizon_seconds=None,
+        error_seconds=None,
+        columns=None
+    ):
+        return self._dataset().to_table(
+            columns=columns,
+            filter=self._filter(
+                routes,
+                start_date,
+                end_date,
+                horizon_seconds,
+                error_seconds
+            )
+        ).to_pandas()
+
+    # Yield the predictions load would return as dataframes of at most
+    # chunksize rows, so that memory stays bounded however many match
+    def chunks(
+        self,
+        chunksize=1000000,
+        routes=None,
+        start_date=None,
+        end_date=None,
+        horizon_seconds=None,
+        error_seconds=None,
+        columns=None
+    ):
+        for batch in self._dataset().to_batches(
+            columns=columns,
+            filter=self._filter(
+                routes,
+                start_date,
+                end_date,
+                horizon_seconds,
+                error_seconds
+            ),
+            batch_size=chunksize
+        ):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def _source(self, csv_path):
+        stat = os.stat(csv_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _converted_source(self):
+        try:
+            with open(os.path.join(self.dataset_dir, SOURCE_FILE)) as \
+                    source_file:
+                return json.load(source_file)
+        except FileNotFoundError:
+            return None
+
+    def _dataset(self):
+        return ds.dataset(
+            self.dataset_dir,
+            format='parquet',
+            partitioning=PARTITIONING
+        )
+
+    def _filter(
+        self,
+        routes,
+        start_date,
+        end_date,
+        horizon_seconds,
+        error_seconds
+    ):
+        conditions = []
+        if routes is not None:
+            conditions.append(
+                ds.field('predictions_route_id').isin(list(routes))
+            )
+        if start_date is not None:
+            conditions.append(
+                ds.field('service_date') >= self._iso_date(start_date)
+            )
+        if end_date is not None:
+            conditions.append(
+                ds.field('service_date') <= self._iso_date(end_date)
+            )
+        if horizon_seconds is not None:
+            horizon = ds.field('predictions_arrival_time') - \
+                ds.field('predictions_file_timestamp')
+            conditions += [
+                horizon > horizon_seconds[0],
+                horizon < horizon_seconds[1]
+            ]
+        if error_seconds is not None:
+            conditions += [
+                ds.field('predictions_error') >= error_seconds[0],
+                ds.field('predictions_error') <= error_seconds[1]
+            ]
+        if not conditions:
+            return None
+        return functools.reduce(operator.and_, conditions)
+
+    # Predictions without a file timestamp have no service date
+    def _with_derived_columns(self, chunk):
+        timestamps = chunk['predictions_file_timestamp']
+        known = timestamps.notna().to_numpy()
+        service_dates = np.full(len(chunk), None, dtype=object)
+        service_dates[known] = \
+            ServiceTime(timestamps[known]).iso_service_dates()
+        return chunk.assign(
+            predictions_error=chunk['ve_arrival_time'] -
+            chunk['predictions_arrival_time'],
+            service_date=service_dates
+        )
+
+    # The types of the CSV's columns, from its header. Columns that aren't in
+    # the schema are read as strings.
+    def _column_types(self, csv_path):
+        return {
+            column: PREDICTIONS_COLUMNS.get(column, str)
+            for column in pd.read_csv(csv_path, nrows=0).columns
+        }
+
+    def _iso_date(self, date):
+        if isinstance(date, str):
+            return date
+        return date.isoformat()
@@ -1,5 +1,7 @@
 from sklearn.base import BaseEstimator, TransformerMixin
 
+import column_schema
+
 
 class RouteFilter(BaseEstimator, TransformerMixin):
     def __init__(self, route):
@@ -10,6 +12,7 @@ class RouteFilter(BaseEstimator, TransformerMixin):
 
     def transform(self, vehicle_datapoints, y=None):
         chosen_route_only = vehicle_datapoints.loc[
-            vehicle_datapoints.vehicle_id.map(lambda id: id[0] == self.route)
+            column_schema.strings(vehicle_datapoints.vehicle_id).str[0] ==
+            self.route
         ]
         return chosen_route_only.copy()
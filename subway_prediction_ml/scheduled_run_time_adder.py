@@ -0,0 +1,38 @@
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from column_schema import FEATURE_COLUMNS
+
+# The scheduled seconds given to a destination that can't be reached from the
+# vehicle's location, which scheduled_run_unreachable flags
+UNREACHABLE_RUN_SECONDS = 0.0
+
+
+class ScheduledRunTimeAdder(BaseEstimator, TransformerMixin):
+    def __init__(self, track_graph):
+        self.track_graph = track_graph
+
+    def fit(self, X, y=None):
+        return self
+
+    # Add the scheduled seconds of running from each datapoint's current
+    # location to its destination, gathered from the TrackGraph. Datapoints
+    # whose destination can't be reached from where the vehicle is are kept,
+    # with UNREACHABLE_RUN_SECONDS and scheduled_run_unreachable set, so the
+    # rows are the same as without the feature.
+    def transform(self, joined_datapoints, y=None):
+        run_seconds = self.track_graph.run_seconds(
+            joined_datapoints['current_location_id'],
+            joined_datapoints['destination_gtfs_id']
+        )
+        unreachable = np.isnan(run_seconds)
+        return joined_datapoints.assign(
+            scheduled_run_seconds=np.where(
+                unreachable,
+                UNREACHABLE_RUN_SECONDS,
+                run_seconds
+            ).astype(FEATURE_COLUMNS['scheduled_run_seconds']),
+            scheduled_run_unreachable=unreachable.astype(
+                FEATURE_COLUMNS['scheduled_run_unreachable']
+            )
+        )
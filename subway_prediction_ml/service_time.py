@@ -0,0 +1,91 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Derives the time features the transformers need from a column of
+# timestamps. The column is parsed once into integer microseconds since the
+# epoch, and every derived value is computed from that array in one pass.
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+SERVICE_TIMEZONE = "America/New_York"
+SERVICE_DAY_OFFSET_SECONDS = 10800
+UNIX_EPOCH_ORDINAL = 719163
+
+
+class ServiceTime:
+    def __init__(self, timestamps):
+        self._epoch_microseconds = self._parse(timestamps)
+
+    # Seconds since the epoch, with microsecond precision
+    def epoch_seconds(self):
+        return self._epoch_microseconds / 1e6
+
+    # Day of the week in UTC, Monday = 0
+    def weekdays(self):
+        days = self._epoch_microseconds // 86400000000
+        return (days + 3) % 7
+
+    # 15-minute bin of the UTC time of day, from 0 to 95
+    def time_bins(self):
+        seconds_of_day = (self._epoch_microseconds // 1000000) % 86400
+        return seconds_of_day // 900
+
+    # Day of the week in Eastern time, Monday = 0
+    def local_weekdays(self):
+        days = self._local_microseconds(self._epoch_microseconds) // \
+            86400000000
+        return (days + 3) % 7
+
+    # 15-minute bin of the Eastern time of day, from 0 to 95
+    def local_time_bins(self):
+        seconds_of_day = (
+            self._local_microseconds(self._epoch_microseconds) // 1000000
+        ) % 86400
+        return seconds_of_day // 900
+
+    # Proleptic Gregorian ordinal of the service date. Service days run 3 AM
+    # to 3 AM Eastern time, so adjust the time by 3 hours before converting.
+    def service_dates(self):
+        days = self._local_microseconds(
+            self._epoch_microseconds - SERVICE_DAY_OFFSET_SECONDS * 1000000
+        ) // 86400000000
+        return days + UNIX_EPOCH_ORDINAL
+
+    # The service dates as ISO strings, which sort and compare in order
+    def iso_service_dates(self):
+        ordinals, codes = np.unique(self.service_dates(), return_inverse=True)
+        iso_dates = np.array([
+            datetime.date.fromordinal(int(ordinal)).isoformat()
+            for ordinal in ordinals
+        ], dtype=object)
+        return iso_dates[codes]
+
+    # Microseconds since the epoch of the Eastern wall clock time, so that
+    # whole days divide out at local midnight
+    def _local_microseconds(self, epoch_microseconds):
+        local = pd.DatetimeIndex(
+            epoch_microseconds,
+            dtype="datetime64[us]"
+        ).tz_localize("UTC").tz_convert(SERVICE_TIMEZONE).tz_localize(None)
+        return local.to_numpy().astype("datetime64[us]").astype(np.int64)
+
+    # Accepts either ISO 8601 strings as logged by RTR or numeric epoch
+    # seconds, as logged by the prediction analyzer
+    def _parse(self, timestamps):
+        values = pd.Series(timestamps)
+        # Categoricals only parse each distinct timestamp once
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            parsed = self._parse(pd.Series(values.cat.categories))
+            return np.append(parsed, np.iinfo(np.int64).min)[
+                values.cat.codes.to_numpy()
+            ]
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            seconds = values.to_numpy(dtype=np.float64)
+            return np.round(seconds * 1e6).astype(np.int64)
+
+        datetimes = pd.to_datetime(values, format=TIMESTAMP_FORMAT, utc=True)
+        return datetimes.dt.tz_localize(None). \
+            to_numpy(). \
+            astype("datetime64[us]"). \
+            astype(np.int64)
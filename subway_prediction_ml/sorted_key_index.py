@@ -0,0 +1,41 @@
+import numpy as np
+
+# Indexes rows by an integer key, with the rows for each key contiguous and in
+# their original order, so that an inner join against it is a gather instead
+# of a merge. Keys below 0 never match.
+
+
+class SortedKeyIndex:
+    def __init__(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.starts, self.counts = np.unique(
+            keys[self.order],
+            return_index=True,
+            return_counts=True
+        )
+
+    # The start, in sorted order, and number of rows for each key
+    def lookup(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        starts = np.zeros(len(keys), dtype=np.int64)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        if len(self.keys):
+            positions = np.minimum(
+                np.searchsorted(self.keys, keys),
+                len(self.keys) - 1
+            )
+            found = (keys >= 0) & (self.keys[positions] == keys)
+            starts[found] = self.starts[positions[found]]
+            counts[found] = self.counts[positions[found]]
+        return starts, counts
+
+    # Pairs of row positions, one for every indexed row matching each key,
+    # ordered by the position of the key and then by indexed row, as an inner
+    # merge orders them
+    def gather(self, keys):
+        starts, counts = self.lookup(keys)
+        key_rows = np.repeat(np.arange(len(counts)), counts)
+        match_offsets = np.arange(len(key_rows)) - \
+            np.repeat(np.cumsum(counts) - counts, counts)
+        return key_rows, self.order[starts[key_rows] + match_offsets]
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# A drop-in replacement for OneHotEncoder on the columns the final transformer
+# encodes. Each column is mapped to integer codes against the categories
+# learned in fit with one hash lookup, and since every row has exactly one
+# entry per column, the CSR matrix is built straight from those codes.
+# Categorical columns are mapped by their categories rather than row by row.
+# Columns and their order match OneHotEncoder's, and as there, missing values
+# are a category of their own when the categories are learned, and an error
+# when they aren't among the given ones.
+
+
+class SparseOneHotEncoder(BaseEstimator, TransformerMixin):
+    def __init__(self, categories='auto'):
+        self.categories = categories
+
+    def fit(self, X, y=None):
+        columns = self._columns(X)
+        if self.categories == 'auto':
+            self.categories_ = [
+                self._sorted_categories(values) for values in columns
+            ]
+        else:
+            self.categories_ = [
+                np.asarray(categories) for categories in self.categories
+            ]
+
+        self.n_features_in_ = len(columns)
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self._check_known(columns, 'fit')
+        return self
+
+    def transform(self, X, y=None):
+        columns = self._columns(X)
+        codes = self._check_known(columns, 'transform')
+
+        widths = np.array([len(categories) for categories in self.categories_])
+        offsets = np.concatenate([[0], np.cumsum(widths)[:-1]])
+        indices = (np.column_stack(codes) + offsets).ravel()
+        n_rows = len(X)
+
+        return csr_matrix(
+            (
+                np.ones(len(indices)),
+                indices.astype(np.int32),
+                np.arange(n_rows + 1) * len(codes)
+            ),
+            shape=(n_rows, int(widths.sum()))
+        )
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is None:
+            input_features = getattr(
+                self,
+                'feature_names_in_',
+                [f'x{i}' for i in range(self.n_features_in_)]
+            )
+        return np.array([
+            f'{feature}_{category}'
+            for feature, categories in zip(input_features, self.categories_)
+            for category in categories
+        ], dtype=object)
+
+    # Map each column to codes, raising like OneHotEncoder if any value
+    # isn't one of the categories
+    def _check_known(self, columns, method):
+        codes = []
+        for i, (values, categories) in \
+                enumerate(zip(columns, self.categories_)):
+            column_codes = self._codes(values, categories)
+            unknown = column_codes < 0
+            if unknown.any():
+                column = f"column {i}" if values.name is None \
+                    else f"column {i} ({values.name})"
+                if values[unknown].isna().any():
+                    raise ValueError(
+                        f"Found missing values in {column} during {method}, "
+                        f"which aren't one of its categories"
+                    )
+                raise ValueError(
+                    f"Found unknown categories "
+                    f"{list(pd.unique(np.asarray(values)[unknown]))} in "
+                    f"{column} during {method}"
+                )
+            codes.append(column_codes)
+        return codes
+
+    # Missing values of a categorical have the code -1, which takes the last
+    # entry: the code of the missing category, if there is one
+    def _codes(self, values, categories):
+        categories = pd.Index(categories)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            category_codes = np.append(
+                categories.get_indexer(values.cat.categories),
+                categories.get_indexer([np.nan])
+            )
+            return category_codes[values.cat.codes.to_numpy()]
+        return categories.get_indexer(values)
+
+    # Sorted like OneHotEncoder, with any missing value as the last category
+    def _sorted_categories(self, values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.remove_unused_categories()
+            observed = np.asarray(values.cat.categories)
+        else:
+            observed = pd.unique(values.dropna())
+        categories = np.sort(np.asarray(observed))
+        if values.isna().any():
+            categories = np.append(categories.astype(object), np.nan)
+        return categories
+
+    def _columns(self, X):
+        if isinstance(X, pd.DataFrame):
+            return [X[column] for column in X.columns]
+        X = np.asarray(X)
+        return [pd.Series(X[:, i]) for i in range(X.shape[1])]
@@ -0,0 +1,140 @@
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from scipy.sparse import issparse
+
+# Records how long each step of a pipeline takes, how much memory it uses and
+# how many rows and columns go in and come out, so that a slow load can be
+# pinned on a step and rows lost in a merge can be spotted. Calls to the same
+# step, such as one per chunk, are added up.
+
+REPORT_COLUMNS = [
+    'step',
+    'calls',
+    'wall_seconds',
+    'cpu_seconds',
+    'rows_in',
+    'columns_in',
+    'rows_out',
+    'columns_out',
+    'output_mb',
+    'traced_peak_mb',
+    'peak_rss_mb'
+]
+
+
+class StepProfiler:
+    # tracemalloc catches the peak memory of each step, but slows pandas
+    # down a lot, so it's only used when trace_memory is set. The peak RSS of
+    # the process is always recorded.
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self._steps = {}
+
+    # Fit and transform X with each step of a pipeline in turn, the same way
+    # Pipeline.fit_transform does, profiling each one
+    def fit_transform(self, pipeline, X):
+        for name, step in pipeline.steps:
+            X = self.measure(name, step.fit_transform, X)
+        return X
+
+    def transform(self, pipeline, X):
+        for name, step in pipeline.steps:
+            X = self.measure(name, step.transform, X)
+        return X
+
+    # Call function with the input, if there is one, and record it under the
+    # step name. The traced peak is how far memory rose above where it was
+    # when the step started.
+    def measure(self, name, function, X=None):
+        rows_in, columns_in = self._shape(X)
+        already_tracing = tracemalloc.is_tracing()
+        if self.trace_memory:
+            if already_tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            output = function() if X is None else function(X)
+            wall_seconds = time.perf_counter() - started
+            cpu_seconds = time.process_time() - cpu_started
+            traced_peak = tracemalloc.get_traced_memory()[1] - traced_start \
+                if self.trace_memory else None
+        finally:
+            if self.trace_memory and not already_tracing:
+                tracemalloc.stop()
+        rows_out, columns_out = self._shape(output)
+
+        record = self._steps.setdefault(name, {
+            'step': name,
+            'calls': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'rows_in': None,
+            'columns_in': columns_in,
+            'rows_out': 0,
+            'columns_out': columns_out,
+            'output_mb': 0.0,
+            'traced_peak_mb': None,
+            'peak_rss_mb': 0.0
+        })
+        record['calls'] += 1
+        record['wall_seconds'] += wall_seconds
+        record['cpu_seconds'] += cpu_seconds
+        if rows_in is not None:
+            record['rows_in'] = (record['rows_in'] or 0) + rows_in
+        record['rows_out'] += rows_out
+        record['output_mb'] += self._nbytes(output) / 2**20
+        if traced_peak is not None:
+            record['traced_peak_mb'] = max(
+                record['traced_peak_mb'] or 0.0,
+                traced_peak / 2**20
+            )
+        record['peak_rss_mb'] = self._peak_rss_mb()
+        return output
+
+    # One row per step, in the order the steps first ran
+    def report(self):
+        return pd.DataFrame(
+            list(self._steps.values()),
+            columns=REPORT_COLUMNS
+        ).set_index('step')
+
+    def to_json(self, path=None):
+        report = json.dumps(list(self._steps.values()), indent=2)
+        if path:
+            with open(path, 'w') as report_file:
+                report_file.write(report)
+        return report
+
+    def table(self):
+        return self.report().to_string(float_format='{:.3f}'.format)
+
+    def _shape(self, X):
+        if X is None:
+            return None, None
+        shape = getattr(X, 'shape', None)
+        if shape is None:
+            return len(X), None
+        return shape[0], shape[1] if len(shape) > 1 else 1
+
+    def _nbytes(self, output):
+        if isinstance(output, (pd.DataFrame, pd.Series)):
+            return int(output.memory_usage(deep=True).sum())
+        if issparse(output):
+            output = output.tocsr()
+            return output.data.nbytes + output.indices.nbytes + \
+                output.indptr.nbytes
+        return getattr(output, 'nbytes', 0)
+
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    def _peak_rss_mb(self):
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss / (2**20 if sys.platform == 'darwin' else 2**10)
@@ -1,15 +1,61 @@
+import copy
+import multiprocessing
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scipy.sparse import csr_matrix, hstack, issparse, vstack
 from sklearn.compose import ColumnTransformer
+from sklearn.exceptions import NotFittedError
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
 
+import column_schema
 from actuals_adder import ActualsAdder
+from column_schema import ACTUALS_COLUMNS, LOCATIONS_COLUMNS, \
+    PATTERNS_COLUMNS, TERMINALS_COLUMNS, VEHICLES_COLUMNS
+from feature_matrix_files import FeatureMatrixFiles
+from input_cache import InputCache
+from location_registry import LocationRegistry
 from locations_adder import LocationsAdder
-from offset_seconds_encoder import OffsetSecondsEncoder
+from ml_datapoint_parser import MlDatapointParser
+from offset_seconds_encoder import OFFSET_LABELS, OffsetSecondsEncoder
 from route_filter import RouteFilter
+from scheduled_run_time_adder import ScheduledRunTimeAdder
+from sparse_one_hot_encoder import SparseOneHotEncoder
 from terminal_modes_adder import TerminalModesAdder
+from timed_file import COMPRESSIONS, TimedFile
 from timestamp_encoder import TimestampEncoder
+from track_graph import TrackGraph
+
+# Rows of vehicle datapoints per shard when load runs in parallel without a
+# chunksize, and the column that tracks where each shard's rows came from
+SHARD_ROWS = 50000
+SHARD_ROW_COLUMN = '_vehicle_row'
+
+# The inputs that are read whole and kept, and their columns. The vehicle
+# datapoints are read each time they're needed, or in chunks.
+INPUTS = ['actuals', 'locations', 'patterns', 'terminals']
+INPUT_COLUMNS = {
+    'actuals': ACTUALS_COLUMNS,
+    'locations': LOCATIONS_COLUMNS,
+    'patterns': PATTERNS_COLUMNS,
+    'terminals': TERMINALS_COLUMNS,
+    'vehicles': VEHICLES_COLUMNS
+}
+# Logs hold the vehicle, terminal and actuals datapoints all together, and
+# replace the separate exports when given
+LOGGED_INPUTS = ['actuals', 'terminals', 'vehicles']
+INPUT_REPORT_COLUMNS = [
+    'input',
+    'seconds',
+    'read_seconds',
+    'parse_seconds',
+    'rows',
+    'file_mb'
+]
 
 
 class SubwayPipeline():
@@ -19,28 +65,434 @@ class SubwayPipeline():
         locations_path=os.path.join("datasets", "locations.csv"),
         patterns_path=os.path.join("datasets", "patterns.csv"),
         terminals_path=os.path.join("datasets", "terminal_datapoints.csv"),
-        vehicles_path=os.path.join("datasets", "vehicle_datapoints.csv")
+        vehicles_path=os.path.join("datasets", "vehicle_datapoints.csv"),
+        sparse_locations=False,
+        cache_dir=None,
+        log_paths=None,
+        route='B',
+        sparse_output=False,
+        scheduled_run_times=False
     ):
+        self.actuals_path = actuals_path
+        self.locations_path = locations_path
+        self.patterns_path = patterns_path
+        self.terminals_path = terminals_path
         self.vehicles_path = vehicles_path
+        self.route = route
+        self._route_vehicles = None
+        self.sparse_locations = sparse_locations
+        self.sparse_output = sparse_output
+        self.cache_dir = cache_dir
+        self.log_paths = log_paths
+        self.scheduled_run_times = scheduled_run_times
 
-        self.actuals_frame = pd.read_csv(actuals_path)
-        self.locations_frame = pd.read_csv(locations_path)
-        self.patterns_frame = pd.read_csv(patterns_path)
-        self.terminals_frame = pd.read_csv(terminals_path)
+        self._inputs = {}
+        self._input_timings = {}
+        self._location_registry = None
+        self._track_graph = None
 
-    def load(self):
-        vehicle_datapoints = self._load_vehicle_datapoints()
+    # The inputs are read the first time they're used, so that looking up
+    # the locations doesn't wait on the datapoints. Loading reads the ones
+    # it needs that haven't been read yet all together with read_inputs.
+    @property
+    def actuals_frame(self):
+        return self._input('actuals')
+
+    @property
+    def locations_frame(self):
+        return self._input('locations')
+
+    @property
+    def patterns_frame(self):
+        return self._input('patterns')
+
+    @property
+    def terminals_frame(self):
+        return self._input('terminals')
+
+    # Every step that looks up locations shares the same codes
+    @property
+    def location_registry(self):
+        if self._location_registry is None:
+            self._location_registry = LocationRegistry(self.locations_frame)
+        return self._location_registry
+
+    # The track graph is only needed for the scheduled run time feature
+    @property
+    def track_graph(self):
+        if self.scheduled_run_times and self._track_graph is None:
+            self._track_graph = TrackGraph(
+                self.locations_frame,
+                self.location_registry
+            )
+        return self._track_graph
+
+    # Read the named inputs, all but the vehicles by default, that haven't
+    # been read yet. They're read at the same time on a thread pool, so that
+    # parsing one overlaps reading and decompressing the others.
+    def read_inputs(self, names=INPUTS):
+        self._read(names)
+        return self
+
+    # How long reading each input took: the seconds waiting on its file and
+    # the rest spent parsing it, along with its rows and file size. Inputs
+    # read from the cache or from logs aren't split into reading and parsing.
+    def input_report(self):
+        return pd.DataFrame(
+            list(self._input_timings.values()),
+            columns=INPUT_REPORT_COLUMNS
+        ).set_index('input')
+
+    # All the vehicle datapoints. They aren't kept, so each call reads them
+    # again unless they come from logs.
+    def vehicle_datapoints(self):
+        return self._load_vehicle_datapoints()
+
+    # Fit the pipeline to all the datapoints and return their feature matrix.
+    # The fitted pipeline is kept, along with its lookup tables, so that the
+    # SubwayPipeline can be pickled and used to transform new batches. Pass a
+    # StepProfiler to record how each step performs, and an output_dir to
+    # also write the features, labels and feature names there as
+    # FeatureMatrixFiles.
+    #
+    # Pass a chunksize to run the feature steps and the final encoding on
+    # chunks of that many vehicle datapoints at a time, keeping only the
+    # encoded rows of each chunk. Peak memory still grows with the matrix
+    # itself; use stream or stream_training_chunks to keep it bounded.
+    #
+    # Pass n_jobs to read the vehicle datapoints, group them by generation
+    # into shards of about chunksize rows, and run the feature steps of the
+    # shards in that many forked worker processes. The generations don't
+    # need to be contiguous in the file. The workers share the inputs and
+    # lookup tables read here rather than copying them, and the shards'
+    # feature rows are put back in the order of the datapoints they came
+    # from, so the result is the same as load().
+    def load(
+        self,
+        chunksize=None,
+        profiler=None,
+        output_dir=None,
+        n_jobs=None
+    ):
+        if n_jobs is not None and profiler is not None:
+            raise ValueError(
+                "A profiler can't measure steps run in worker processes"
+            )
+        in_memory = not chunksize and n_jobs is None
+        if in_memory and profiler is None:
+            vehicle_datapoints = self._load_vehicle_datapoints(
+                read_inputs=True
+            )
+        elif in_memory:
+            vehicle_datapoints = profiler.measure(
+                'read_vehicle_datapoints',
+                lambda: self._load_vehicle_datapoints(read_inputs=True)
+            )
+
+        feature_steps, locations_adder, final_transformer = \
+            self._build_pipeline()
+        if in_memory and profiler is None:
+            matrix = self.pipeline_.fit_transform(vehicle_datapoints)
+        elif in_memory:
+            matrix = profiler.fit_transform(self.pipeline_, vehicle_datapoints)
+        else:
+            # None of the feature steps learn anything from the datapoints
+            # themselves, so fitting them only builds their lookup tables
+            for _, step in feature_steps:
+                step.fit(None)
+            matrix = self._load_in_chunks(
+                chunksize or SHARD_ROWS,
+                feature_steps,
+                locations_adder,
+                final_transformer,
+                profiler,
+                n_jobs
+            )
+
+        if output_dir is not None:
+            self.save(matrix, output_dir)
+        return matrix
+
+    # Write the features and labels of a matrix from load or transform, and
+    # the feature names, to output_dir as FeatureMatrixFiles
+    def save(self, matrix, output_dir):
+        features, labels = self.features_and_labels(matrix)
+        FeatureMatrixFiles(output_dir).write(
+            features,
+            labels,
+            self.feature_names()
+        )
+
+    # Fit the final encoding to feature rows kept in a FeatureStore, for
+    # service dates start_date to end_date, and return their feature matrix
+    # without recomputing the features. The store holds the n-hot locations
+    # as columns, so this only works without sparse_locations.
+    def load_from_store(self, feature_store, start_date=None, end_date=None):
+        if self.sparse_locations:
+            raise ValueError(
+                "Feature stores hold dense locations, so they can't be "
+                "loaded with sparse_locations"
+            )
+        feature_steps, _, final_transformer = self._build_pipeline()
+        for _, step in feature_steps:
+            step.fit(None)
+        return final_transformer.fit_transform(
+            feature_store.select(start_date, end_date)
+        )
+
+    # Run a batch of vehicle datapoints through the feature steps, joining
+    # them with the given terminal datapoints and actuals, and return the
+    # feature frame before the final encoding
+    def feature_frame(
+        self,
+        vehicle_datapoints,
+        terminals_frame,
+        actuals_frame
+    ):
+        return self._features(
+            vehicle_datapoints,
+            terminals_frame,
+            actuals_frame
+        )[0]
+
+    # Load the feature matrices of several routes at once, one route per
+    # process, and return them in a dict keyed by route. The workers are
+    # forked, so they share the frames read here copy-on-write rather than
+    # each reading the CSVs again or unpickling a copy. Where fork isn't
+    # available the routes are loaded one after another. Each route's fitted
+    # pipeline comes back with its matrix, and is kept in route_pipelines_ as
+    # a SubwayPipeline for that route, to transform new batches and name the
+    # features of its matrix.
+    def load_routes(self, routes, n_jobs=None, chunksize=None):
+        global _forked_routes
+
+        routes = list(routes)
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(routes))
+        vehicle_datapoints = None
+        if not chunksize:
+            vehicle_datapoints = self._load_vehicle_datapoints(
+                read_inputs=True
+            )
+        else:
+            self.read_inputs()
+        _forked_routes = (self, vehicle_datapoints, chunksize)
+
+        try:
+            if n_jobs <= 1 or \
+                    'fork' not in multiprocessing.get_all_start_methods():
+                results = [_load_forked_route(route) for route in routes]
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=n_jobs,
+                    mp_context=multiprocessing.get_context('fork')
+                ) as executor:
+                    results = list(executor.map(_load_forked_route, routes))
+        finally:
+            _forked_routes = None
+
+        self.route_pipelines_ = {
+            route: self._route_pipeline(route, pipeline)
+            for route, (_, pipeline) in zip(routes, results)
+        }
+        return {
+            route: matrix for route, (matrix, _) in zip(routes, results)
+        }
+
+    # A copy of this SubwayPipeline for another route, sharing its inputs,
+    # with that route's fitted pipeline
+    def _route_pipeline(self, route, pipeline):
+        route_pipeline = copy.copy(self)
+        route_pipeline.route = route
+        route_pipeline.pipeline_ = pipeline
+        route_pipeline.__dict__.pop('route_pipelines_', None)
+        return route_pipeline
+
+    # Transform a new batch of vehicle datapoints with the pipeline fitted by
+    # load
+    def transform(self, vehicle_datapoints):
+        if not hasattr(self, 'pipeline_'):
+            raise NotFittedError(
+                "SubwayPipeline.load must be called before transform"
+            )
+        return self.pipeline_.transform(vehicle_datapoints)
+
+    # Split a matrix from load or transform into the features and the labels,
+    # which are the actual seconds until each event
+    def features_and_labels(self, matrix):
+        return self._split_labels(
+            matrix,
+            self.pipeline_.named_steps['final_transformer']
+        )
+
+    # The names of the feature columns of the matrices that
+    # features_and_labels returns
+    def feature_names(self):
+        final_transformer = self.pipeline_.named_steps['final_transformer']
+        return np.delete(
+            final_transformer.get_feature_names_out(),
+            final_transformer.output_indices_['pass']
+        ).tolist()
+
+    # Yield the feature frames, before the final encoding, for successive
+    # chunks of vehicle datapoints. Memory use is bounded by the chunk size
+    # rather than by the size of the vehicles file.
+    def stream(self, chunksize, profiler=None):
+        for feature_frame, _ in \
+                self._stream_with_locations(chunksize, profiler):
+            yield feature_frame
+
+    # Yield the features and labels of successive chunks of vehicle
+    # datapoints, to train a model on more of them than fit in memory. The
+    # one-hot categories come from the inputs rather than from the
+    # datapoints, so every chunk has the same columns. No scaler can see every
+    # row up front, so the remainder is scaled by a StandardScaler that is
+    # updated with each chunk before scaling it; pass the scaler from an
+    # earlier run to carry on from its statistics. Pass the final transformer
+    # from streaming_transformer to keep the encoding it was fitted with, or
+    # one is made and fitted to the first chunk. The first skip_chunks
+    # chunks, already seen by that scaler, are left out.
+    def stream_training_chunks(
+        self,
+        chunksize,
+        scaler=None,
+        skip_chunks=0,
+        profiler=None,
+        final_transformer=None
+    ):
+        scaler = scaler if scaler is not None else StandardScaler()
+        final_transformer = final_transformer \
+            if final_transformer is not None \
+            else self.streaming_transformer()
+        for feature_frame, chunk_locations_adder in \
+                self._stream_with_locations(chunksize, profiler):
+            if len(feature_frame) == 0:
+                continue
+            if skip_chunks:
+                skip_chunks -= 1
+                continue
+            yield self._streaming_matrix(
+                feature_frame,
+                chunk_locations_adder,
+                final_transformer,
+                scaler,
+                update_scaler=True
+            )
+
+    # The final encoding of stream_training_chunks, with the one-hot
+    # categories of the inputs, a CSR result and the remainder unscaled. It
+    # keeps the LocationsAdder it gathers the n-hot rows of sparse locations
+    # from as locations_adder_, so it can be pickled with a model and used on
+    # new datapoints.
+    def streaming_transformer(self):
+        self.read_inputs()
+        locations_adder = self._locations_adder()
+        final_transformer = self._final_transformer(
+            locations_adder,
+            streaming=True
+        )
+        final_transformer.locations_adder_ = locations_adder
+        return final_transformer
+
+    # The features and labels of a batch of vehicle datapoints, encoded by a
+    # final transformer and scaler from stream_training_chunks without
+    # changing either, to score new datapoints with a model trained on the
+    # stream
+    def streaming_features_and_labels(
+        self,
+        vehicle_datapoints,
+        final_transformer,
+        scaler
+    ):
+        self.read_inputs()
+        feature_frame, chunk_locations_adder = self._chunk_features(
+            vehicle_datapoints,
+            self._fitted_feature_steps()
+        )
+        return self._streaming_matrix(
+            feature_frame,
+            chunk_locations_adder,
+            final_transformer,
+            scaler,
+            update_scaler=False
+        )
+
+    def _streaming_matrix(
+        self,
+        feature_frame,
+        chunk_locations_adder,
+        final_transformer,
+        scaler,
+        update_scaler
+    ):
+        final_transformer.locations_adder_.combine([chunk_locations_adder])
+        if hasattr(final_transformer, 'transformers_'):
+            matrix = final_transformer.transform(feature_frame)
+        else:
+            matrix = final_transformer.fit_transform(feature_frame)
+
+        # The remainder always comes last
+        remainder = final_transformer.output_indices_['remainder']
+        remainder_columns = matrix[:, remainder].toarray()
+        if update_scaler:
+            scaler.partial_fit(remainder_columns)
+        matrix = hstack(
+            [
+                matrix[:, :remainder.start],
+                csr_matrix(scaler.transform(remainder_columns))
+            ],
+            format='csr'
+        )
+        return self._split_labels(matrix, final_transformer)
 
-        route_filter = RouteFilter('B')
-        timestamp_encoder = TimestampEncoder()
-        offset_seconds_encoder = OffsetSecondsEncoder()
-        terminal_modes_adder = TerminalModesAdder(
+    def _build_pipeline(self):
+        self.read_inputs()
+        locations_adder = self._locations_adder()
+        final_transformer = self._final_transformer(locations_adder)
+        feature_steps = self._feature_steps(
+            self.terminals_frame,
+            self.actuals_frame,
+            locations_adder
+        )
+        self.pipeline_ = Pipeline(
+            feature_steps + [('final_transformer', final_transformer)]
+        )
+        return feature_steps, locations_adder, final_transformer
+
+    def _locations_adder(self):
+        return LocationsAdder(
             self.locations_frame,
-            self.patterns_frame,
-            self.terminals_frame
+            route=self.route,
+            sparse=self.sparse_locations,
+            location_registry=self.location_registry
         )
-        locations_adder = LocationsAdder(self.locations_frame, route='B')
-        actuals_adder = ActualsAdder(self.actuals_frame)
+
+    # With scheduled_run_times, each joined row also gets the scheduled
+    # seconds of running from its current location to its destination, which
+    # is scaled with the rest of the remainder
+    def _feature_steps(self, terminals_frame, actuals_frame, locations_adder):
+        feature_steps = [
+            ('route_filter', RouteFilter(self.route)),
+            ('timestamp_encoder', TimestampEncoder()),
+            ('offset_seconds_encoder', OffsetSecondsEncoder()),
+            ('terminal_modes_adder', TerminalModesAdder(
+                self.locations_frame,
+                self.patterns_frame,
+                terminals_frame,
+                location_registry=self.location_registry
+            )),
+            ('locations_adder', locations_adder),
+            ('actuals_adder', ActualsAdder(actuals_frame)),
+        ]
+        if self.scheduled_run_times:
+            feature_steps.append((
+                'scheduled_run_time_adder',
+                ScheduledRunTimeAdder(self.track_graph)
+            ))
+        return feature_steps
+
+    # When streaming, the result is always CSR and the remainder is passed
+    # through unscaled
+    def _final_transformer(self, locations_adder, streaming=False):
         auto_onehot_columns = [
             'terminal_gtfs_id',
             'automatic',
@@ -48,28 +500,14 @@ class SubwayPipeline():
             'event_type',
         ]
 
-        auto_onehot_encoder = OneHotEncoder()
-        current_location_onehot_encoder = OneHotEncoder(
+        auto_onehot_encoder = SparseOneHotEncoder(
+            categories=self._input_categories() if streaming else 'auto'
+        )
+        current_location_onehot_encoder = SparseOneHotEncoder(
             categories=[locations_adder.all_locs_sorted()]
         )
-        offset_onehot_encoder = OneHotEncoder(
-            categories=[
-                [
-                    "nan",
-                    "negative",
-                    "0-500",
-                    "500-1000",
-                    "1000-1500",
-                    "1500-2000",
-                    "2000-2500",
-                    "2500-3000",
-                    "3000-3500",
-                    "3500-4000",
-                    "4000-4500",
-                    "4500-5000",
-                    "5000+"
-                ]
-            ],
+        offset_onehot_encoder = SparseOneHotEncoder(
+            categories=[OFFSET_LABELS]
         )
         drop_columns = [
             "generation",
@@ -78,7 +516,7 @@ class SubwayPipeline():
             "vehicle_id_x",
             "vehicle_id_y"
         ]
-        final_transformer = ColumnTransformer([
+        column_transformers = [
             ('pass', 'passthrough', ['actual_seconds_from_now']),
             ('drop', 'drop', drop_columns),
             ('auto1hot', auto_onehot_encoder, auto_onehot_columns),
@@ -92,32 +530,558 @@ class SubwayPipeline():
                 offset_onehot_encoder,
                 ['offset_departure_seconds_from_now']
             )
-        ], remainder=StandardScaler())
+        ]
+        # In sparse mode the n-hot locations aren't columns of the frame, so
+        # gather them by generation as an unscaled block instead.
+        if self.sparse_locations:
+            column_transformers.append((
+                'locations',
+                FunctionTransformer(
+                    locations_adder.n_hot_locations,
+                    feature_names_out=locations_adder.n_hot_feature_names
+                ),
+                ['generation']
+            ))
+        # With sparse_output the one-hot blocks are always stacked into a CSR
+        # matrix, however dense the result would be
+        return ColumnTransformer(
+            column_transformers,
+            remainder='passthrough' if streaming else StandardScaler(),
+            sparse_threshold=1.0 if self.sparse_output or streaming else 0.3
+        )
 
-        pipeline = Pipeline([
-            ('route_filter', route_filter),
-            ('timestamp_encoder', timestamp_encoder),
-            ('offset_seconds_encoder', offset_seconds_encoder),
-            ('terminal_modes_adder', terminal_modes_adder),
-            ('locations_adder', locations_adder),
-            ('actuals_adder', actuals_adder),
-            ('final_transformer', final_transformer),
+    # Every value the auto-encoded columns can take, sorted as the encoder
+    # would sort them. Terminal modes only join on the terminals' own stop
+    # IDs, and destinations and event types come from the actuals.
+    def _input_categories(self):
+        actuals = self.actuals_frame.dropna(subset=['time'])
+        return [
+            self._sorted_strings(self.terminals_frame['terminal_stop_id']),
+            np.sort(self.terminals_frame['automatic'].dropna().unique()),
+            self._sorted_strings(actuals['stop_id']),
+            self._sorted_strings(actuals['event_type'])
+        ]
+
+    def _sorted_strings(self, values):
+        return np.sort(np.asarray(
+            column_schema.strings(values).dropna().unique(),
+            dtype=object
+        ))
+
+    def _split_labels(self, matrix, final_transformer):
+        label_columns = final_transformer.output_indices_['pass']
+        feature_columns = np.delete(
+            np.arange(matrix.shape[1]),
+            np.arange(matrix.shape[1])[label_columns]
+        )
+        labels = matrix[:, label_columns.start]
+        if issparse(labels):
+            labels = labels.toarray()
+        return matrix[:, feature_columns], np.asarray(labels).ravel()
+
+    # Each chunk is encoded as soon as it's read, against the one-hot
+    # categories of the inputs as in stream_training_chunks, and only its CSR
+    # block and its unscaled remainder are kept. Once every chunk is in, the
+    # categories that no row took are dropped, the remainder is scaled with
+    # the statistics of all the rows and the final transformer is fitted to
+    # match, so the result is the same as the in-memory load without the
+    # feature frames ever being held together.
+    def _load_in_chunks(
+        self,
+        chunksize,
+        feature_steps,
+        locations_adder,
+        final_transformer,
+        profiler=None,
+        n_jobs=None
+    ):
+        chunk_locations_adder = self._locations_adder()
+        chunk_transformer = self._final_transformer(
+            chunk_locations_adder,
+            streaming=True
+        ).set_params(remainder='drop')
+        blocks = []
+        remainders = []
+        shard_rows = []
+        chunk_locations_adders = []
+        first_rows = None
+        for feature_frame, frame_locations_adder in \
+                self._stream_with_locations(
+                    chunksize,
+                    profiler,
+                    n_jobs,
+                    feature_steps
+                ):
+            chunk_locations_adders.append(frame_locations_adder)
+            if SHARD_ROW_COLUMN in feature_frame.columns:
+                shard_rows.append(feature_frame[SHARD_ROW_COLUMN].to_numpy())
+                feature_frame = feature_frame.drop(columns=SHARD_ROW_COLUMN)
+            if len(feature_frame) == 0:
+                continue
+            chunk_locations_adder.combine([frame_locations_adder])
+            if first_rows is None:
+                first_rows = feature_frame.iloc[:1]
+                encode = chunk_transformer.fit_transform
+            else:
+                encode = chunk_transformer.transform
+            blocks.append(
+                encode(feature_frame) if profiler is None else
+                profiler.measure('final_transformer', encode, feature_frame)
+            )
+            remainder_columns = chunk_transformer.transformers_[-1][2]
+            remainders.append(feature_frame[remainder_columns])
+
+        locations_adder.combine(chunk_locations_adders)
+        if first_rows is None:
+            # Nothing to encode, so fail or not as the in-memory load would
+            return final_transformer.fit_transform(feature_frame)
+
+        # Put the rows of the shards back in the order of the vehicle
+        # datapoints they came from
+        order = np.argsort(np.concatenate(shard_rows), kind='stable') \
+            if shard_rows else None
+        return self._fit_chunked_encoding(
+            blocks,
+            remainders,
+            order,
+            chunk_transformer,
+            final_transformer,
+            first_rows
+        )
+
+    # Fit the final transformer to the categories that the rows encoded by
+    # the chunk transformer took and to their unscaled remainder, and put
+    # together the matrix it would have made of them. The blocks are let go
+    # as they're used.
+    def _fit_chunked_encoding(
+        self,
+        blocks,
+        remainders,
+        order,
+        chunk_transformer,
+        final_transformer,
+        first_rows
+    ):
+        auto_onehot = chunk_transformer.output_indices_['auto1hot']
+        input_categories = \
+            chunk_transformer.named_transformers_['auto1hot'].categories_
+        column_counts = sum(
+            np.bincount(block.indices, minlength=block.shape[1])
+            for block in blocks
+        )
+        taken = column_counts[auto_onehot] > 0
+        taken_by_column = np.split(
+            taken,
+            np.cumsum([len(categories) for categories in input_categories])[
+                :-1
+            ]
+        )
+        final_transformer.set_params(auto1hot__categories=[
+            categories[column_taken] for categories, column_taken in
+            zip(input_categories, taken_by_column)
         ])
-        return pipeline.fit_transform(vehicle_datapoints)
+        final_transformer.fit(first_rows)
+        kept_columns = np.flatnonzero(np.concatenate([
+            np.ones(auto_onehot.start, dtype=bool),
+            taken,
+            np.ones(len(column_counts) - auto_onehot.stop, dtype=bool)
+        ]))
+
+        # The scaler is fitted to the remainder's columns in the order of the
+        # in-memory load, so its statistics come out the same
+        remainder = pd.concat(remainders, ignore_index=True)
+        scaler = final_transformer.named_transformers_['remainder'].fit(
+            remainder if order is None else remainder.iloc[order]
+        )
+        del remainder
+
+        # Dense or not as ColumnTransformer decides it for the whole result,
+        # where the label and remainder blocks count as dense
+        n_rows = sum(block.shape[0] for block in blocks)
+        n_encoded = len(kept_columns)
+        n_columns = n_encoded + remainders[0].shape[1]
+        label_columns = final_transformer.output_indices_['pass']
+        sparse_entries = column_counts[kept_columns].sum() - \
+            column_counts[kept_columns[label_columns]].sum()
+        dense_entries = n_rows * (
+            label_columns.stop - label_columns.start + remainders[0].shape[1]
+        )
+        final_transformer.sparse_output_ = \
+            (sparse_entries + dense_entries) / (n_rows * n_columns) < \
+            final_transformer.sparse_threshold
+
+        if final_transformer.sparse_output_:
+            for i, (block, block_remainder) in \
+                    enumerate(zip(blocks, remainders)):
+                blocks[i] = hstack(
+                    [
+                        block[:, kept_columns],
+                        csr_matrix(scaler.transform(block_remainder))
+                    ],
+                    format='csr'
+                )
+                remainders[i] = None
+            matrix = vstack(blocks, format='csr')
+            blocks.clear()
+            return matrix if order is None else matrix[order]
+
+        # Filled a block at a time, so only one block is ever dense outside
+        # of the result
+        positions = np.arange(n_rows)
+        if order is not None:
+            positions[order] = np.arange(n_rows)
+        matrix = np.empty((n_rows, n_columns))
+        start = 0
+        for i, (block, block_remainder) in enumerate(zip(blocks, remainders)):
+            rows = positions[start:start + block.shape[0]]
+            matrix[rows, :n_encoded] = block[:, kept_columns].toarray()
+            matrix[rows, n_encoded:] = scaler.transform(block_remainder)
+            start += block.shape[0]
+            blocks[i] = remainders[i] = None
+        return matrix
+
+    # Run each chunk through the feature steps, fitted once here unless
+    # they're given. With n_jobs, the chunks are shards of the vehicle
+    # datapoints grouped by generation, run in worker processes when n_jobs
+    # is more than one and they can be forked.
+    def _stream_with_locations(
+        self,
+        chunksize,
+        profiler=None,
+        n_jobs=None,
+        feature_steps=None
+    ):
+        self.read_inputs()
+        if feature_steps is None:
+            feature_steps = self._fitted_feature_steps()
+        if n_jobs is None:
+            for vehicle_datapoints in self._generation_chunks(chunksize):
+                yield self._chunk_features(
+                    vehicle_datapoints,
+                    feature_steps,
+                    profiler
+                )
+            return
+
+        vehicle_datapoints = self._load_vehicle_datapoints()
+        shards = self._generation_shards(vehicle_datapoints, chunksize)
+        if n_jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            yield from self._forked_chunk_features(
+                vehicle_datapoints,
+                shards,
+                feature_steps,
+                n_jobs
+            )
+            return
+
+        for rows in shards:
+            yield self._chunk_features(
+                _shard(vehicle_datapoints, rows),
+                feature_steps,
+                profiler
+            )
+
+    # The feature steps with their lookup tables built from the whole
+    # inputs, to be shared by every chunk. Their LocationsAdder is only a
+    # placeholder for the one each chunk gets of its own.
+    def _fitted_feature_steps(self):
+        feature_steps = self._feature_steps(
+            self.terminals_frame,
+            self.actuals_frame,
+            self._locations_adder()
+        )
+        for _, step in feature_steps:
+            step.fit(None)
+        return feature_steps
+
+    # Cut the vehicle datapoints into shards of whole generations, of about
+    # shard_rows rows each, whatever order the generations come in, and yield
+    # the positions of each shard's rows. Rows keep their order within a
+    # generation.
+    def _generation_shards(self, vehicle_datapoints, shard_rows):
+        generation_codes, _ = pd.factorize(vehicle_datapoints["generation"])
+        order = np.argsort(generation_codes, kind='stable')
+        generation_starts = np.flatnonzero(
+            np.diff(generation_codes[order], prepend=-2)
+        )
+        # Each shard starts at the first generation starting at or after a
+        # multiple of shard_rows
+        starts = np.searchsorted(
+            generation_starts,
+            np.arange(0, len(order), shard_rows)
+        )
+        cuts = np.unique(
+            generation_starts[starts[starts < len(generation_starts)]]
+        )
+        for start, stop in zip(cuts, np.append(cuts[1:], len(order))):
+            yield order[start:stop]
+
+    def _generation_chunks(self, chunksize):
+        seen_generations = set()
+        for vehicle_datapoints in self._vehicle_chunks(chunksize):
+            generations = vehicle_datapoints["generation"].unique()
+            if seen_generations.intersection(generations):
+                raise ValueError(
+                    "Vehicle datapoints must be grouped by generation to be "
+                    "loaded in chunks"
+                )
+            seen_generations.update(generations)
+            yield vehicle_datapoints
+
+    # Transform a chunk with the shared, fitted feature steps, giving it a
+    # LocationsAdder of its own to record the occupancy of its generations.
+    # The lookups of the shared steps gather by key, so they're left whole
+    # rather than cut down to the chunk.
+    def _chunk_features(
+        self,
+        vehicle_datapoints,
+        feature_steps,
+        profiler=None
+    ):
+        locations_adder = self._locations_adder()
+        steps = [
+            (name, locations_adder if name == 'locations_adder' else step)
+            for name, step in feature_steps
+        ]
+        if profiler is not None:
+            return (
+                profiler.transform(Pipeline(steps), vehicle_datapoints),
+                locations_adder
+            )
+
+        feature_frame = vehicle_datapoints
+        for _, step in steps:
+            feature_frame = step.transform(feature_frame)
+        return feature_frame, locations_adder
 
-    # Build a dataframe with all logged vehicle datapoints
-    def _load_vehicle_datapoints(self):
+    # Hand the shards to forked workers, keeping at most two per worker in
+    # flight, and yield their features in the order of the shards. The
+    # workers share the vehicle datapoints and the fitted feature steps with
+    # this process copy-on-write, so only the positions of each shard's rows
+    # are sent to them. Only the occupancy of each shard's LocationsAdder
+    # comes back from the worker; the adder itself is rebuilt here around the
+    # shared registry.
+    def _forked_chunk_features(
+        self,
+        vehicle_datapoints,
+        shards,
+        feature_steps,
+        n_jobs
+    ):
+        global _forked_pipeline
+
+        _forked_pipeline = (self, vehicle_datapoints, feature_steps)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                mp_context=multiprocessing.get_context('fork')
+            ) as executor:
+                pending = deque()
+                for rows in shards:
+                    pending.append(executor.submit(_run_forked_chunk, rows))
+                    if len(pending) >= 2 * n_jobs:
+                        yield self._from_worker(pending.popleft().result())
+                while pending:
+                    yield self._from_worker(pending.popleft().result())
+        finally:
+            _forked_pipeline = None
+
+    def _from_worker(self, result):
+        feature_frame, generations, occupancy = result
+        locations_adder = self._locations_adder()
+        locations_adder.generations_ = generations
+        locations_adder.occupancy_ = occupancy
+        return feature_frame, locations_adder
+
+    def _features(
+        self,
+        vehicle_datapoints,
+        terminals_frame,
+        actuals_frame,
+        profiler=None
+    ):
+        locations_adder = self._locations_adder()
+        feature_pipeline = Pipeline(
+            self._feature_steps(
+                terminals_frame,
+                actuals_frame,
+                locations_adder
+            )
+        )
+        if profiler is None:
+            feature_frame = feature_pipeline.fit_transform(vehicle_datapoints)
+        else:
+            feature_frame = profiler.fit_transform(
+                feature_pipeline,
+                vehicle_datapoints
+            )
+        return feature_frame, locations_adder
+
+    # Read the vehicles file in chunks of about chunksize rows, holding back
+    # the trailing generation of each chunk until the next one so that no
+    # generation is split across chunks.
+    def _vehicle_chunks(self, chunksize):
+        pending = None
+        for chunk in self._raw_vehicle_chunks(chunksize):
+            if pending is not None:
+                chunk = column_schema.concat([pending, chunk])
+
+            generations = chunk["generation"].to_numpy()
+            boundaries = np.flatnonzero(generations != generations[-1])
+            split = boundaries[-1] + 1 if len(boundaries) else 0
+            if split:
+                yield chunk.iloc[:split]
+            pending = chunk.iloc[split:]
+
+        if pending is not None and len(pending):
+            yield pending
+
+    def _raw_vehicle_chunks(self, chunksize):
+        if self.log_paths:
+            logged_vehicles = self._input('vehicles')
+            return (
+                logged_vehicles.iloc[start:start + chunksize]
+                for start in range(0, len(logged_vehicles), chunksize)
+            )
         return pd.read_csv(
             self.vehicles_path,
-            usecols=[
-                'current_location_id',
-                'generation',
-                'gtfs_trip_id',
-                'length_of_time_at_current_location',
-                'ocs_trip_id',
-                'offset_departure_seconds_from_now',
-                'pattern_id',
-                'timestamp',
-                'vehicle_id'
-            ]
+            usecols=set(VEHICLES_COLUMNS).__contains__,
+            dtype=self._dtypes(VEHICLES_COLUMNS),
+            chunksize=chunksize
         )
+
+    # Build a dataframe with all logged vehicle datapoints, reading the other
+    # inputs that haven't been read yet at the same time when read_inputs is
+    # set
+    def _load_vehicle_datapoints(self, read_inputs=False):
+        if self._route_vehicles is not None:
+            return self._route_vehicles
+        names = ['vehicles'] + (INPUTS if read_inputs else [])
+        vehicle_datapoints = self._read(names)['vehicles']
+        return vehicle_datapoints.copy() if self.log_paths \
+            else vehicle_datapoints
+
+    def _input(self, name):
+        if name in self._inputs:
+            return self._inputs[name]
+        return self._read([name])[name]
+
+    # Read the sources of the named inputs that haven't been read yet, on a
+    # thread pool when there are several, and return the inputs. Vehicle
+    # datapoints from their own file aren't kept.
+    def _read(self, names):
+        sources = []
+        for name in names:
+            source = self._source(name)
+            if name not in self._inputs and source not in sources:
+                sources.append(source)
+
+        if len(sources) > 1:
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                read = list(executor.map(self._timed_read, sources))
+        else:
+            read = [self._timed_read(source) for source in sources]
+        for frames, timing in read:
+            self._inputs.update(frames)
+            self._input_timings[timing['input']] = timing
+
+        inputs = {name: self._inputs[name] for name in names}
+        if not self.log_paths:
+            self._inputs.pop('vehicles', None)
+        return inputs
+
+    def _source(self, name):
+        return 'logs' if self.log_paths and name in LOGGED_INPUTS else name
+
+    def _timed_read(self, source):
+        started = time.perf_counter()
+        frames, read_seconds, paths = self._read_source(source)
+        seconds = time.perf_counter() - started
+        return frames, {
+            'input': source,
+            'seconds': seconds,
+            'read_seconds': read_seconds,
+            'parse_seconds': seconds - read_seconds
+            if read_seconds is not None else None,
+            'rows': sum(len(frame) for frame in frames.values()),
+            'file_mb': sum(os.path.getsize(path) for path in paths) / 2**20
+        }
+
+    # The frames read from a source, the seconds spent waiting on its file
+    # when they're known, and the paths read
+    def _read_source(self, source):
+        if source == 'logs':
+            logged = MlDatapointParser().read(self.log_paths)
+            frames = {
+                name: column_schema.compact(
+                    logged[name],
+                    INPUT_COLUMNS[name]
+                )
+                for name in LOGGED_INPUTS
+            }
+            return frames, None, self.log_paths
+
+        path = getattr(self, f'{source}_path')
+        columns = INPUT_COLUMNS[source]
+        dtype = self._dtypes(columns)
+        if self.cache_dir:
+            frame = InputCache(self.cache_dir).read_csv(path, columns, dtype)
+            return {source: frame}, None, [path]
+        with TimedFile(path) as input_file:
+            frame = pd.read_csv(
+                input_file,
+                usecols=set(columns).__contains__,
+                dtype=dtype,
+                compression=COMPRESSIONS.get(os.path.splitext(path)[1])
+            )
+        return {source: frame}, input_file.read_seconds, [path]
+
+    def _dtypes(self, columns):
+        return {
+            column: column_type
+            for column, column_type in columns.items()
+            if column_type is not None
+        }
+
+
+# The SubwayPipeline, vehicle datapoints and chunk size that load_routes hands
+# to its forked workers
+_forked_routes = None
+
+
+# Only the fitted pipeline goes back with the matrix, rather than the route's
+# SubwayPipeline and the inputs it shares with the parent
+def _load_forked_route(route):
+    subway_pipeline, vehicle_datapoints, chunksize = _forked_routes
+    route_pipeline = copy.copy(subway_pipeline)
+    route_pipeline.route = route
+    if vehicle_datapoints is not None:
+        route_pipeline._route_vehicles = vehicle_datapoints[
+            vehicle_datapoints["vehicle_id"].str[0] == route
+        ]
+    return route_pipeline.load(chunksize), route_pipeline.pipeline_
+
+
+# The SubwayPipeline whose shards are being transformed by forked workers,
+# with the vehicle datapoints they're cut from and the fitted feature steps
+_forked_pipeline = None
+
+
+# The rows of the vehicle datapoints at the given positions, each labelled
+# with its position in SHARD_ROW_COLUMN so the shards' features can be put
+# back in order
+def _shard(vehicle_datapoints, rows):
+    return vehicle_datapoints.iloc[rows].assign(**{SHARD_ROW_COLUMN: rows})
+
+
+def _run_forked_chunk(rows):
+    subway_pipeline, vehicle_datapoints, feature_steps = _forked_pipeline
+    feature_frame, locations_adder = subway_pipeline._chunk_features(
+        _shard(vehicle_datapoints, rows),
+        feature_steps
+    )
+    return (
+        feature_frame,
+        locations_adder.generations_,
+        locations_adder.occupancy_
+    )
@@ -0,0 +1,340 @@
+import numpy as np
+import os
+import pandas as pd
+
+from service_time import TIMESTAMP_FORMAT
+
+# Generates vehicle, terminal, actuals, locations and patterns CSVs with the
+# columns the SubwayPipeline reads, at any size. Each vehicle runs back and
+# forth along its route, one trip per trip_seconds, and reports its location
+# every generation. Trip IDs repeat each service day, like GTFS trip IDs, and
+# the actuals hold an arrival and a departure at every stop of every trip,
+# with the duplicates, missing times and commuter rail trips the real
+# exports have.
+
+ROUTE_NAMES = {'B': 'Blue', 'O': 'Orange', 'R': 'Red'}
+
+
+class SyntheticDataGenerator:
+    def __init__(
+        self,
+        n_generations=1000,
+        vehicles_per_route=20,
+        routes=('B', 'O', 'R'),
+        locations_per_route=60,
+        stop_every=3,
+        generation_seconds=10,
+        trip_seconds=3600,
+        start='2019-05-17T11:00:00Z',
+        duplicate_fraction=0.3,
+        seed=0
+    ):
+        self.n_generations = n_generations
+        self.vehicles_per_route = vehicles_per_route
+        self.routes = list(routes)
+        self.locations_per_route = locations_per_route
+        self.stop_every = stop_every
+        self.generation_seconds = generation_seconds
+        self.trip_seconds = trip_seconds
+        self.start = int(pd.Timestamp(start).timestamp())
+        self.duplicate_fraction = duplicate_fraction
+        self.seed = seed
+
+        self._rng = np.random.default_rng(seed)
+        self._build_network()
+        self._build_fleet()
+
+    # Pick the number of generations that gives about n_vehicle_rows rows
+    # in the vehicles file
+    @classmethod
+    def for_vehicle_rows(cls, n_vehicle_rows, **kwargs):
+        vehicles_per_route = kwargs.get('vehicles_per_route', 20)
+        n_routes = len(kwargs.get('routes', ('B', 'O', 'R')))
+        n_generations = max(
+            1,
+            round(n_vehicle_rows / (vehicles_per_route * n_routes))
+        )
+        return cls(n_generations=n_generations, **kwargs)
+
+    # Write all five CSVs to directory, building the datapoints a block of
+    # generations at a time so that memory stays bounded. Returns the paths
+    # as SubwayPipeline keyword arguments.
+    def write(self, directory, rows_per_block=1000000):
+        os.makedirs(directory, exist_ok=True)
+        paths = {
+            'actuals_path': os.path.join(directory, 'pa_datapoints.csv'),
+            'locations_path': os.path.join(directory, 'locations.csv'),
+            'patterns_path': os.path.join(directory, 'patterns.csv'),
+            'terminals_path': os.path.join(
+                directory,
+                'terminal_datapoints.csv'
+            ),
+            'vehicles_path': os.path.join(directory, 'vehicle_datapoints.csv')
+        }
+        self.locations().to_csv(paths['locations_path'], index=False)
+        self.patterns().to_csv(paths['patterns_path'], index=False)
+
+        generations_per_block = max(1, rows_per_block // self._n_vehicles)
+        for first in range(0, self.n_generations, generations_per_block):
+            last = min(first + generations_per_block, self.n_generations)
+            header = first == 0
+            for key, frame in [
+                ('vehicles_path', self.vehicle_datapoints(first, last)),
+                ('terminals_path', self.terminal_datapoints(first, last)),
+                ('actuals_path', self.actuals(first, last))
+            ]:
+                frame.to_csv(
+                    paths[key],
+                    index=False,
+                    header=header,
+                    mode='w' if header else 'a'
+                )
+        return paths
+
+    # Vehicles run both ways along the same locations, so each location leads
+    # to its neighbours on either side
+    def locations(self):
+        return pd.DataFrame({
+            'loc_id': np.concatenate(self._loc_ids),
+            'loc_name': np.concatenate([
+                [f'{route} location {i}' for i in range(len(loc_ids))]
+                for route, loc_ids in zip(self.routes, self._loc_ids)
+            ]),
+            'line': np.repeat(self.routes, self.locations_per_route),
+            'gtfs_stop_id': np.concatenate(self._gtfs_stop_ids),
+            'next_loc_ids': np.concatenate([
+                [
+                    '|'.join(
+                        loc_ids[j] for j in [i - 1, i + 1]
+                        if 0 <= j < len(loc_ids)
+                    )
+                    for i in range(len(loc_ids))
+                ]
+                for loc_ids in self._loc_ids
+            ]),
+            'default_rt': self.trip_seconds / self.locations_per_route,
+            'latitude': np.concatenate(self._latitudes),
+            'longitude': np.concatenate(self._longitudes)
+        })
+
+    # Two patterns per route, one in each direction, ending at the last
+    # location in that direction
+    def patterns(self):
+        rows = []
+        for route_index, route in enumerate(self.routes):
+            loc_ids = self._loc_ids[route_index]
+            for direction in [0, 1]:
+                ordered = loc_ids if direction == 0 else loc_ids[::-1]
+                rows.append({
+                    'pattern_id': self._pattern_id(route_index, direction),
+                    'direction_id': direction,
+                    'route_id': ROUTE_NAMES.get(route, route),
+                    'first_stop': ordered[0],
+                    'terminal_stop': ordered[-1]
+                })
+        return pd.DataFrame(rows)
+
+    # One row per vehicle per generation, for generations first to last
+    def vehicle_datapoints(self, first, last):
+        times = self._generation_times(first, last)
+        n_times = len(times)
+        vehicle = np.tile(np.arange(self._n_vehicles), n_times)
+        time = np.repeat(times, self._n_vehicles)
+
+        trip = (time - self._trip_origins[vehicle]) // self.trip_seconds
+        trip_start = self._trip_origins[vehicle] + trip * self.trip_seconds
+        seconds_per_location = self.trip_seconds / self.locations_per_route
+        position = ((time - trip_start) // seconds_per_location).astype(int)
+        direction = trip % 2
+        location = np.where(
+            direction == 0,
+            position,
+            self.locations_per_route - 1 - position
+        )
+        route = self._vehicle_routes[vehicle]
+
+        offsets = self._rng.normal(600, 1500, len(time)).round()
+        offsets[self._rng.random(len(time)) < 0.5] = np.nan
+
+        return pd.DataFrame({
+            'generation': time,
+            'timestamp': self._timestamps(time),
+            'vehicle_id': self._vehicle_ids[vehicle],
+            'current_location_id': self._all_loc_ids[
+                route * self.locations_per_route + location
+            ],
+            'length_of_time_at_current_location': (
+                time - trip_start - position * seconds_per_location
+            ).astype(int),
+            'ocs_trip_id': self._ocs_trip_ids(vehicle, trip),
+            'gtfs_trip_id': self._gtfs_trip_ids(vehicle, trip),
+            'pattern_id': self._pattern_id(route, direction),
+            'offset_departure_seconds_from_now': offsets
+        })
+
+    # The terminal mode of every terminal stop in each generation
+    def terminal_datapoints(self, first, last):
+        times = self._generation_times(first, last)
+        terminals = np.array([
+            self._gtfs_stop_ids[route_index][end]
+            for route_index in range(len(self.routes))
+            for end in [-1, 0]
+        ], dtype=object)
+        time = np.repeat(times, len(terminals))
+
+        return pd.DataFrame({
+            'generation': time,
+            'timestamp': self._timestamps(time),
+            'terminal_stop_id': np.tile(terminals, len(times)),
+            'automatic': self._rng.random(len(time)) < 0.8
+        })
+
+    # Arrivals and departures for every trip that starts while generations
+    # first to last are being logged. The first block also covers the trips
+    # already under way at the first generation.
+    def actuals(self, first, last):
+        window_start = self.start + first * self.generation_seconds
+        window_end = self.start + last * self.generation_seconds
+        if first == 0:
+            window_start -= self.trip_seconds
+
+        first_trips = -((self._trip_origins - window_start) //
+                        self.trip_seconds)
+        last_trips = -((self._trip_origins - window_end) //
+                       self.trip_seconds)
+        n_trips = last_trips - first_trips
+        vehicle = np.repeat(np.arange(self._n_vehicles), n_trips)
+        trip = first_trips[vehicle] + np.arange(n_trips.sum()) - \
+            np.repeat(np.cumsum(n_trips) - n_trips, n_trips)
+        trip_start = self._trip_origins[vehicle] + trip * self.trip_seconds
+
+        stops = self._stop_positions
+        seconds_per_location = self.trip_seconds / self.locations_per_route
+        trip_rows = np.repeat(np.arange(len(vehicle)), len(stops))
+        position = np.tile(stops, len(vehicle))
+        arrival = trip_start[trip_rows] + position * seconds_per_location + \
+            self._rng.normal(0, 30, len(trip_rows))
+        route = self._vehicle_routes[vehicle[trip_rows]]
+        direction = trip[trip_rows] % 2
+        location = np.where(
+            direction == 0,
+            position,
+            self.locations_per_route - 1 - position
+        )
+
+        actuals = pd.DataFrame({
+            'event_type': np.repeat(['arrival', 'departure'], len(trip_rows)),
+            'stop_id': np.tile(
+                self._all_gtfs_stop_ids[
+                    route * self.locations_per_route + location
+                ],
+                2
+            ),
+            'time': np.concatenate([arrival, arrival + 20]).round(),
+            'trip_id': np.tile(
+                self._gtfs_trip_ids(vehicle, trip)[trip_rows],
+                2
+            ),
+            'vehicle_id': np.tile(
+                self._vehicle_ids[vehicle[trip_rows]],
+                2
+            )
+        })
+        return self._with_noise(actuals)
+
+    # Log some actuals twice, as from both dev-green and prod, drop the
+    # times of a few and mix in some commuter rail trips
+    def _with_noise(self, actuals):
+        duplicates = actuals.sample(
+            frac=self.duplicate_fraction,
+            random_state=self._rng
+        )
+        commuter_rail = actuals.sample(frac=0.05, random_state=self._rng). \
+            assign(trip_id=lambda frame: 'CR-' + frame['trip_id'])
+        actuals = pd.concat(
+            [actuals, duplicates, commuter_rail],
+            ignore_index=True
+        )
+        actuals.loc[self._rng.random(len(actuals)) < 0.01, 'time'] = np.nan
+        return actuals
+
+    def _build_network(self):
+        self._stop_positions = np.unique(np.concatenate([
+            np.arange(0, self.locations_per_route, self.stop_every),
+            [self.locations_per_route - 1]
+        ]))
+        self._loc_ids = []
+        self._latitudes = []
+        self._longitudes = []
+        self._gtfs_stop_ids = []
+        for route_index in range(len(self.routes)):
+            position = np.arange(self.locations_per_route)
+            latitudes = 42.2 + 0.05 * route_index + 0.001 * position
+            longitudes = -71.2 + 0.001 * position
+            self._latitudes.append(latitudes)
+            self._longitudes.append(longitudes)
+            self._loc_ids.append(np.array([
+                f'{latitude:.6f}-{longitude:.6f}'
+                for latitude, longitude in zip(latitudes, longitudes)
+            ], dtype=object))
+
+            gtfs_stop_ids = np.full(self.locations_per_route, None)
+            gtfs_stop_ids[self._stop_positions] = [
+                f'7{route_index + 1}{stop:03d}'
+                for stop in range(len(self._stop_positions))
+            ]
+            self._gtfs_stop_ids.append(gtfs_stop_ids)
+
+        self._all_loc_ids = np.concatenate(self._loc_ids)
+        self._all_gtfs_stop_ids = np.concatenate(self._gtfs_stop_ids)
+
+    def _build_fleet(self):
+        self._n_vehicles = self.vehicles_per_route * len(self.routes)
+        self._vehicle_routes = np.repeat(
+            np.arange(len(self.routes)),
+            self.vehicles_per_route
+        )
+        self._vehicle_ids = np.array([
+            f'{self.routes[route]}-{0x5450000 + vehicle:X}'
+            for vehicle, route in enumerate(self._vehicle_routes)
+        ], dtype=object)
+        self._trip_origins = self.start - self._rng.integers(
+            0,
+            self.trip_seconds,
+            self._n_vehicles
+        )
+
+        # Trip IDs only depend on the vehicle and the trip of the day
+        self._trips_per_day = max(1, 86400 // self.trip_seconds)
+        trip_of_day = np.arange(self._trips_per_day)
+        self._trip_id_table = np.array([
+            f'{10000000 * (route + 1) + 1000 * vehicle + trip}'
+            for vehicle, route in enumerate(self._vehicle_routes)
+            for trip in trip_of_day
+        ], dtype=object).reshape(self._n_vehicles, self._trips_per_day)
+        self._ocs_trip_id_table = np.array([
+            f'{0x98000000 + 1000 * vehicle + trip:X}'
+            for vehicle in range(self._n_vehicles)
+            for trip in trip_of_day
+        ], dtype=object).reshape(self._n_vehicles, self._trips_per_day)
+
+    def _gtfs_trip_ids(self, vehicle, trip):
+        return self._trip_id_table[vehicle, trip % self._trips_per_day]
+
+    def _ocs_trip_ids(self, vehicle, trip):
+        return self._ocs_trip_id_table[vehicle, trip % self._trips_per_day]
+
+    def _pattern_id(self, route_index, direction):
+        return route_index * 2 + direction + 1
+
+    def _generation_times(self, first, last):
+        return self.start + \
+            np.arange(first, last, dtype=np.int64) * self.generation_seconds
+
+    # Format each distinct time once, since every generation's rows share
+    # the same timestamp
+    def _timestamps(self, times):
+        unique_times, codes = np.unique(times, return_inverse=True)
+        formatted = pd.to_datetime(unique_times, unit='s'). \
+            strftime(TIMESTAMP_FORMAT).to_numpy(dtype=object)
+        return formatted[codes]
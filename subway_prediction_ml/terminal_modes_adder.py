@@ -1,79 +1,143 @@
+import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
-from location_id_translator import LocationIdTranslator
+import column_schema
+from location_registry import LocationRegistry
+from sorted_key_index import SortedKeyIndex
+
+# Terminals whose terminal mode datapoints are logged under another stop's
+# GTFS ID
+TERMINAL_TRANSLATIONS = {
+    '70060': '70059',
+    '70093': '70094',
+    '70838': '70038'
+}
 
 
 class TerminalModesAdder(BaseEstimator, TransformerMixin):
-    def __init__(self, locations_frame, patterns_frame, terminals_frame):
+    # Pass the pipeline's LocationRegistry to share its translations, rather
+    # than building one from the locations frame
+    def __init__(
+        self,
+        locations_frame,
+        patterns_frame,
+        terminals_frame,
+        location_registry=None
+    ):
         self.locations_frame = locations_frame
         self.patterns_frame = patterns_frame
         self.terminals_frame = terminals_frame
+        self.location_registry = location_registry
 
+    # The lookup tables only depend on the reference frames, so they're built
+    # once here rather than for every batch of datapoints. Terminals are
+    # given integer codes: each pattern maps to the code of its terminal, and
+    # the terminal mode datapoints are indexed by generation and terminal.
     def fit(self, vehicle_datapoints, y=None):
+        self.pattern_ids_, self.terminal_gtfs_ids_, self.pattern_terminals_ = \
+            self._terminals_by_pattern()
+        self.generations_, self.terminal_modes_, self.automatic_ = \
+            self._index_terminal_modes()
         return self
 
+    # Add the GTFS ID of each datapoint's terminal and whether that terminal
+    # was in automatic mode in the datapoint's generation, by gathering from
+    # the lookup tables. Datapoints without a terminal or a terminal mode are
+    # dropped, and one with several terminal modes is repeated, as an inner
+    # merge would.
     def transform(self, vehicle_datapoints, y=None):
-        frame_with_terminal_modes = pd.merge(
-            self._vehicle_datapoints_with_terminals(vehicle_datapoints),
-            right=self._load_terminal_datapoints(),
-            left_on=["generation", "terminal_gtfs_id"],
-            right_on=["generation", "terminal_stop_id"],
-            how="inner"
-        ).drop(
-            ["terminal_stop_id", "timestamp_y", "pattern_id"],
-            axis=1
-        ).rename({"timestamp_x": "timestamp"}, axis="columns")
+        pattern_codes = column_schema.positions(
+            self.pattern_ids_,
+            vehicle_datapoints['pattern_id']
+        )
+        terminal_codes = np.where(
+            pattern_codes >= 0,
+            self.pattern_terminals_[pattern_codes],
+            -1
+        )
+        vehicle_rows, terminal_mode_rows = self.terminal_modes_.gather(
+            self._keys(
+                self.generations_.get_indexer(
+                    vehicle_datapoints['generation']
+                ),
+                terminal_codes
+            )
+        )
+
+        columns = vehicle_datapoints.columns.get_indexer(
+            vehicle_datapoints.columns.drop('pattern_id')
+        )
+        frame_with_terminal_modes = vehicle_datapoints.iloc[
+            vehicle_rows,
+            columns
+        ].set_axis(pd.RangeIndex(len(vehicle_rows)))
+        frame_with_terminal_modes['terminal_gtfs_id'] = \
+            pd.Categorical.from_codes(
+                terminal_codes[vehicle_rows],
+                categories=self.terminal_gtfs_ids_
+            )
+        frame_with_terminal_modes['automatic'] = \
+            self.automatic_[terminal_mode_rows]
         return frame_with_terminal_modes
 
-    # Build a dataframe mapping each pattern ID to the corresponding terminal
-    # stop GTFS ID
-    def _gtfs_id_for_terminals(self):
+    # The IDs of the patterns whose terminal stop translates to a GTFS ID,
+    # the distinct terminal GTFS IDs, and the code of each pattern's
+    # terminal. A pattern listed more than once keeps its first terminal.
+    def _terminals_by_pattern(self):
         patterns = self._load_patterns()
-        locations = LocationIdTranslator(self.locations_frame)
-        patterns["terminal_gtfs_id"] = patterns["terminal_stop"] \
-            .apply(lambda loc_id: locations.get(loc_id))
-        patterns = patterns.dropna().drop("terminal_stop", axis=1)
-        return patterns
+        location_registry = self.location_registry \
+            if self.location_registry is not None \
+            else LocationRegistry(self.locations_frame)
+        terminal_gtfs_ids = pd.Series(
+            location_registry.translate(patterns['terminal_stop'])
+        ).replace(TERMINAL_TRANSLATIONS)
+        found = terminal_gtfs_ids.notna().to_numpy()
+        pattern_ids = patterns['pattern_id'].to_numpy()[found]
+        first = ~pd.Index(pattern_ids).duplicated()
+        terminal_codes, terminal_gtfs_ids = pd.factorize(
+            terminal_gtfs_ids.to_numpy(dtype=object)[found][first],
+            sort=True
+        )
+        return (
+            pd.Index(pattern_ids[first]),
+            np.asarray(terminal_gtfs_ids, dtype=object),
+            terminal_codes
+        )
 
-    # Build a dataframe mapping each pattern ID to the corresponding terminal
-    # stop location ID
+    # Map each pattern ID to its terminal stop location ID
     def _load_patterns(self):
         dropped_frame = self. \
             patterns_frame. \
             filter(['pattern_id', 'terminal_stop'], axis=1). \
             dropna()
-        dropped_frame["terminal_stop"] = dropped_frame["terminal_stop"] \
-            .apply(lambda str: str.split("|")[0])
+        dropped_frame["terminal_stop"] = \
+            dropped_frame["terminal_stop"].str.split("|").str[0]
         return dropped_frame
 
-    # Build a dataframe with all logged terminal-mode datapoints
-    def _load_terminal_datapoints(self):
-        filtered_terminals_frame = self.terminals_frame.filter([
-            'automatic',
-            'generation',
-            'terminal_stop_id',
-            'timestamp'
-        ], axis=1)
-        filtered_terminals_frame['terminal_stop_id'] = \
-            filtered_terminals_frame['terminal_stop_id'].astype('str')
-        return filtered_terminals_frame
-
-    def _translate_terminals(self, vehicle_datapoints):
-        return vehicle_datapoints.replace(
-            ['70060', '70093', '70838'],
-            ['70059', '70094', '70038'],
+    # Index the logged terminal-mode datapoints by generation and terminal,
+    # keeping their automatic flags in the same order
+    def _index_terminal_modes(self):
+        terminal_codes = column_schema.positions(
+            self.terminal_gtfs_ids_,
+            column_schema.strings(self.terminals_frame['terminal_stop_id'])
         )
-
-    def _vehicle_datapoints_with_terminals(self, vehicle_datapoints):
-        terminals = self._gtfs_id_for_terminals()
-
-        frame_with_terminals = pd.merge(
-            vehicle_datapoints,
-            right=terminals,
-            left_on="pattern_id",
-            right_on="pattern_id",
-            how="inner"
+        generation_codes, generations = pd.factorize(
+            self.terminals_frame['generation']
+        )
+        return (
+            pd.Index(generations),
+            SortedKeyIndex(self._keys(generation_codes, terminal_codes)),
+            self.terminals_frame['automatic'].to_numpy()
         )
-        return self._translate_terminals(frame_with_terminals)
 
+    # Combine generation and terminal codes into one integer key, or -1 if
+    # either is unknown
+    def _keys(self, generation_codes, terminal_codes):
+        known = (generation_codes >= 0) & (terminal_codes >= 0)
+        return np.where(
+            known,
+            np.asarray(generation_codes, dtype=np.int64) *
+            len(self.terminal_gtfs_ids_) + terminal_codes,
+            -1
+        )
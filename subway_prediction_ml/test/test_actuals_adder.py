@@ -5,6 +5,7 @@ import unittest
 
 sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
 from actuals_adder import ActualsAdder
+from timestamp_encoder import TimestampEncoder
 
 
 class TestActualsAdder(unittest.TestCase):
@@ -68,3 +69,80 @@ class TestActualsAdder(unittest.TestCase):
         adder = ActualsAdder(actuals_data)
         result = adder.fit_transform(vehicle_data).__array__().tolist()
         assert sorted(result) == []
+
+    def test_transform_uses_actuals_prepared_in_fit(self):
+        actuals_data = pd.DataFrame(
+            columns=['trip_id', 'stop_id', 'time'],
+            data=[
+                ['B-111', '70000', 1559740000],
+                ['B-111', '70000', 1559740000],
+                ['CR-111', '70000', 1559740000]
+            ]
+        )
+
+        adder = ActualsAdder(actuals_data).fit(None)
+        adder.actuals_frame = None
+
+        for _ in range(2):
+            vehicle_data = pd.DataFrame(
+                columns=['gtfs_trip_id', 'timestamp'],
+                data=[['B-111', "2019-06-05T10:24:30.000000Z"]]
+            )
+            result = adder.transform(vehicle_data).__array__().tolist()
+            assert result == [['B-111', '70000', 9730.0]]
+
+    def test_joined_columns_follow_the_vehicle_columns(self):
+        actuals_data = pd.DataFrame(
+            columns=['event_type', 'stop_id', 'time', 'trip_id', 'vehicle_id'],
+            data=[
+                ['arrival', '70000', 1559740000, 'B-111', 'B-1'],
+                ['arrival', '70000', 1559740000, 'B-111', None],
+                ['arrival', '70000', 1559740000, 'B-111', None],
+                ['departure', '70000', 1559740020, 'B-111', 'B-1']
+            ]
+        )
+        vehicle_data = pd.DataFrame(
+            columns=['vehicle_id', 'gtfs_trip_id', 'timestamp'],
+            data=[['B-1', 'B-111', "2019-06-05T10:24:30.000000Z"]]
+        )
+
+        result = ActualsAdder(actuals_data).fit_transform(vehicle_data)
+        assert result.columns.tolist() == [
+            'vehicle_id_x',
+            'gtfs_trip_id',
+            'event_type',
+            'destination_gtfs_id',
+            'vehicle_id_y',
+            'actual_seconds_from_now'
+        ]
+        assert result.__array__().tolist() == [
+            ['B-1', 'B-111', 'arrival', '70000', 'B-1', 9730.0],
+            ['B-1', 'B-111', 'departure', '70000', 'B-1', 9750.0]
+        ]
+        assert result.index.tolist() == [0, 2]
+        assert vehicle_data.columns.tolist() == \
+            ['vehicle_id', 'gtfs_trip_id', 'timestamp']
+
+    def test_reads_times_parsed_by_the_timestamp_encoder(self):
+        actuals_data = pd.DataFrame(
+            columns=['trip_id', 'stop_id', 'time'],
+            data=[['B-111', '70000', 1559740000]]
+        )
+        vehicle_data = TimestampEncoder().fit_transform(pd.DataFrame(
+            columns=['gtfs_trip_id', 'timestamp'],
+            data=[['B-111', "2019-06-05T10:24:30.000000Z"]]
+        ))
+        # The timestamps aren't parsed again
+        vehicle_data['timestamp'] = None
+
+        result = ActualsAdder(actuals_data).fit_transform(vehicle_data)
+        assert result.columns.tolist() == [
+            'gtfs_trip_id',
+            'day_of_week',
+            'time_bin',
+            'destination_gtfs_id',
+            'actual_seconds_from_now'
+        ]
+        assert result.__array__().tolist() == [
+            ['B-111', 2, 41, '70000', 9730.0]
+        ]
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from benchmark import Benchmark, compare
+from synthetic_data import SyntheticDataGenerator
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_save_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            data_dir = os.path.join(directory, 'data')
+            results_dir = os.path.join(directory, 'results')
+            SyntheticDataGenerator(
+                n_generations=30,
+                vehicles_per_route=2
+            ).write(data_dir)
+
+            benchmark = Benchmark(data_dir, results_dir, repeat=1)
+            results = benchmark.run()
+            path = benchmark.save(results)
+            comparison = compare(path, path)
+
+        assert list(results) == [
+            'read_inputs',
+            'read_locations',
+            'subway_pipeline.load',
+            'route_filter',
+            'timestamp_encoder',
+            'offset_seconds_encoder',
+            'terminal_modes_adder',
+            'locations_adder',
+            'actuals_adder',
+            'final_transformer',
+            'model_evaluator'
+        ]
+        assert results['route_filter']['rows_in'] == 180
+        assert results['route_filter']['rows_out'] == 60
+        assert all(result['peak_bytes'] > 0 for result in results.values())
+        assert comparison['time_ratio'].eq(1).all()
@@ -0,0 +1,88 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+import column_schema
+from subway_pipeline import SubwayPipeline
+
+
+class TestColumnSchema(unittest.TestCase):
+    def test_compact_casts_schema_columns(self):
+        frame = pd.DataFrame({
+            'event_type': ['ARR', 'DEP'],
+            'time': [1558017621, 1558017622],
+            'other': ['a', 'b']
+        })
+        result = column_schema.compact(
+            frame,
+            column_schema.ACTUALS_COLUMNS
+        )
+
+        assert isinstance(result['event_type'].dtype, pd.CategoricalDtype)
+        assert result['time'].dtype == np.float64
+        assert result['other'].dtype == frame['other'].dtype
+
+    def test_concat_unions_categories(self):
+        frames = [
+            pd.DataFrame({'stop_id': pd.Categorical(['70061', '70063'])}),
+            pd.DataFrame({'stop_id': pd.Categorical(['70065'])})
+        ]
+        result = column_schema.concat(frames)
+
+        assert isinstance(result['stop_id'].dtype, pd.CategoricalDtype)
+        assert result['stop_id'].tolist() == ['70061', '70063', '70065']
+
+    def test_strings_and_positions(self):
+        values = pd.Series(pd.Categorical([70063, np.nan, 70061]))
+        strings = column_schema.strings(values)
+
+        assert isinstance(strings.dtype, pd.CategoricalDtype)
+        assert strings.tolist()[0] == '70063'
+        assert column_schema.positions(['70061', '70063'], strings). \
+            tolist() == [1, -1, 0]
+        assert column_schema.positions(
+            ['70061', '70063'],
+            pd.Series(['70063', '70065'])
+        ).tolist() == [1, -1]
+
+    def test_pipeline_keeps_compact_types(self):
+        datasets = os.path.abspath(os.path.join(__file__, '..', 'datasets'))
+        p = SubwayPipeline(
+            actuals_path=os.path.join(datasets, 'pa_datapoints.csv'),
+            locations_path=os.path.join(datasets, 'locations.csv'),
+            patterns_path=os.path.join(datasets, 'patterns.csv'),
+            terminals_path=os.path.join(datasets, 'terminal_datapoints.csv'),
+            vehicles_path=os.path.join(datasets, 'vehicle_datapoints.csv')
+        )
+        frame = next(p.stream(chunksize=1000))
+
+        dtypes = frame.dtypes
+        assert not (dtypes == object).any()
+        assert all(
+            isinstance(dtypes[column], pd.CategoricalDtype)
+            for column in [
+                'current_location_id',
+                'destination_gtfs_id',
+                'event_type',
+                'terminal_gtfs_id'
+            ]
+        )
+        assert dtypes['time_bin'] == np.int8
+        assert dtypes['length_of_time_at_current_location'] == np.float32
+        locations = p.locations_frame
+        assert (dtypes[locations[locations['line'] == 'B']['loc_id']] ==
+                np.uint8).all()
+
+    def test_memory_report(self):
+        frame = pd.DataFrame({
+            'vehicle_id': pd.Categorical(['B1234'] * 1000),
+            'time_bin': np.zeros(1000, dtype=np.int8)
+        })
+        report = column_schema.memory_report([('vehicles', frame)])
+
+        assert report.loc['vehicles', 'rows'] == 1000
+        assert report.loc['vehicles', 'compact_mb'] < \
+            report.loc['vehicles', 'wide_mb']
@@ -0,0 +1,97 @@
+import numpy as np
+import os
+import sys
+import tempfile
+import unittest
+from scipy.sparse import csr_matrix
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from feature_matrix_files import FeatureMatrixFiles
+from subway_pipeline import SubwayPipeline
+
+
+class TestFeatureMatrixFiles(unittest.TestCase):
+    def test_open_memory_maps_what_was_written(self):
+        features = csr_matrix(np.array([[0, 1.5, 0], [2, 0, 0]]))
+        with tempfile.TemporaryDirectory() as directory:
+            matrix_files = FeatureMatrixFiles(directory)
+            matrix_files.write(features, [10, 20], ['a', 'b', 'c'])
+            result, labels, feature_names = matrix_files.open()
+
+            assert result.format == 'csr'
+            assert result.toarray().tolist() == [[0, 1.5, 0], [2, 0, 0]]
+            assert labels.tolist() == [10, 20]
+            assert feature_names == ['a', 'b', 'c']
+            assert isinstance(labels, np.memmap)
+            assert not result.data.flags.writeable
+
+    def test_write_converts_dense_features(self):
+        with tempfile.TemporaryDirectory() as directory:
+            matrix_files = FeatureMatrixFiles(directory)
+            matrix_files.write(np.eye(2), [1, 2], ['a', 'b'])
+            assert matrix_files.open()[0].nnz == 2
+
+    def test_write_replaces_open_matrix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            matrix_files = FeatureMatrixFiles(directory)
+            matrix_files.write(np.eye(3), [1, 2, 3], ['a', 'b', 'c'])
+            old_features, old_labels, old_names = matrix_files.open()
+
+            matrix_files.write(np.ones((2, 2)), [4, 5], ['d', 'e'])
+            features, labels, feature_names = matrix_files.open()
+
+            assert old_features.toarray().tolist() == np.eye(3).tolist()
+            assert old_labels.tolist() == [1, 2, 3]
+            assert features.toarray().tolist() == [[1, 1], [1, 1]]
+            assert labels.tolist() == [4, 5]
+            assert feature_names == ['d', 'e']
+            assert sorted(os.listdir(directory)) == [
+                'data.npy',
+                'indices.npy',
+                'indptr.npy',
+                'labels.npy',
+                'matrix.json'
+            ]
+
+    def test_write_checks_shapes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            matrix_files = FeatureMatrixFiles(directory)
+            with self.assertRaises(ValueError):
+                matrix_files.write(np.eye(2), [1, 2, 3], ['a', 'b'])
+            with self.assertRaises(ValueError):
+                matrix_files.write(np.eye(2), [1, 2], ['a'])
+
+    def test_subway_pipeline_writes_sparse_output(self):
+        for sparse_locations in [False, True]:
+            expected = self._pipeline(sparse_locations=sparse_locations). \
+                load()
+            p = self._pipeline(
+                sparse_locations=sparse_locations,
+                sparse_output=True
+            )
+            with tempfile.TemporaryDirectory() as output_dir:
+                result = p.load(output_dir=output_dir)
+                features, labels, feature_names = \
+                    FeatureMatrixFiles(output_dir).open()
+
+                assert result.format == 'csr'
+                assert np.array_equal(result.toarray(), expected)
+                assert np.array_equal(features.toarray(), expected[:, 1:])
+                assert np.array_equal(labels, expected[:, 0])
+                assert feature_names == p.feature_names()
+                assert len(feature_names) == features.shape[1]
+
+    def _pipeline(self, **kwargs):
+        return SubwayPipeline(
+            actuals_path=self._fixture_path('pa_datapoints.csv'),
+            locations_path=self._fixture_path('locations.csv'),
+            patterns_path=self._fixture_path('patterns.csv'),
+            terminals_path=self._fixture_path('terminal_datapoints.csv'),
+            vehicles_path=self._fixture_path('vehicle_datapoints.csv'),
+            **kwargs
+        )
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
@@ -0,0 +1,122 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+import column_schema
+from feature_store import FeatureStore
+from subway_pipeline import SubwayPipeline
+
+
+class TestFeatureStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FeatureStore(os.path.join(self.directory.name, 'store'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_store_matches_loading_the_exports(self):
+        p = self._pipeline()
+        assert self.store.update(p) == ['2019-05-17']
+
+        expected = self._pipeline().load()
+        result = self._pipeline().load_from_store(self.store)
+        assert np.array_equal(result, expected)
+
+    def test_updates_with_split_exports(self):
+        vehicles = pd.read_csv(self._fixture_path('vehicle_datapoints.csv'))
+        for generation in [1558017621, 1558017620]:
+            self.store.update(self._pipeline(
+                vehicles_path=self._export(
+                    'vehicles.csv',
+                    vehicles[vehicles['generation'] == generation]
+                )
+            ))
+
+        summary = self.store.summary()
+        assert summary['generations'].tolist() == [2]
+        assert summary['feature_rows'].tolist() == [2]
+        assert np.array_equal(
+            self._pipeline().load_from_store(self.store),
+            self._pipeline().load()
+        )
+
+    def test_skips_generations_already_stored(self):
+        self.store.update(self._pipeline())
+        before = self.store.select()
+        self.store.update(self._pipeline(
+            actuals_path=self._export('actuals.csv', self._actuals().iloc[0:0])
+        ))
+
+        assert self.store.summary()['generations'].tolist() == [2]
+        pd.testing.assert_frame_equal(self.store.select(), before)
+
+    def test_recomputes_dates_with_late_actuals(self):
+        actuals = self._actuals()
+        self.store.update(self._pipeline(
+            actuals_path=self._export(
+                'actuals.csv',
+                actuals[actuals['trip_id'] != '12345678']
+            )
+        ))
+        assert self.store.summary()['feature_rows'].tolist() == [0]
+
+        assert self.store.update(self._pipeline()) == ['2019-05-17']
+        assert self.store.summary()['feature_rows'].tolist() == [2]
+
+    def test_stores_each_actual_once(self):
+        for update in range(3):
+            computed = self.store.update(self._pipeline())
+        assert computed == []
+
+        dates = self.store._read_manifest()['service_dates']
+        parts = {
+            date: entry['parts']['actuals']
+            for date, entry in dates.items()
+            if entry['parts']['actuals']
+        }
+        assert all(len(date_parts) == 1 for date_parts in parts.values())
+        stored = column_schema.concat(
+            self.store._read_raw_parts('actuals', date, date_parts)
+            for date, date_parts in parts.items()
+        )
+        assert len(stored) == len(self._actuals().dropna(subset=['time']))
+        assert self.store.summary()['feature_rows'].tolist() == [2]
+
+    def test_select_filters_service_dates(self):
+        self.store.update(self._pipeline())
+
+        assert len(self.store.select('2019-05-17', '2019-05-17')) == 2
+        with self.assertRaises(ValueError):
+            self.store.select(start_date='2019-05-18')
+
+    def _actuals(self):
+        return pd.read_csv(
+            self._fixture_path('pa_datapoints.csv'),
+            dtype={'trip_id': str}
+        )
+
+    def _export(self, filename, frame):
+        path = os.path.join(self.directory.name, filename)
+        frame.to_csv(path, index=False)
+        return path
+
+    def _pipeline(self, **kwargs):
+        paths = {
+            'actuals_path': self._fixture_path('pa_datapoints.csv'),
+            'locations_path': self._fixture_path('locations.csv'),
+            'patterns_path': self._fixture_path('patterns.csv'),
+            'terminals_path': self._fixture_path('terminal_datapoints.csv'),
+            'vehicles_path': self._fixture_path('vehicle_datapoints.csv')
+        }
+        paths.update(kwargs)
+        return SubwayPipeline(**paths)
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
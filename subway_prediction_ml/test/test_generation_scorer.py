@@ -0,0 +1,211 @@
+import json
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from generation_scorer import GenerationScorer
+from subway_pipeline import SubwayPipeline
+
+
+class WeightedSumModel:
+    def predict(self, features):
+        features = np.asarray(features)
+        return features @ np.arange(1, features.shape[1] + 1)
+
+
+class ColumnModel:
+    def __init__(self, column):
+        self.column = column
+
+    def predict(self, features):
+        return np.asarray(features)[:, self.column]
+
+
+class TestGenerationScorer(unittest.TestCase):
+    def test_predictions_match_batch_pipeline_features(self):
+        for sparse_locations in [False, True]:
+            p = self._pipeline(sparse_locations=sparse_locations)
+            p.load()
+            scorer = GenerationScorer(
+                p,
+                WeightedSumModel(),
+                destinations=[('70050', 'arrival')]
+            )
+
+            vehicles = p._load_vehicle_datapoints()
+            for generation in [1558017620, 1558017621]:
+                vehicle_rows = vehicles[vehicles['generation'] == generation]
+                terminal_rows = p.terminals_frame[
+                    p.terminals_frame['generation'] == generation
+                ]
+
+                features, _ = p.features_and_labels(
+                    p.transform(vehicle_rows.copy())
+                )
+                result = scorer.predict_generation(
+                    vehicle_rows,
+                    terminal_rows
+                )
+
+                assert result[['vehicle_id', 'destination_gtfs_id']]. \
+                    __array__().tolist() == [['B-934TXS', '70050']]
+                assert np.allclose(
+                    result['predicted_seconds'],
+                    WeightedSumModel().predict(features)
+                )
+
+    def test_predictions_with_scheduled_run_times(self):
+        p = self._pipeline(scheduled_run_times=True)
+        p.load()
+        scorer = GenerationScorer(
+            p,
+            WeightedSumModel(),
+            destinations=[('70050', 'arrival'), ('70059', 'arrival')]
+        )
+
+        vehicles = p._load_vehicle_datapoints()
+        for generation in [1558017620, 1558017621]:
+            vehicle_rows = vehicles[vehicles['generation'] == generation]
+            features, _ = p.features_and_labels(
+                p.transform(vehicle_rows.copy())
+            )
+            terminal_rows = p.terminals_frame[
+                p.terminals_frame['generation'] == generation
+            ]
+            result = scorer.predict_generation(vehicle_rows, terminal_rows)
+
+            # 70059 can't be reached from the vehicle's location, so it's
+            # scored with the unreachable flag set
+            assert result['destination_gtfs_id'].tolist() == \
+                ['70050', '70059']
+            assert np.allclose(
+                result['predicted_seconds'].iloc[:1],
+                WeightedSumModel().predict(features)
+            )
+
+        flag = p.feature_names().index(
+            'remainder__scheduled_run_unreachable'
+        )
+        scorer.model = ColumnModel(flag)
+        result = scorer.predict_generation(vehicle_rows, terminal_rows)
+        assert result['predicted_seconds'].tolist() == [0.0, 1.0]
+
+    def test_scores_every_trained_destination_by_default(self):
+        p = self._pipeline()
+        p.load()
+        scorer = GenerationScorer(p, WeightedSumModel())
+
+        vehicles = p._load_vehicle_datapoints()
+        result = scorer.predict_generation(
+            vehicles[vehicles['generation'] == 1558017620],
+            p.terminals_frame[p.terminals_frame['generation'] == 1558017620]
+        )
+
+        assert result[['destination_gtfs_id', 'event_type']]. \
+            __array__().tolist() == [['70050', 'arrival']]
+        assert scorer.latency_percentiles()['count'] == 1
+
+    def test_skips_vehicles_without_terminal_modes(self):
+        p = self._pipeline()
+        p.load()
+        scorer = GenerationScorer(p, WeightedSumModel())
+
+        vehicles = p._load_vehicle_datapoints()
+        result = scorer.predict_generation(
+            vehicles[vehicles['generation'] == 1558017620],
+            p.terminals_frame.iloc[0:0]
+        )
+        assert len(result) == 0
+
+    def test_repeats_vehicles_with_several_terminal_modes(self):
+        terminals = pd.read_csv(self._fixture_path('terminal_datapoints.csv'))
+        terminals = pd.concat(
+            [terminals, terminals.assign(automatic=~terminals['automatic'])],
+            ignore_index=True
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            terminals_path = os.path.join(directory, 'terminals.csv')
+            terminals.to_csv(terminals_path, index=False)
+            p = self._pipeline(terminals_path=terminals_path)
+            p.load()
+        scorer = GenerationScorer(
+            p,
+            WeightedSumModel(),
+            destinations=[('70050', 'arrival')]
+        )
+
+        vehicles = p.vehicle_datapoints()
+        vehicle_rows = vehicles[vehicles['generation'] == 1558017620]
+        features, _ = p.features_and_labels(
+            p.transform(vehicle_rows.copy())
+        )
+        result = scorer.predict_generation(
+            vehicle_rows,
+            p.terminals_frame[p.terminals_frame['generation'] == 1558017620]
+        )
+
+        assert len(result) == 2
+        assert np.allclose(
+            result['predicted_seconds'],
+            WeightedSumModel().predict(features)
+        )
+
+    def test_serve_rejects_malformed_requests(self):
+        p = self._pipeline()
+        p.load()
+        server = GenerationScorer(p, WeightedSumModel())._server(
+            '127.0.0.1',
+            0
+        )
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = f'http://127.0.0.1:{server.server_address[1]}/'
+            for body in [b'not json', b'[]', b'{"vehicles": []}']:
+                with self.assertRaises(HTTPError) as raised:
+                    urlopen(url, data=body)
+                assert raised.exception.code == 400
+                assert 'error' in json.loads(raised.exception.read())
+
+            vehicles = p.vehicle_datapoints()
+            request = json.dumps(
+                {
+                    'vehicles': vehicles[
+                        vehicles['generation'] == 1558017620
+                    ].to_dict(orient='records'),
+                    'terminals': p.terminals_frame[
+                        p.terminals_frame['generation'] == 1558017620
+                    ].to_dict(orient='records')
+                },
+                default=str
+            ).encode('utf-8')
+            with urlopen(url, data=request) as response:
+                assert response.status == 200
+                assert len(json.loads(response.read())) == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def _pipeline(self, **kwargs):
+        paths = {
+            'actuals_path': self._fixture_path('pa_datapoints.csv'),
+            'locations_path': self._fixture_path('locations.csv'),
+            'patterns_path': self._fixture_path('patterns.csv'),
+            'terminals_path': self._fixture_path('terminal_datapoints.csv'),
+            'vehicles_path': self._fixture_path('vehicle_datapoints.csv')
+        }
+        paths.update(kwargs)
+        return SubwayPipeline(**paths)
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
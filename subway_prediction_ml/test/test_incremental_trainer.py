@@ -0,0 +1,140 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import LinearRegression, SGDRegressor
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from feature_matrix_files import FeatureMatrixFiles
+from incremental_trainer import IncrementalTrainer
+from subway_pipeline import SubwayPipeline
+
+
+class TestIncrementalTrainer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        random = np.random.default_rng(0)
+        self.features = random.random((6, 3))
+        self.labels = self.features @ [1.0, 2.0, 3.0]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_fit_matrix_files_trains_chunk_by_chunk(self):
+        trainer = IncrementalTrainer(SGDRegressor(random_state=0), chunksize=4)
+        trainer.fit_matrix_files(self._write_matrix(6))
+
+        # The chunks are read as CSR, which SGD treats a little differently
+        features = csr_matrix(self.features)
+        expected = SGDRegressor(random_state=0)
+        expected.partial_fit(features[:4], self.labels[:4])
+        expected.partial_fit(features[4:], self.labels[4:])
+        assert trainer.chunks_ == 2
+        assert np.allclose(trainer.model.coef_, expected.coef_)
+
+    def test_resume_from_checkpoint_skips_trained_chunks(self):
+        checkpoint_path = os.path.join(self.directory.name, 'model.pickle')
+        IncrementalTrainer(
+            SGDRegressor(random_state=0),
+            chunksize=2,
+            checkpoint_path=checkpoint_path
+        ).fit_matrix_files(self._write_matrix(4, 'interrupted'))
+
+        trainer = IncrementalTrainer.from_checkpoint(checkpoint_path)
+        assert trainer.chunks_ == 2
+        trainer.fit_matrix_files(self._write_matrix(6), resume=True)
+
+        expected = IncrementalTrainer(SGDRegressor(random_state=0), 2). \
+            fit_matrix_files(self._write_matrix(6))
+        assert trainer.chunks_ == 3
+        assert np.allclose(trainer.model.coef_, expected.model.coef_)
+
+    def test_fit_pipeline_scales_chunks_as_it_goes(self):
+        checkpoint_path = os.path.join(self.directory.name, 'model.pickle')
+        trainer = IncrementalTrainer(
+            chunksize=2,
+            checkpoint_path=checkpoint_path
+        ).fit_pipeline(self._pipeline())
+        assert trainer.chunks_ == 2
+        assert trainer.scaler.n_samples_seen_ == 2
+
+        resumed = IncrementalTrainer.from_checkpoint(checkpoint_path). \
+            fit_pipeline(self._pipeline(), resume=True)
+        assert resumed.scaler.n_samples_seen_ == 2
+        assert np.allclose(resumed.model.coef_, trainer.model.coef_)
+
+    def test_checkpoint_scores_held_out_datapoints(self):
+        vehicles = pd.read_csv(self._fixture_path('vehicle_datapoints.csv'))
+        vehicles_path = os.path.join(self.directory.name, 'vehicles.csv')
+        vehicles[vehicles['generation'] == 1558017621]. \
+            to_csv(vehicles_path, index=False)
+        held_out = self._pipeline().vehicle_datapoints()
+        held_out = held_out[held_out['generation'] == 1558017620]
+
+        for sparse_locations in [False, True]:
+            checkpoint_path = os.path.join(self.directory.name, 'model.pickle')
+            trainer = IncrementalTrainer(
+                SGDRegressor(random_state=0),
+                chunksize=2,
+                checkpoint_path=checkpoint_path
+            ).fit_pipeline(self._pipeline(
+                vehicles_path=vehicles_path,
+                sparse_locations=sparse_locations
+            ))
+
+            restored = IncrementalTrainer.from_checkpoint(checkpoint_path)
+            p = self._pipeline(sparse_locations=sparse_locations)
+            predictions = restored.predict(p, held_out.copy())
+            features, labels = p.streaming_features_and_labels(
+                held_out.copy(),
+                restored.final_transformer,
+                restored.scaler
+            )
+
+            assert restored.scaler.n_samples_seen_ == 1
+            assert features.shape[1] == trainer.model.coef_.shape[0]
+            assert len(predictions) == len(labels) == 1
+            assert np.allclose(predictions, trainer.model.predict(features))
+
+    def test_stream_training_chunks_have_the_same_columns(self):
+        for sparse_locations in [False, True]:
+            chunks = list(
+                self._pipeline(sparse_locations=sparse_locations).
+                stream_training_chunks(2)
+            )
+            assert len(chunks) == 2
+            assert chunks[0][0].shape == chunks[1][0].shape
+            assert [labels.tolist() for _, labels in chunks] == \
+                [[15.617650985717773], [15.617650985717773]]
+
+    def test_requires_partial_fit(self):
+        with self.assertRaises(ValueError):
+            IncrementalTrainer(LinearRegression())
+
+    def _write_matrix(self, n_rows, name='matrix'):
+        output_dir = os.path.join(self.directory.name, name)
+        FeatureMatrixFiles(output_dir).write(
+            self.features[:n_rows],
+            self.labels[:n_rows],
+            ['a', 'b', 'c']
+        )
+        return output_dir
+
+    def _pipeline(self, **kwargs):
+        paths = {
+            'actuals_path': self._fixture_path('pa_datapoints.csv'),
+            'locations_path': self._fixture_path('locations.csv'),
+            'patterns_path': self._fixture_path('patterns.csv'),
+            'terminals_path': self._fixture_path('terminal_datapoints.csv'),
+            'vehicles_path': self._fixture_path('vehicle_datapoints.csv')
+        }
+        paths.update(kwargs)
+        return SubwayPipeline(**paths)
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
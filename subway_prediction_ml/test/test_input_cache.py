@@ -0,0 +1,76 @@
+import glob
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from input_cache import InputCache
+
+
+class TestInputCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.directory.name, 'actuals.csv')
+        self.cache = InputCache(os.path.join(self.directory.name, 'cache'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_caches_only_requested_columns(self):
+        self._write_source([['_raw text', '70002', 1558112490]])
+
+        result = self.cache.read_csv(
+            self.source_path,
+            ['stop_id', 'time', 'missing'],
+            {'stop_id': str}
+        )
+        cached = pd.read_parquet(self._cache_entries()[0])
+
+        assert result.__array__().tolist() == [['70002', 1558112490]]
+        assert cached.columns.tolist() == ['stop_id', 'time']
+        assert cached['stop_id'].tolist() == ['70002']
+
+    def test_reads_fresh_entries_from_cache(self):
+        self._write_source([['_raw text', '70002', 1558112490]])
+        self.cache.read_csv(self.source_path, ['stop_id', 'time'])
+
+        # Overwrite the entry to prove the second read comes from it
+        entry_path = self._cache_entries()[0]
+        pd.DataFrame({'stop_id': ['cached'], 'time': [1]}). \
+            to_parquet(entry_path, index=False)
+
+        result = self.cache.read_csv(self.source_path, ['stop_id', 'time'])
+        assert result.__array__().tolist() == [['cached', 1]]
+
+    def test_rebuilds_stale_entries(self):
+        self._write_source([['_raw text', '70002', 1558112490]])
+        self.cache.read_csv(self.source_path, ['stop_id', 'time'])
+
+        self._write_source([
+            ['_raw text', '70078', 1558112500],
+            ['_raw text', '70080', 1558112600]
+        ])
+        result = self.cache.read_csv(self.source_path, ['stop_id', 'time'])
+
+        assert result.__array__().tolist() == [
+            [70078, 1558112500],
+            [70080, 1558112600]
+        ]
+        assert len(self._cache_entries()) == 1
+
+    def _cache_entries(self):
+        return glob.glob(
+            os.path.join(self.directory.name, 'cache', '*.parquet')
+        )
+
+    def _write_source(self, data):
+        pd.DataFrame(columns=['_raw', 'stop_id', 'time'], data=data). \
+            to_csv(self.source_path, index=False)
+        # Make sure the modification time moves even on coarse clocks
+        stat = os.stat(self.source_path)
+        os.utime(
+            self.source_path,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + len(data) * 1000000000)
+        )
@@ -0,0 +1,65 @@
+from math import nan
+import os
+import pandas as pd
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from location_id_translator import LocationIdTranslator
+from location_registry import LocationRegistry
+
+
+class TestLocationRegistry(unittest.TestCase):
+    def setUp(self):
+        self.locations = pd.DataFrame(
+            columns=['loc_id', 'line', 'gtfs_stop_id'],
+            data=[
+                ['44--72', 'R', '70063'],
+                ['42--70', 'R', 'Alewife-01'],
+                ['43--71', 'O', '0'],
+                ['45--73', 'O', nan],
+                ['41--69', 'B', '70038']
+            ]
+        )
+        self.registry = LocationRegistry(self.locations)
+
+    def test_codes_are_grouped_by_route(self):
+        assert self.registry.loc_ids.tolist() == \
+            ['41--69', '43--71', '45--73', '42--70', '44--72']
+        assert self.registry.route_codes('R') == slice(3, 5)
+        assert self.registry.route_loc_ids('O').tolist() == \
+            ['43--71', '45--73']
+        assert self.registry.route_loc_ids('G').tolist() == []
+        assert len(self.registry.route_loc_ids()) == 5
+
+    def test_encode_and_translate(self):
+        loc_ids = ['44--72', '42--70', '99--99', '43--71', nan]
+
+        assert self.registry.encode(loc_ids).tolist() == [4, 3, -1, 1, -1]
+        assert self.registry.encode(
+            pd.Series(loc_ids, dtype='category')
+        ).tolist() == [4, 3, -1, 1, -1]
+        assert self.registry.translate(loc_ids).tolist() == \
+            ['70063', '70061', None, None, None]
+
+    def test_duplicate_loc_ids_translate_to_their_last_stop(self):
+        registry = LocationRegistry(pd.DataFrame(
+            columns=['loc_id', 'line', 'gtfs_stop_id'],
+            data=[
+                ['44--72', 'R', '70063'],
+                ['44--72', 'O', '70064'],
+                ['42--70', 'R', '70061'],
+                ['42--70', 'R', '0']
+            ]
+        ))
+
+        assert registry.route_loc_ids('R').tolist() == ['42--70', '44--72']
+        assert registry.translate(['44--72', '42--70']).tolist() == \
+            ['70064', '70061']
+
+    def test_translator_delegates_to_the_registry(self):
+        translator = LocationIdTranslator(None, self.registry)
+
+        assert translator.get('42--70') == '70061'
+        assert translator.get('45--73') is None
+        assert translator.all_translated() == {'70061', '70063', '70038'}
@@ -2,6 +2,8 @@ import os
 import pandas as pd
 import sys
 import unittest
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import FunctionTransformer
 
 sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
 from locations_adder import LocationsAdder
@@ -61,3 +63,88 @@ class TestLocationsAdder(unittest.TestCase):
             ['B-111', 12347, '44--72', 0.0, 1.0],
             ['B-112', 12345, '44--72', 1.0, 1.0]
         ]
+
+    def test_sparse_mode_gathers_n_hot_rows_by_generation(self):
+        locations_data = pd.DataFrame(
+            columns=["loc_id"],
+            data=[["42--70"], ["43--71"], ["44--72"], ["45--73"]]
+        )
+
+        vehicle_data = pd.DataFrame(
+            columns=['trip_id', 'generation', 'current_location_id'],
+            data=[
+                ['B-111', 12345, "42--70"],
+                ['B-112', 12345, "44--72"],
+                ['B-111', 12346, "43--71"],
+                ['B-112', 12346, "45--73"],
+                ['B-111', 12347, "44--72"]
+            ]
+        )
+
+        adder = LocationsAdder(locations_data, sparse=True)
+        result = adder.fit_transform(vehicle_data)
+        assert result.columns.tolist() == \
+            ['trip_id', 'generation', 'current_location_id']
+
+        n_hot = adder.n_hot_locations(
+            pd.DataFrame({'generation': [12347, 12345, 12345, 99999]})
+        )
+        assert n_hot.format == 'csr'
+        assert n_hot.toarray().tolist() == [
+            [0.0, 0.0, 1.0, 0.0],
+            [1.0, 0.0, 1.0, 0.0],
+            [1.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 0.0],
+        ]
+
+    def test_fitted_transformers_gather_from_the_latest_transform(self):
+        locations_data = pd.DataFrame(
+            columns=["loc_id"],
+            data=[["42--70"], ["43--71"]]
+        )
+        adder = LocationsAdder(locations_data, sparse=True)
+        column_transformer = ColumnTransformer([(
+            'locations',
+            FunctionTransformer(adder.n_hot_locations),
+            ['generation']
+        )])
+
+        column_transformer.fit(adder.fit_transform(pd.DataFrame(
+            columns=['generation', 'current_location_id'],
+            data=[[12345, "42--70"]]
+        )))
+        new_data = adder.transform(pd.DataFrame(
+            columns=['generation', 'current_location_id'],
+            data=[[12346, "43--71"]]
+        ))
+        assert column_transformer.transform(new_data).tolist() == \
+            [[0.0, 1.0]]
+
+    def test_all_locations_are_sorted_across_lines(self):
+        locations_data = pd.DataFrame(
+            columns=["loc_id", "line"],
+            data=[
+                ["42--70", "R"],
+                ["43--71", "O"],
+                ["44--72", "R"],
+                ["45--73", "G"]
+            ]
+        )
+
+        vehicle_data = pd.DataFrame(
+            columns=['trip_id', 'generation', 'current_location_id'],
+            data=[
+                ['B-111', 12345, "43--71"],
+                ['B-112', 12345, "45--73"]
+            ]
+        )
+        adder = LocationsAdder(locations_data)
+        result = adder.fit_transform(vehicle_data)
+        assert adder.all_locs_sorted() == \
+            ["42--70", "43--71", "44--72", "45--73"]
+        assert result[adder.all_locs_sorted()].__array__().tolist() == [
+            [0.0, 1.0, 0.0, 1.0],
+            [0.0, 1.0, 0.0, 1.0]
+        ]
+        assert adder.location_columns(["45--73", "99--99"]).tolist() == \
+            [3, -1]
@@ -0,0 +1,74 @@
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from ml_datapoint_parser import MlDatapointParser
+
+LOG_LINES = [
+    "2019-05-17 13:00:50.384 [info] ml_datapoint vehicle_datapoint "
+    "generation=1558017621 timestamp=2019-05-17T17:00:50.382349Z "
+    "vehicle_id=O-545D411E current_location_id=42.305955--71.110560 "
+    "length_of_time_at_current_location=2 ocs_trip_id=986BC944 "
+    "gtfs_trip_id=40034036 pattern_id=2 "
+    "offset_departure_seconds_from_now=430",
+    "2019-05-17 13:00:50.383 [info] ml_datapoint terminal_datapoint "
+    "generation=1558017621 timestamp=2019-05-17T17:00:50.382349Z "
+    "terminal_stop_id=70038 automatic=false",
+    "13:00:33.635 [info] ml_datapoint vehicle_id=O-545D411E "
+    "trip_id=40034036 event_type=departure stop_id=70002 time=1558112430",
+    "13:00:29.918 [info] ml_datapoint vehicle_id=R-545D477A "
+    "trip_id=ADDED-1558017353 event_type=departure stop_id=70078 time=",
+    "13:00:29.918 [info] Some other log line stop_id=70078",
+]
+
+
+class TestMlDatapointParser(unittest.TestCase):
+    def test_parses_each_kind_of_datapoint(self):
+        parsed = MlDatapointParser().parse_lines(LOG_LINES)
+
+        assert parsed['vehicles'].__array__().tolist() == [[
+            '42.305955--71.110560',
+            1558017621,
+            '40034036',
+            2,
+            '986BC944',
+            430,
+            2,
+            '2019-05-17T17:00:50.382349Z',
+            'O-545D411E'
+        ]]
+        assert parsed['terminals'].__array__().tolist() == [
+            [False, 1558017621, '70038', '2019-05-17T17:00:50.382349Z']
+        ]
+        actuals = parsed['actuals']
+        assert actuals.columns.tolist() == \
+            ['event_type', 'stop_id', 'time', 'trip_id', 'vehicle_id']
+        assert actuals['stop_id'].tolist() == ['70002', '70078']
+        assert actuals['time'].isna().tolist() == [False, True]
+        assert actuals['time'].dtype.kind == 'f'
+
+    def test_reads_gzipped_logs_in_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rtr.log.gz')
+            with gzip.open(path, 'wt') as log_file:
+                log_file.write('\n'.join(LOG_LINES * 3) + '\n')
+
+            parsed = MlDatapointParser(chunksize=2).read([path])
+
+        assert len(parsed['vehicles']) == 3
+        assert len(parsed['terminals']) == 3
+        assert len(parsed['actuals']) == 6
+        assert parsed['actuals'].index.tolist() == list(range(6))
+
+    def test_reads_raw_column_of_splunk_exports(self):
+        path = os.path.abspath(os.path.join(
+            __file__, '..', 'datasets', 'terminal_datapoints.csv'
+        ))
+        terminals = MlDatapointParser().read([path])['terminals']
+
+        assert len(terminals) == 14
+        assert terminals['terminal_stop_id'].tolist()[:2] == \
+            ['70038', '70059']
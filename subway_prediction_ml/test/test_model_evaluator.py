@@ -0,0 +1,100 @@
+import numpy as np
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from model_evaluator import ModelEvaluator
+
+
+class IdentityModel:
+    def predict(self, features):
+        return np.asarray(features)[:, 0]
+
+
+class TestModelEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.labels = np.array([100, 100, 200, 200, 500, 500, 1000, 1000])
+        errors = np.array([60, 61, -90, -91, 210, -151, 360, -240])
+        self.predictions = self.labels + errors
+        self.segments = {
+            'route': ['B', 'B', 'B', 'B', 'R', 'R', 'R', 'R'],
+            'time_bin': [1, 2, 1, 2, 1, 2, 1, 2]
+        }
+
+    def test_binned_accuracy(self):
+        evaluator = self._evaluator()
+        assert evaluator.binned_accuracy() == 5 / 8
+
+    def test_zero_accuracy_is_remembered(self):
+        evaluator = ModelEvaluator(
+            IdentityModel(),
+            np.array([[1000]]),
+            np.array([0])
+        )
+        assert evaluator.binned_accuracy() == 0.0
+
+        evaluator._in_bounds[:] = True
+        assert evaluator.binned_accuracy() == 0.0
+
+    def test_rmse(self):
+        evaluator = self._evaluator()
+        errors = self.predictions - self.labels
+        assert np.isclose(evaluator.rmse(), np.sqrt(np.mean(errors ** 2)))
+
+    def test_breakdown_by_segments_and_horizon_bin(self):
+        breakdown = self._evaluator().breakdown()
+
+        assert breakdown.index.tolist() == [
+            ('route', 'B'), ('route', 'R'),
+            ('time_bin', 1), ('time_bin', 2),
+            ('horizon_bin', '0-3'), ('horizon_bin', '3-6'),
+            ('horizon_bin', '6-12'), ('horizon_bin', '12+')
+        ]
+        assert breakdown['count'].tolist() == [4, 4, 4, 4, 2, 2, 2, 2]
+        assert breakdown['binned_accuracy'].tolist() == \
+            [0.5, 0.75, 1.0, 0.25, 0.5, 0.5, 0.5, 1.0]
+        assert np.isclose(
+            breakdown.loc[('horizon_bin', '0-3'), 'rmse'],
+            np.sqrt((60 ** 2 + 61 ** 2) / 2)
+        )
+
+    def test_breakdown_by_combined_segments(self):
+        breakdown = self._evaluator().breakdown(by=['route', 'horizon_bin'])
+
+        assert breakdown.index.names == ['route', 'horizon_bin']
+        assert breakdown.index.tolist() == [
+            ('B', '0-3'), ('B', '3-6'), ('R', '6-12'), ('R', '12+')
+        ]
+        assert breakdown['count'].tolist() == [2, 2, 2, 2]
+        assert breakdown['binned_accuracy'].tolist() == [0.5, 0.5, 0.5, 1.0]
+
+        by_time_bin = self._evaluator().breakdown(by=['time_bin'])
+        assert by_time_bin.index.name == 'time_bin'
+        assert by_time_bin['count'].tolist() == [4, 4]
+
+    def test_confidence_intervals(self):
+        evaluator = self._evaluator()
+        intervals = evaluator.confidence_intervals(
+            n_resamples=200,
+            n_jobs=2,
+            random_state=0
+        )
+
+        low, high = intervals['binned_accuracy']
+        assert 0 <= low <= evaluator.binned_accuracy() <= high <= 1
+        low, high = intervals['rmse']
+        assert low <= evaluator.rmse() <= high
+        assert intervals == evaluator.confidence_intervals(
+            n_resamples=200,
+            n_jobs=2,
+            random_state=0
+        )
+
+    def _evaluator(self):
+        return ModelEvaluator(
+            IdentityModel(),
+            self.predictions.reshape(-1, 1),
+            self.labels,
+            segments=self.segments
+        )
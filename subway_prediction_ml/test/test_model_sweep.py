@@ -0,0 +1,98 @@
+import numpy as np
+import os
+import sys
+import tempfile
+import unittest
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import LinearRegression, Ridge
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from feature_matrix_files import FeatureMatrixFiles
+from model_sweep import LEADERBOARD_COLUMNS, ModelSweep
+from subway_pipeline import SubwayPipeline
+
+CANDIDATES = {
+    'linear_regression': (LinearRegression(), {}),
+    'ridge': (Ridge(), {'alpha': [0.1, 1.0]})
+}
+
+
+class OutOfMemoryRegressor(RegressorMixin, BaseEstimator):
+    def fit(self, features, labels):
+        raise MemoryError("Unable to allocate the model")
+
+
+class TestModelSweep(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run_ranks_every_candidate(self):
+        leaderboard = self._sweep(n_jobs=1).run(self._pipeline())
+
+        assert leaderboard.columns.tolist() == LEADERBOARD_COLUMNS
+        assert sorted(leaderboard['params'].tolist()) == \
+            ['{"alpha": 0.1}', '{"alpha": 1.0}', '{}']
+        assert leaderboard['error'].isna().all()
+        assert leaderboard['rmse'].is_monotonic_increasing
+        assert (leaderboard['fit_seconds'] >= 0).all()
+
+    def test_matrices_are_cached(self):
+        sweep = self._sweep()
+        matrix_dirs = sweep.matrix_dirs(self._pipeline())
+        features, labels, _ = FeatureMatrixFiles(matrix_dirs['test']).open()
+        assert features.shape[0] == len(labels) == 1
+
+        p = self._pipeline()
+        p.load = None
+        assert sweep.matrix_dirs(p) == matrix_dirs
+        assert sweep.matrix_dirs(self._pipeline(route='R')) != matrix_dirs
+
+    def test_parallel_run_with_memory_limit_matches(self):
+        expected = self._sweep(n_jobs=1).run(self._pipeline())
+        result = self._sweep(n_jobs=2, memory_limit_mb=4096). \
+            run(self._pipeline())
+        assert np.allclose(result['rmse'], expected['rmse'])
+
+    def test_failed_candidates_are_listed_last(self):
+        sweep = self._sweep(n_jobs=1, candidates={
+            'linear_regression': (LinearRegression(), {}),
+            'out_of_memory': (OutOfMemoryRegressor(), {})
+        })
+        leaderboard = sweep.run(self._pipeline())
+
+        assert leaderboard['model'].tolist() == \
+            ['linear_regression', 'out_of_memory']
+        assert leaderboard['error'].isna().tolist() == [True, False]
+
+    def test_bad_candidates_raise(self):
+        sweep = self._sweep(n_jobs=1, candidates={
+            'ridge': (Ridge(), {'solver': ['no such solver']})
+        })
+        with self.assertRaises(ValueError):
+            sweep.run(self._pipeline())
+
+    def _sweep(self, **kwargs):
+        kwargs.setdefault('candidates', CANDIDATES)
+        return ModelSweep(
+            cache_dir=os.path.join(self.directory.name, 'cache'),
+            test_size=0.5,
+            **kwargs
+        )
+
+    def _pipeline(self, **kwargs):
+        return SubwayPipeline(
+            actuals_path=self._fixture_path('pa_datapoints.csv'),
+            locations_path=self._fixture_path('locations.csv'),
+            patterns_path=self._fixture_path('patterns.csv'),
+            terminals_path=self._fixture_path('terminal_datapoints.csv'),
+            vehicles_path=self._fixture_path('vehicle_datapoints.csv'),
+            **kwargs
+        )
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
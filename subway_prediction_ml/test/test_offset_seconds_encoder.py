@@ -30,3 +30,20 @@ class TestOffsetSecondsEncoder(unittest.TestCase):
             ['500-1000'],
             ['1000-1500']
         ])
+
+    def test_transform_bins_edges_upwards(self):
+        test_data = pd.DataFrame(
+            columns=['offset_departure_seconds_from_now'],
+            data=[[0], [500], [4999.9], [5000], [86400]]
+        )
+        result = OffsetSecondsEncoder().fit_transform(test_data)
+
+        assert result['offset_departure_seconds_from_now'].tolist() == [
+            '0-500',
+            '500-1000',
+            '4500-5000',
+            '5000+',
+            '5000+'
+        ]
+        assert result['offset_departure_seconds_from_now'].cat.codes. \
+            tolist() == [2, 3, 11, 12, 12]
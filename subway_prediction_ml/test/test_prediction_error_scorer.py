@@ -0,0 +1,82 @@
+from math import nan
+import numpy as np
+import os
+import pandas as pd
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from prediction_error_scorer import PredictionErrorScorer
+
+
+class ConstantModel:
+    def __init__(self, error):
+        self.error = error
+
+    def fit(self, features, labels):
+        self.n_labels_ = len(labels)
+        return self
+
+    def predict(self, features):
+        return np.full(features.shape[0], self.error)
+
+
+class TestPredictionErrorScorer(unittest.TestCase):
+    def setUp(self):
+        self.predictions = pd.DataFrame(
+            {
+                'predictions_route_id': ['Red', 'Red', 'Blue', 'Red'],
+                'predictions_stop_id': ['70061', '70063', '70038', '70061'],
+                'predictions_file_timestamp':
+                    [1558108800, 1558108800, 1558108800, 1558108800],
+                'predictions_arrival_time':
+                    [1558108900, 1558109400, 1558108850, 1558108900],
+                've_arrival_time': [1558108980, 1558109400, 1558108850, nan],
+                'predictions_boarding_status': [nan, nan, 'Stopped', nan],
+                'predictions_stops_away': [1, 3, 0, 1]
+            },
+            index=[10, 11, 12, 13]
+        )
+        self.scorer = PredictionErrorScorer(ConstantModel(30)). \
+            fit(self.predictions)
+
+    def test_fits_to_predictions_with_actuals(self):
+        assert self.scorer.model.n_labels_ == 3
+
+    def test_score(self):
+        scores = self.scorer.score(self.predictions)
+
+        assert scores.index.tolist() == [10, 11, 12, 13]
+        assert scores['ml_arrival_time'].tolist() == \
+            [1558108930, 1558109430, 1558108880, 1558108930]
+        assert scores['ml_error'].tolist()[:3] == [50, -30, -30]
+        assert np.isnan(scores['ml_error'][13])
+        assert scores['accuracy_bin'].tolist() == ['0-3', '6-12', '0-3', '0-3']
+        assert scores['prediction_accurate'].tolist() == \
+            [False, True, True, False]
+        assert scores['ml_accurate'].tolist() == [True, True, True, False]
+
+    def test_route_accuracy_adds_up_chunks(self):
+        chunks = [self.predictions.iloc[:2], self.predictions.iloc[2:]]
+        accuracy = self.scorer.route_accuracy(chunks)
+
+        assert accuracy.index.tolist() == ['Blue', 'Red']
+        assert accuracy['count'].tolist() == [1, 2]
+        assert accuracy['prediction_accuracy'].tolist() == [1.0, 0.5]
+        assert accuracy['ml_accuracy'].tolist() == [1.0, 1.0]
+        assert accuracy['prediction_rmse'].tolist() == \
+            [0, np.sqrt(80 ** 2 / 2)]
+        pd.testing.assert_frame_equal(
+            accuracy,
+            self.scorer.route_accuracy([self.predictions])
+        )
+
+    def test_trains_linear_regression_by_default(self):
+        scorer = PredictionErrorScorer().fit(self.predictions)
+        scores = scorer.score(self.predictions)
+
+        assert np.allclose(
+            scores['ml_error'].tolist()[:3],
+            [0, 0, 0],
+            atol=1e-6
+        )
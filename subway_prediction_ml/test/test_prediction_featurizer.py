@@ -0,0 +1,82 @@
+from math import nan
+import numpy as np
+import os
+import pandas as pd
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from prediction_featurizer import PredictionFeaturizer
+
+
+class TestPredictionFeaturizer(unittest.TestCase):
+    def setUp(self):
+        # 2019-05-17 12:00 Eastern is a Friday, in time bin 48
+        self.predictions = pd.DataFrame({
+            'predictions_stop_id': ['70063', '70061', '70063'],
+            'predictions_file_timestamp': [1558108800, 1558108800, 1558108800],
+            'predictions_arrival_time': [1558108900, 1558108700, 1558111000],
+            'predictions_boarding_status': [nan, 'Stopped', nan],
+            'predictions_stops_away': [2, 0, 5]
+        })
+        self.featurizer = PredictionFeaturizer().fit(self.predictions)
+
+    def test_features(self):
+        features = pd.DataFrame(
+            self.featurizer.transform(self.predictions).toarray(),
+            columns=self.featurizer.get_feature_names_out()
+        )
+
+        assert self.featurizer.stop_ids_.tolist() == ['70061', '70063']
+        assert features['is_stopped'].tolist() == [0, 1, 0]
+        assert features['predictions_stops_away'].tolist() == [2, 0, 5]
+        assert features['predictions_stop_id_70063'].tolist() == [1, 0, 1]
+        assert features['predictions_day_of_week_4'].tolist() == [1, 1, 1]
+        assert features['predictions_time_bin_48'].tolist() == [1, 1, 1]
+        assert features['accuracy_bin_0-3'].tolist() == [1, 0, 0]
+        assert features['accuracy_bin_na-'].tolist() == [0, 1, 0]
+        assert features['accuracy_bin_na+'].tolist() == [0, 0, 1]
+        assert features.sum(axis=1).tolist() == [6, 5, 9]
+
+    def test_missing_timestamps_get_no_day_or_time_bin_column(self):
+        predictions = self.predictions.assign(
+            predictions_file_timestamp=[1558108800, nan, 1558108800]
+        )
+        features = pd.DataFrame(
+            self.featurizer.transform(predictions).toarray(),
+            columns=self.featurizer.get_feature_names_out()
+        )
+        day_columns = features.columns.str.startswith(
+            'predictions_day_of_week_'
+        )
+        time_bin_columns = features.columns.str.startswith(
+            'predictions_time_bin_'
+        )
+
+        assert features.loc[:, day_columns].sum(axis=1).tolist() == [1, 0, 1]
+        assert features.loc[:, time_bin_columns].sum(axis=1).tolist() == \
+            [1, 0, 1]
+        assert features['accuracy_bin_na+'].tolist() == [0, 1, 1]
+        assert features.sum(axis=1).tolist() == [6, 3, 9]
+
+    def test_accuracy_bins(self):
+        predictions = pd.DataFrame({
+            'predictions_file_timestamp': [0, 0, 0, 0, 0, 0, 0, 0],
+            'predictions_arrival_time':
+                [-31, -30, 179, 180, 719, 1799, 1800, nan]
+        })
+
+        assert self.featurizer.accuracy_bins(predictions).tolist() == \
+            [0, 1, 1, 2, 3, 4, 5, 5]
+
+    def test_unknown_stops_get_no_stop_column(self):
+        predictions = self.predictions.assign(
+            predictions_stop_id=['70065', '70061', '70063']
+        )
+        features = self.featurizer.transform(predictions)
+
+        assert features.shape == (3, self.featurizer.n_features())
+        assert np.array_equal(
+            features[:, 2:4].toarray(),
+            [[0, 0], [1, 0], [0, 1]]
+        )
@@ -0,0 +1,158 @@
+import datetime
+import os
+from math import nan
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from predictions_dataset import PredictionsDataset
+
+
+class TestPredictionsDataset(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(
+            self.directory.name,
+            'predictions.csv.gz'
+        )
+        # 2019-05-17 12:00 and 2019-05-18 02:00 Eastern are both on the
+        # service date of 2019-05-17, and 2019-05-18 12:00 is not
+        pd.DataFrame(
+            columns=[
+                'predictions_route_id',
+                'predictions_stop_id',
+                'predictions_file_timestamp',
+                'predictions_arrival_time',
+                've_arrival_time',
+                'predictions_boarding_status'
+            ],
+            data=[
+                ['Red', '70061', 1558108800, 1558108900, 1558108950, nan],
+                ['Red', '70063', 1558108800, 1558108700, 1558108710, nan],
+                ['Red', '70065', 1558159200, 1558159300, nan, 'Boarding'],
+                ['Blue', '70038', 1558195200, 1558195500, 1558196400, nan],
+                ['Mattapan', '70261', 1558108800, 1558109000, 1558109010,
+                 'Stopped']
+            ]
+        ).to_csv(self.csv_path, index=False, compression='gzip')
+        self.dataset = PredictionsDataset(
+            os.path.join(self.directory.name, 'predictions')
+        ).convert(self.csv_path, chunksize=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_convert_partitions_by_route_and_service_date(self):
+        assert sorted(os.listdir(self.dataset.dataset_dir)) == [
+            '_source.json',
+            'predictions_route_id=Blue',
+            'predictions_route_id=Mattapan',
+            'predictions_route_id=Red'
+        ]
+        assert os.listdir(os.path.join(
+            self.dataset.dataset_dir,
+            'predictions_route_id=Red'
+        )) == ['service_date=2019-05-17']
+
+    def test_load_keeps_types_and_adds_errors(self):
+        predictions = self.dataset.load(routes=['Red'])
+
+        assert predictions['predictions_stop_id'].tolist() == \
+            ['70061', '70063', '70065']
+        assert predictions['predictions_error'].tolist()[:2] == [50, 10]
+        assert predictions['predictions_boarding_status'].isna().tolist() == \
+            [True, True, False]
+
+    def test_load_filters_like_the_notebook(self):
+        predictions = self.dataset.load(
+            horizon_seconds=(-30, 30 * 60),
+            error_seconds=(-600, 600)
+        )
+        assert sorted(predictions['predictions_stop_id']) == \
+            ['70061', '70261']
+
+    def test_load_filters_service_dates_and_columns(self):
+        predictions = self.dataset.load(
+            start_date=datetime.date(2019, 5, 18),
+            columns=['predictions_stop_id', 'service_date']
+        )
+        assert predictions.columns.tolist() == \
+            ['predictions_stop_id', 'service_date']
+        assert predictions['predictions_stop_id'].tolist() == ['70038']
+
+    def test_convert_keeps_a_dataset_from_the_same_csv(self):
+        marker = os.path.join(self.dataset.dataset_dir, '_marker')
+        open(marker, 'w').close()
+        self.dataset.convert(self.csv_path)
+        assert os.path.exists(marker)
+
+        pd.read_csv(self.csv_path).iloc[3:4].to_csv(
+            self.csv_path,
+            index=False,
+            compression='gzip'
+        )
+        self.dataset.convert(self.csv_path)
+        assert not os.path.exists(marker)
+        assert self.dataset.load()['predictions_route_id'].tolist() == \
+            ['Blue']
+
+    def test_convert_gives_no_service_date_without_a_timestamp(self):
+        csv_path = os.path.join(self.directory.name, 'untimed.csv')
+        pd.DataFrame(
+            columns=[
+                'predictions_route_id',
+                'predictions_file_timestamp',
+                'predictions_arrival_time',
+                've_arrival_time'
+            ],
+            data=[
+                ['Red', 1558108800, 1558108900, 1558108950],
+                ['Red', nan, 1558108700, 1558108710]
+            ]
+        ).to_csv(csv_path, index=False)
+        dataset = PredictionsDataset(
+            os.path.join(self.directory.name, 'untimed')
+        ).convert(csv_path)
+
+        predictions = dataset.load().sort_values('predictions_arrival_time')
+        assert predictions['service_date'].isna().tolist() == [True, False]
+        assert predictions['service_date'].iloc[1] == '2019-05-17'
+        assert predictions['predictions_error'].tolist() == [10, 50]
+
+    def test_convert_types_columns_by_the_schema_not_the_first_chunk(self):
+        csv_path = os.path.join(self.directory.name, 'typed.csv')
+        pd.DataFrame(
+            columns=[
+                'predictions_route_id',
+                'predictions_trip_id',
+                'predictions_file_timestamp',
+                'predictions_arrival_time',
+                'predictions_stops_away',
+                've_arrival_time'
+            ],
+            data=[
+                ['Red', '39783376', 1558108800, 1558108900, nan, nan],
+                ['Red', 'ADDED-1553782585', 1558108800, 1558108700, 3,
+                 1558108710]
+            ]
+        ).to_csv(csv_path, index=False)
+        dataset = PredictionsDataset(
+            os.path.join(self.directory.name, 'typed')
+        ).convert(csv_path, chunksize=1)
+
+        predictions = dataset.load().sort_values('predictions_arrival_time')
+        assert predictions['predictions_trip_id'].tolist() == \
+            ['ADDED-1553782585', '39783376']
+        assert predictions['predictions_stops_away'].dtype == 'float64'
+        assert predictions['predictions_stops_away'].iloc[0] == 3
+
+    def test_chunks_match_load(self):
+        chunks = list(self.dataset.chunks(chunksize=1, routes=['Red']))
+
+        assert [len(chunk) for chunk in chunks] == [1, 1, 1]
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True),
+            self.dataset.load(routes=['Red'])
+        )
@@ -0,0 +1,74 @@
+import datetime
+import os
+import pandas as pd
+import pytz
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from service_time import ServiceTime
+
+
+class TestServiceTime(unittest.TestCase):
+    def test_parses_timestamp_strings(self):
+        times = ServiceTime(pd.Series([
+            '2019-06-02T15:58:00.000000Z',
+            '2019-05-17T17:00:50.382349Z'
+        ]))
+        assert times.epoch_seconds().tolist() == [
+            1559491080.0,
+            1558112450.382349
+        ]
+        assert times.weekdays().tolist() == [6, 4]
+        assert times.time_bins().tolist() == [63, 68]
+
+    def test_service_dates_match_per_row_conversion_across_dst(self):
+        # Spans both 2019 DST transitions, hour by hour
+        spring_forward = 1552183200  # March 10, 2019, 2:00 AM EST
+        fall_back = 1572757200  # November 3, 2019, 1:00 AM EST
+        timestamps = [
+            base + offset
+            for base in [spring_forward, fall_back]
+            for offset in range(-86400, 86400, 1800)
+        ]
+
+        result = ServiceTime(pd.Series(timestamps)).service_dates().tolist()
+        assert result == [
+            self._service_date_per_row(t) for t in timestamps
+        ]
+
+    def test_local_weekdays_and_time_bins_across_dst(self):
+        spring_forward = 1552183200
+        fall_back = 1572757200
+        timestamps = [
+            base + offset
+            for base in [spring_forward, fall_back]
+            for offset in range(-86400, 86400, 1800)
+        ]
+        local_times = [
+            datetime.datetime.fromtimestamp(t, tz=pytz.UTC).
+            astimezone(pytz.timezone('America/New_York'))
+            for t in timestamps
+        ]
+
+        times = ServiceTime(pd.Series(timestamps))
+        assert times.local_weekdays().tolist() == \
+            [local_time.weekday() for local_time in local_times]
+        assert times.local_time_bins().tolist() == [
+            local_time.hour * 4 + local_time.minute // 15
+            for local_time in local_times
+        ]
+
+    def test_string_and_epoch_timestamps_agree(self):
+        strings = ServiceTime(pd.Series(['2019-06-06T06:59:59.000000Z']))
+        epochs = ServiceTime(pd.Series([1559804399]))
+
+        assert strings.service_dates().tolist() == \
+            epochs.service_dates().tolist() == \
+            [datetime.date(2019, 6, 5).toordinal()]
+
+    def _service_date_per_row(self, timestamp):
+        adjusted_time = datetime.datetime. \
+            fromtimestamp(timestamp - 10800, tz=pytz.UTC). \
+            astimezone(pytz.timezone('America/New_York'))
+        return adjusted_time.toordinal()
@@ -0,0 +1,27 @@
+import numpy as np
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from sorted_key_index import SortedKeyIndex
+
+
+class TestSortedKeyIndex(unittest.TestCase):
+    def test_lookup(self):
+        index = SortedKeyIndex([5, 3, 5, 9, 3, 5])
+        starts, counts = index.lookup([5, 4, 9, -1, 10])
+
+        assert counts.tolist() == [3, 0, 1, 0, 0]
+        assert index.order[starts[0]:starts[0] + 3].tolist() == [0, 2, 5]
+
+    def test_gather_orders_rows_like_a_merge(self):
+        index = SortedKeyIndex([5, 3, 5, 9, 3, 5])
+        key_rows, indexed_rows = index.gather([3, 7, 5])
+
+        assert key_rows.tolist() == [0, 0, 2, 2, 2]
+        assert indexed_rows.tolist() == [1, 4, 0, 2, 5]
+
+    def test_empty_index(self):
+        key_rows, indexed_rows = SortedKeyIndex([]).gather(np.array([1, 2]))
+        assert len(key_rows) == 0 and len(indexed_rows) == 0
@@ -0,0 +1,84 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import unittest
+from sklearn.preprocessing import OneHotEncoder
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from sparse_one_hot_encoder import SparseOneHotEncoder
+
+
+class TestSparseOneHotEncoder(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'terminal_gtfs_id': ['70061', '70036', '70061', '70105'],
+            'automatic': [True, False, True, True],
+            'event_type': pd.Categorical(
+                ['departure', 'arrival', 'arrival', 'departure'],
+                categories=['departure', 'arrival', 'unused']
+            )
+        })
+
+    def test_matches_one_hot_encoder(self):
+        expected = OneHotEncoder().fit(self.frame.astype(object))
+        encoder = SparseOneHotEncoder().fit(self.frame)
+
+        assert [list(c) for c in encoder.categories_] == \
+            [list(c) for c in expected.categories_]
+        assert encoder.get_feature_names_out().tolist() == \
+            expected.get_feature_names_out().tolist()
+        assert np.array_equal(
+            encoder.transform(self.frame).toarray(),
+            expected.transform(self.frame.astype(object)).toarray()
+        )
+
+    def test_given_categories_keep_their_order(self):
+        encoder = SparseOneHotEncoder(
+            categories=[['nan', 'negative', '0-500']]
+        )
+        X = pd.DataFrame({'offset': pd.Categorical(
+            ['0-500', 'nan'],
+            categories=['0-500', 'nan']
+        )})
+
+        assert encoder.fit_transform(X).toarray().tolist() == \
+            [[0, 0, 1], [1, 0, 0]]
+
+    def test_raises_on_unknown_categories(self):
+        encoder = SparseOneHotEncoder().fit(self.frame)
+        unknown = self.frame.assign(terminal_gtfs_id='70001')
+
+        with self.assertRaisesRegex(ValueError, r"\['70001'\] in column 0"):
+            encoder.transform(unknown)
+        with self.assertRaises(ValueError):
+            SparseOneHotEncoder(categories=[['70061']]).fit(
+                self.frame[['terminal_gtfs_id']]
+            )
+
+    def test_missing_values_are_a_category_of_their_own(self):
+        frame = pd.DataFrame({
+            'destination_gtfs_id': ['70061', np.nan, '70061'],
+            'event_type': pd.Categorical(['departure', np.nan, 'arrival'])
+        })
+        expected = OneHotEncoder().fit(frame.astype(object))
+        encoder = SparseOneHotEncoder().fit(frame)
+
+        assert encoder.get_feature_names_out().tolist() == \
+            expected.get_feature_names_out().tolist()
+        assert np.array_equal(
+            encoder.transform(frame).toarray(),
+            expected.transform(frame.astype(object)).toarray()
+        )
+
+    def test_raises_on_missing_values_outside_given_categories(self):
+        encoder = SparseOneHotEncoder(categories=[['arrival', 'departure']])
+        frame = pd.DataFrame({
+            'event_type': pd.Categorical(['departure', np.nan])
+        })
+
+        with self.assertRaisesRegex(
+            ValueError,
+            r"missing values in column 0 \(event_type\) during fit"
+        ):
+            encoder.fit(frame)
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from step_profiler import StepProfiler
+from subway_pipeline import SubwayPipeline
+
+
+class TestStepProfiler(unittest.TestCase):
+    def test_profiles_each_step_of_load(self):
+        p = self._pipeline()
+        profiler = StepProfiler(trace_memory=True)
+        matrix = p.load(profiler=profiler)
+
+        assert np.array_equal(matrix, p.load())
+        report = profiler.report()
+        assert report.index.tolist() == [
+            'read_vehicle_datapoints',
+            'route_filter',
+            'timestamp_encoder',
+            'offset_seconds_encoder',
+            'terminal_modes_adder',
+            'locations_adder',
+            'actuals_adder',
+            'final_transformer'
+        ]
+        assert report['rows_out'].tolist() == [6, 2, 2, 2, 2, 2, 2, 2]
+        assert report.loc['route_filter', 'rows_in'] == 6
+        assert report.loc['final_transformer', 'columns_out'] == \
+            matrix.shape[1]
+        assert (report['traced_peak_mb'] > 0).all()
+        assert (report['output_mb'] > 0).all()
+
+        steps = json.loads(profiler.to_json())
+        assert [step['step'] for step in steps] == report.index.tolist()
+        assert 'actuals_adder' in profiler.table()
+
+    def test_adds_up_chunks(self):
+        p = self._pipeline()
+        profiler = StepProfiler()
+        p.load(chunksize=1, profiler=profiler)
+
+        report = profiler.report()
+        assert report.loc['route_filter', 'calls'] == 2
+        assert report.loc['route_filter', 'rows_in'] == 6
+        assert report.loc['final_transformer', 'calls'] == 2
+        assert report['traced_peak_mb'].isna().all()
+
+    def _pipeline(self):
+        return SubwayPipeline(
+            actuals_path=self._fixture_path('pa_datapoints.csv'),
+            locations_path=self._fixture_path('locations.csv'),
+            patterns_path=self._fixture_path('patterns.csv'),
+            terminals_path=self._fixture_path('terminal_datapoints.csv'),
+            vehicles_path=self._fixture_path('vehicle_datapoints.csv')
+        )
+
+    def _fixture_path(self, filename):
+        return os.path.abspath(
+            os.path.join(__file__, '..', 'datasets', filename)
+        )
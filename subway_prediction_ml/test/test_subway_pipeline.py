@@ -1,7 +1,11 @@
 import os
+import pandas as pd
+import pickle
 import sklearn
 import sys
+import tempfile
 import unittest
+from scipy.sparse import issparse
 
 sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
 from subway_pipeline import SubwayPipeline
@@ -16,24 +20,25 @@ class TestSubwayPipeline(unittest.TestCase):
         # it's a standard (and hopefully well-tested) component already. Hence
         # the monkeypatch, which we'll have to undo later.
 
-        self.original_scaler_method = \
-            sklearn.preprocessing.StandardScaler.fit_transform
+        self.original_scaler_methods = (
+            sklearn.preprocessing.StandardScaler.fit_transform,
+            sklearn.preprocessing.StandardScaler.transform
+        )
         sklearn.preprocessing.StandardScaler.fit_transform = (
             lambda self, X, y=None: X
         )
+        sklearn.preprocessing.StandardScaler.transform = (
+            lambda self, X, copy=None: X
+        )
 
     def tearDown(self):
-        sklearn.preprocessing.StandardScaler.fit_transform = \
-            self.original_scaler_method
+        (
+            sklearn.preprocessing.StandardScaler.fit_transform,
+            sklearn.preprocessing.StandardScaler.transform
+        ) = self.original_scaler_methods
 
     def test_load(self):
-        p = SubwayPipeline(
-            actuals_path=self._fixture_path('pa_datapoints.csv'),
-            locations_path=self._fixture_path('locations.csv'),
-            patterns_path=self._fixture_path('patterns.csv'),
-            terminals_path=self._fixture_path('terminal_datapoints.csv'),
-            vehicles_path=self._fixture_path('vehicle_datapoints.csv')
-        )
+        p = self._pipeline()
         sorted_result = sorted(p.load().tolist())
         print(sorted_result)
         assert sorted_result == [
@@ -41,6 +46,221 @@ class TestSubwayPipeline(unittest.TestCase):
             [15.617650985717773, 1.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 41.0, 4.0, 68.0, 0.0, 1.0, 0.0, 0.0]
         ]
 
+    def test_load_with_sparse_locations(self):
+        # The n-hot location columns move out of the scaled remainder into an
+        # unscaled block just before it, and nothing else changes
+        p = self._pipeline(sparse_locations=True)
+        sorted_result = sorted(p.load().tolist())
+        assert sorted_result == [
+            [15.617650985717773, 1.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 14.0, 4.0, 68.0],
+            [15.617650985717773, 1.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 41.0, 4.0, 68.0]
+        ]
+
+    def test_load_with_scheduled_run_times(self):
+        # The scheduled seconds from each vehicle's location to its
+        # destination, and whether it can't be reached, are added to the end
+        # of the remainder
+        p = self._pipeline(scheduled_run_times=True)
+        expected = sorted(self._pipeline().load().tolist())
+        sorted_result = sorted(p.load().tolist())
+        assert [row[:-2] for row in sorted_result] == expected
+        assert [row[-2:] for row in sorted_result] == [[32.0, 0.0], [0.0, 0.0]]
+        assert p.load(chunksize=1).tolist() == p.load().tolist()
+
+    def test_inputs_are_read_on_first_use(self):
+        p = self._pipeline()
+        p.actuals_path = 'missing.csv'
+        assert len(p.locations_frame) == 11
+        assert p.input_report().index.tolist() == ['locations']
+
+        p = self._pipeline().read_inputs()
+        report = p.input_report()
+        assert sorted(report.index) == \
+            ['actuals', 'locations', 'patterns', 'terminals']
+        assert report.loc['locations', 'rows'] == 11
+        assert (report['read_seconds'] + report['parse_seconds']). \
+            round(6).equals(report['seconds'].round(6))
+
+        p.load()
+        assert 'vehicles' in p.input_report().index
+
+    def test_load_from_input_cache(self):
+        expected = sorted(self._pipeline().load().tolist())
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                p = self._pipeline(cache_dir=cache_dir)
+                assert sorted(p.load().tolist()) == expected
+            assert len(os.listdir(cache_dir)) == 5
+
+    def test_load_in_chunks_matches_in_memory_load(self):
+        for sparse_locations in [False, True]:
+            p = self._pipeline(sparse_locations=sparse_locations)
+            expected = p.load().tolist()
+            for chunksize in [1, 2, 4]:
+                assert p.load(chunksize=chunksize).tolist() == expected
+
+    def test_load_in_chunks_with_sparse_output(self):
+        p = self._pipeline(sparse_output=True)
+        expected = p.load().toarray().tolist()
+        result = p.load(chunksize=1)
+        assert issparse(result)
+        assert result.toarray().tolist() == expected
+        assert p.transform(p._load_vehicle_datapoints()).toarray().tolist() \
+            == expected
+
+    def test_parallel_load_matches_serial_load(self):
+        for sparse_locations in [False, True]:
+            p = self._pipeline(sparse_locations=sparse_locations)
+            expected = p.load().tolist()
+            for chunksize in [None, 1, 2]:
+                assert p.load(chunksize=chunksize, n_jobs=2).tolist() == \
+                    expected
+
+        with self.assertRaises(ValueError):
+            p.load(n_jobs=2, profiler=object())
+
+    def test_parallel_load_of_interleaved_generations(self):
+        p = self._pipeline()
+        vehicles = p._load_vehicle_datapoints()
+        p._route_vehicles = vehicles.iloc[[0, 3, 1, 4, 2, 5]]
+        expected = p.load().tolist()
+        assert len(expected) == 2
+
+        for n_jobs in [1, 2]:
+            assert p.load(n_jobs=n_jobs, chunksize=1).tolist() == expected
+
+    def test_stream_yields_feature_frames_by_generation(self):
+        p = self._pipeline()
+        feature_frames = list(p.stream(chunksize=2))
+        assert [frame['generation'].tolist() for frame in feature_frames] == \
+            [[1558017621], [1558017620]]
+        assert 'actual_seconds_from_now' in feature_frames[0].columns
+
+    def test_fitted_pipeline_can_be_pickled_and_reused(self):
+        for sparse_locations, chunksize in [(False, None), (True, 2)]:
+            p = self._pipeline(sparse_locations=sparse_locations)
+            expected = p.load(chunksize=chunksize).tolist()
+
+            restored = pickle.loads(pickle.dumps(p))
+            for _ in range(2):
+                result = restored.transform(p._load_vehicle_datapoints())
+                assert result.tolist() == expected
+
+    def test_load_routes_matches_loading_each_route(self):
+        expected = {}
+        for route in ['B', 'R']:
+            expected[route] = self._pipeline(route=route).load().tolist()
+        assert len(expected['R']) == 6
+
+        p = self._pipeline()
+        for chunksize in [None, 2]:
+            result = p.load_routes(['B', 'R'], n_jobs=2, chunksize=chunksize)
+            assert {
+                route: matrix.tolist() for route, matrix in result.items()
+            } == expected
+        assert p.route == 'B'
+        assert not hasattr(p, 'pipeline_')
+
+        route_pipeline = p.route_pipelines_['R']
+        assert route_pipeline.route == 'R'
+        assert route_pipeline.transform(
+            p._load_vehicle_datapoints()
+        ).tolist() == expected['R']
+
+    def test_transform_requires_load(self):
+        with self.assertRaises(sklearn.exceptions.NotFittedError):
+            self._pipeline().transform(pd.DataFrame())
+
+    def test_load_from_logs(self):
+        expected = sorted(self._pipeline().load().tolist())
+
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, 'ml_datapoints.log')
+            with open(log_path, 'w') as log_file:
+                for kind, filename in [
+                    (None, 'pa_datapoints.csv'),
+                    ('terminal_datapoint', 'terminal_datapoints.csv'),
+                    ('vehicle_datapoint', 'vehicle_datapoints.csv')
+                ]:
+                    log_file.writelines(self._log_lines(kind, filename))
+
+            p = self._pipeline(log_paths=[log_path])
+            assert sorted(p.load().tolist()) == expected
+            assert sorted(p.load(chunksize=2).tolist()) == expected
+
+    def test_load_from_splunk_exports(self):
+        expected = sorted(self._pipeline().load().tolist())
+        exports = [
+            (None, 'pa_datapoints.csv'),
+            ('terminal_datapoint', 'terminal_datapoints.csv'),
+            ('vehicle_datapoint', 'vehicle_datapoints.csv')
+        ]
+
+        # The fixtures' own _raw lines parse to their rows, even though
+        # they're stale
+        p = self._pipeline(
+            log_paths=[self._fixture_path(name) for _, name in exports]
+        )
+        for frame, (_, filename) in zip(
+            [
+                p.actuals_frame,
+                p.terminals_frame,
+                p._load_vehicle_datapoints()
+            ],
+            exports
+        ):
+            assert len(frame) == len(pd.read_csv(self._fixture_path(filename)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for kind, filename in exports:
+                frame = pd.read_csv(self._fixture_path(filename), dtype=str)
+                frame['_raw'] = [
+                    line.rstrip('\n')
+                    for line in self._log_lines(kind, filename)
+                ]
+                paths.append(os.path.join(directory, filename))
+                frame.to_csv(paths[-1], index=False)
+
+            p = self._pipeline(log_paths=paths)
+            assert sorted(p.load().tolist()) == expected
+
+    # The _raw column of the fixtures doesn't always agree with the other
+    # columns, so rebuild log lines from the columns themselves
+    def _log_lines(self, kind, filename):
+        frame = pd.read_csv(self._fixture_path(filename), dtype=str). \
+            drop(columns='_raw')
+        fields = [
+            column for column in frame.columns
+            if column in [
+                'automatic', 'current_location_id', 'event_type',
+                'generation', 'gtfs_trip_id',
+                'length_of_time_at_current_location', 'ocs_trip_id',
+                'offset_departure_seconds_from_now', 'pattern_id',
+                'stop_id', 'terminal_stop_id', 'time', 'timestamp',
+                'trip_id', 'vehicle_id'
+            ]
+        ]
+        prefix = '13:00:50.383 [info] ml_datapoint ' + \
+            (f'{kind} ' if kind else '')
+        for _, row in frame.iterrows():
+            values = ' '.join(
+                f"{field}={'' if pd.isna(row[field]) else row[field]}"
+                for field in fields
+            )
+            yield f'{prefix}{values}\n'
+
+    def _pipeline(self, **kwargs):
+        return SubwayPipeline(
+            actuals_path=self._fixture_path('pa_datapoints.csv'),
+            locations_path=self._fixture_path('locations.csv'),
+            patterns_path=self._fixture_path('patterns.csv'),
+            terminals_path=self._fixture_path('terminal_datapoints.csv'),
+            vehicles_path=self._fixture_path('vehicle_datapoints.csv'),
+            **kwargs
+        )
+
     def _fixture_path(self, filename):
         return os.path.abspath(
             os.path.join(__file__, '..', 'datasets', filename)
@@ -0,0 +1,81 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from service_time import ServiceTime
+from subway_pipeline import SubwayPipeline
+from synthetic_data import SyntheticDataGenerator
+
+
+class TestSyntheticDataGenerator(unittest.TestCase):
+    def test_sizes(self):
+        generator = SyntheticDataGenerator.for_vehicle_rows(
+            3000,
+            vehicles_per_route=5
+        )
+        vehicles = generator.vehicle_datapoints(0, generator.n_generations)
+
+        assert len(vehicles) == 3000
+        assert vehicles['generation'].nunique() == 200
+        assert len(generator.terminal_datapoints(0, 200)) == 200 * 6
+
+    # Only the random offsets, terminal modes and noise depend on how the
+    # rows are split into blocks
+    def test_blocks_match_a_single_pass(self):
+        paths = [
+            self._write(rows_per_block=rows_per_block)
+            for rows_per_block in [1000000, 100]
+        ]
+        for key in ['locations_path', 'patterns_path']:
+            with open(paths[0][key]) as whole, open(paths[1][key]) as blocks:
+                assert whole.read() == blocks.read()
+
+        whole, blocks = [
+            pd.read_csv(path['vehicles_path']).drop(
+                columns='offset_departure_seconds_from_now'
+            )
+            for path in paths
+        ]
+        assert whole.equals(blocks)
+
+    def test_trips_have_actuals_after_each_datapoint(self):
+        generator = SyntheticDataGenerator(
+            n_generations=360,
+            vehicles_per_route=2,
+            duplicate_fraction=0
+        )
+        vehicles = generator.vehicle_datapoints(0, 360)
+        actuals = generator.actuals(0, 360).dropna()
+        actuals = actuals[~actuals['trip_id'].str.startswith('CR-')]
+
+        last_actuals = actuals.groupby('trip_id')['time'].max()
+        vehicle_times = ServiceTime(vehicles['timestamp']).epoch_seconds()
+        assert vehicles['gtfs_trip_id'].isin(last_actuals.index).all()
+        assert (
+            last_actuals[vehicles['gtfs_trip_id']].to_numpy() > vehicle_times
+        ).mean() > 0.9
+        assert np.array_equal(vehicle_times, vehicles['generation'])
+
+    def test_pipeline_loads_generated_data(self):
+        p = SubwayPipeline(**self._write())
+        matrix = p.load()
+
+        assert matrix.shape[0] > 0
+        assert np.array_equal(p.load(chunksize=50), matrix)
+
+    def _write(self, **kwargs):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(self._remove, directory)
+        return SyntheticDataGenerator(
+            n_generations=60,
+            vehicles_per_route=3
+        ).write(directory, **kwargs)
+
+    def _remove(self, directory):
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
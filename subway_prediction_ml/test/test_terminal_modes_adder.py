@@ -65,6 +65,12 @@ class TestTerminalModesAdder(unittest.TestCase):
         )
         result = adder.fit_transform(vehicle_data).__array__().tolist()
 
+        # Transforming again only uses the lookup tables built by fit
+        adder.locations_frame = None
+        adder.patterns_frame = None
+        adder.terminals_frame = None
+        assert adder.transform(vehicle_data).__array__().tolist() == result
+
         assert sorted(result) == [
             ['B-111', 12344, 'vehicle_timestamp3', '70059', False],
             ['B-111', 12345, 'vehicle_timestamp1', '70059', True],
@@ -75,3 +81,54 @@ class TestTerminalModesAdder(unittest.TestCase):
             ['B-212', 12344, 'vehicle_timestamp8', '70038', True],
             ['B-212', 12345, 'vehicle_timestamp6', '70038', False]
         ]
+
+    def test_drops_unmatched_rows_and_keeps_column_order(self):
+        locations_data = pd.DataFrame(
+            columns=['loc_id', 'gtfs_stop_id'],
+            data=[['42.413524--70.991670', '70060']]
+        )
+        patterns_data = pd.DataFrame(
+            columns=['pattern_id', 'terminal_stop'],
+            data=[
+                [8, '42.413524--70.991670|42.413524--70.991671'],
+                [9, '42.0--71.0']
+            ]
+        )
+        terminals_data = pd.DataFrame(
+            columns=['terminal_stop_id', 'generation', 'automatic'],
+            data=[
+                ['70059', 12345, True],
+                ['70059', 12345, False],
+                ['70059', 12344, False]
+            ]
+        )
+        vehicle_data = pd.DataFrame(
+            columns=['generation', 'pattern_id', 'vehicle_id'],
+            data=[
+                [12345, 8, 'B-1'],
+                [12346, 8, 'B-2'],
+                [12344, 9, 'B-3'],
+                [12344, 7, 'B-4'],
+                [12344, 8, 'B-5']
+            ],
+            index=[10, 11, 12, 13, 14]
+        )
+
+        result = TerminalModesAdder(
+            locations_data,
+            patterns_data,
+            terminals_data
+        ).fit_transform(vehicle_data)
+
+        assert result.columns.tolist() == \
+            ['generation', 'vehicle_id', 'terminal_gtfs_id', 'automatic']
+        assert result.index.tolist() == [0, 1, 2]
+        assert isinstance(
+            result['terminal_gtfs_id'].dtype,
+            pd.CategoricalDtype
+        )
+        assert result.__array__().tolist() == [
+            [12345, 'B-1', '70059', True],
+            [12345, 'B-1', '70059', False],
+            [12344, 'B-5', '70059', False]
+        ]
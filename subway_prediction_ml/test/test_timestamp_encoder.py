@@ -8,7 +8,7 @@ from timestamp_encoder import TimestampEncoder
 
 
 class TestTimestampEncoder(unittest.TestCase):
-    def test_transform_adds_day_of_week_and_binned_time_of_day(self):
+    def test_transform_adds_time_features_and_parsed_times(self):
         test_data = pd.DataFrame(
             columns=['timestamp'],
             data=[
@@ -24,8 +24,33 @@ class TestTimestampEncoder(unittest.TestCase):
             tolist()
         assert(
             result == [
-                ['2019-06-02T15:58:00.000000Z', 6, 63],
-                ['2019-06-03T14:58:00.000000Z', 0, 59],
-                ['2019-06-03T15:58:00.000000Z', 0, 63]
+                ['2019-06-02T15:58:00.000000Z', 6, 63, 1559491080.0, 737212],
+                ['2019-06-03T14:58:00.000000Z', 0, 59, 1559573880.0, 737213],
+                ['2019-06-03T15:58:00.000000Z', 0, 63, 1559577480.0, 737213]
             ]
         )
+
+    def test_transform_encodes_stored_epoch_seconds(self):
+        test_data = pd.DataFrame({
+            'timestamp': ['unparsed', 'unparsed'],
+            'epoch_seconds': [1559491080.0, 1559573880.0]
+        })
+
+        result = TimestampEncoder().fit_transform(test_data)
+        assert(result['day_of_week'].tolist() == [6, 0])
+        assert(result['time_bin'].tolist() == [63, 59])
+        assert(result['service_date'].tolist() == [737212, 737213])
+
+    def test_transform_parses_timestamps_with_gaps_in_epoch_seconds(self):
+        test_data = pd.DataFrame({
+            'timestamp': [
+                '2019-06-02T15:58:00.000000Z',
+                '2019-06-03T14:58:00.000000Z'
+            ],
+            'epoch_seconds': [1559491080.0, None]
+        })
+
+        result = TimestampEncoder().fit_transform(test_data)
+        assert(
+            result['epoch_seconds'].tolist() == [1559491080.0, 1559573880.0]
+        )
@@ -0,0 +1,64 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(__file__, '..', '..')))
+from location_registry import LocationRegistry
+from track_graph import TrackGraph
+
+
+class TestTrackGraph(unittest.TestCase):
+    # a -> b -> c, where the line branches to d or to Alewife's platform e,
+    # with a shortcut from a to d
+    def setUp(self):
+        self.locations = pd.DataFrame({
+            'loc_id': ['a', 'b', 'c', 'd', 'e'],
+            'line': ['R', 'R', 'R', 'R', 'R'],
+            'gtfs_stop_id': ['70001', '0', None, '70004', 'Alewife-01'],
+            'next_loc_ids': ['b|d', 'c', 'd|e', None, None],
+            'default_rt': [10.0, 20.0, 30.0, None, None],
+            'latitude': [42.0, 42.001, 42.002, 42.003, 42.004],
+            'longitude': [-71.0] * 5
+        })
+
+    def test_shortest_paths_to_downstream_stops(self):
+        graph = TrackGraph(self.locations)
+        loc_ids = ['a', 'a', 'b', 'c', 'e', 'a']
+        gtfs_ids = ['70001', '70004', '70004', '70061', '70061', '70061']
+
+        assert np.allclose(
+            graph.run_seconds(loc_ids, gtfs_ids),
+            [0, 10, 50, 30, 0, 60],
+            equal_nan=True
+        )
+        assert graph.hops(loc_ids, gtfs_ids).tolist() == [0, 1, 2, 1, 0, 3]
+        meters = graph.meters(loc_ids, gtfs_ids)
+        assert np.allclose(meters[[0, 4]], 0)
+        assert np.allclose(meters[[2, 3]], [222.4, 222.4], atol=0.1)
+        assert np.allclose(meters[[1, 5]], [333.6, 444.8], atol=0.1)
+
+    def test_unreachable_and_unknown_pairs(self):
+        graph = TrackGraph(self.locations)
+        loc_ids = pd.Series(['d', 'e', 'x', 'a'], dtype='category')
+        gtfs_ids = pd.Series(['70001', '70004', '70004', '99999'])
+
+        assert np.isnan(graph.run_seconds(loc_ids, gtfs_ids)).all()
+        assert np.isnan(graph.meters(loc_ids, gtfs_ids)).all()
+        assert graph.hops(loc_ids, gtfs_ids).tolist() == [-1, -1, -1, -1]
+
+    def test_edges_without_measures_are_left_out_of_them(self):
+        self.locations.loc[0, 'default_rt'] = None
+        graph = TrackGraph(
+            self.locations.drop(columns=['latitude', 'longitude']),
+            LocationRegistry(self.locations)
+        )
+
+        assert graph.hops(['a'], ['70004']).tolist() == [1]
+        assert np.isnan(graph.run_seconds(['a', 'a'], ['70004', '70061'])). \
+            all()
+        assert graph.run_seconds(['b'], ['70061']).tolist() == [50]
+        assert np.isnan(graph.meters(['b'], ['70061'])).all()
+        assert graph.run_seconds(['a'], ['70004']).dtype == np.float32
+        assert graph.hops(['a'], ['70004']).dtype == np.int16
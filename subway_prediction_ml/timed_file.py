@@ -0,0 +1,38 @@
+import io
+import time
+
+# A binary file that adds up the time spent in its reads, so that reading a
+# file through a parser splits the parser's time into waiting on the file
+# and the parsing itself.
+
+# Compression of each file extension, since pandas can only infer it from a
+# path, not from an open file
+COMPRESSIONS = {
+    '.bz2': 'bz2',
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zip': 'zip',
+    '.zst': 'zstd'
+}
+
+
+class TimedFile(io.FileIO):
+    def __init__(self, path):
+        super().__init__(path, 'r')
+        self.read_seconds = 0.0
+
+    def read(self, size=-1):
+        return self._timed(super().read, size)
+
+    def readall(self):
+        return self._timed(super().readall)
+
+    def readinto(self, buffer):
+        return self._timed(super().readinto, buffer)
+
+    def _timed(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.read_seconds += time.perf_counter() - started
@@ -1,22 +1,35 @@
-from datetime import datetime
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from column_schema import FEATURE_COLUMNS
+from service_time import ServiceTime
+
+# Parses each datapoint's timestamp once, adding the day of the week and time
+# bin features along with the epoch seconds and service date, which the
+# ActualsAdder reads rather than parsing the timestamps again. Datapoints that
+# already carry their epoch seconds, as the raw vehicle datapoints of a
+# FeatureStore do, are encoded from those rather than from the timestamps.
+
 
 class TimestampEncoder(BaseEstimator, TransformerMixin):
     def fit(self, vehicle_datapoints, y=None):
         return self
 
     def transform(self, vehicle_datapoints, y=None):
-        datetimes = vehicle_datapoints['timestamp'].apply(
-            lambda timestr: datetime.strptime(timestr, "%Y-%m-%dT%H:%M:%S.%fZ")
-        )
-        vehicle_datapoints['day_of_week'] = datetimes.apply(
-            lambda datetime: datetime.weekday()
-        )
-        vehicle_datapoints['time_bin'] = datetimes.apply(
-            lambda datetime: self._time_bin(datetime)
-        )
+        times = ServiceTime(self._timestamps(vehicle_datapoints))
+        vehicle_datapoints['day_of_week'] = \
+            times.weekdays().astype(FEATURE_COLUMNS['day_of_week'])
+        vehicle_datapoints['time_bin'] = \
+            times.time_bins().astype(FEATURE_COLUMNS['time_bin'])
+        vehicle_datapoints['epoch_seconds'] = \
+            times.epoch_seconds().astype(FEATURE_COLUMNS['epoch_seconds'])
+        vehicle_datapoints['service_date'] = \
+            times.service_dates().astype(FEATURE_COLUMNS['service_date'])
         return vehicle_datapoints
 
-    def _time_bin(self, datetime):
-        return datetime.hour * 4 + datetime.minute // 15
+    # Parts stored before the epoch seconds were kept leave gaps in them, so
+    # those only stand in for the timestamps when every row has them
+    def _timestamps(self, vehicle_datapoints):
+        if 'epoch_seconds' in vehicle_datapoints.columns and \
+                vehicle_datapoints['epoch_seconds'].notna().all():
+            return vehicle_datapoints['epoch_seconds']
+        return vehicle_datapoints['timestamp']
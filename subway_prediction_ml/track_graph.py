@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+import column_schema
+from location_registry import LocationRegistry
+
+# The track topology of the locations frame, worked out once: how many
+# locations, how many seconds of scheduled running and how many meters lie
+# between every location and every GTFS stop downstream of it. Each location
+# leads to the locations in its next_loc_ids, separated by "|", taking its
+# default_rt seconds to get there. The shortest paths are found once per
+# stop, searching backwards from the stop's locations, and kept as arrays of
+# locations by stops, so a whole column of (location, stop) pairs is looked up
+# with one gather and no graph search.
+#
+# Each measure is the shortest over the paths that have it: an edge without
+# a default_rt or without coordinates at either end is left out of that
+# measure only. A stop that a location can't reach has NaN seconds and
+# meters and -1 hops, and so do unknown locations and stops.
+
+EARTH_RADIUS_METERS = 6371000
+
+
+class TrackGraph:
+    def __init__(self, locations_frame, location_registry=None):
+        self.location_registry = location_registry \
+            if location_registry is not None \
+            else LocationRegistry(locations_frame)
+
+        locations = locations_frame.drop_duplicates(subset='loc_id')
+        locations = locations[locations['loc_id'].notna()]. \
+            reset_index(drop=True)
+        gtfs_ids = self.location_registry.translate(
+            self.location_registry.loc_ids
+        )
+        is_stop = pd.notna(gtfs_ids)
+        stop_codes, stop_ids = pd.factorize(gtfs_ids[is_stop], sort=True)
+        self.stop_ids = pd.Index(np.asarray(stop_ids, dtype=object))
+
+        sources, targets, run_seconds = self._edges(locations)
+        meters = self._edge_meters(locations, sources, targets)
+        stop_locations = np.flatnonzero(is_stop)
+        self._run_seconds = self._to_stops(
+            sources, targets, run_seconds, stop_locations, stop_codes
+        ).astype(np.float32)
+        self._meters = self._to_stops(
+            sources, targets, meters, stop_locations, stop_codes
+        ).astype(np.float32)
+        hops = self._to_stops(
+            sources,
+            targets,
+            np.ones(len(sources)),
+            stop_locations,
+            stop_codes
+        )
+        self._hops = np.where(np.isnan(hops), -1, hops).astype(np.int16)
+
+    # Scheduled seconds of running from each location to each GTFS stop of
+    # a pair of columns
+    def run_seconds(self, loc_ids, gtfs_ids):
+        return self._gather(self._run_seconds, loc_ids, gtfs_ids)
+
+    # Number of moves from one location to the next between each location
+    # and each GTFS stop
+    def hops(self, loc_ids, gtfs_ids):
+        return self._gather(self._hops, loc_ids, gtfs_ids)
+
+    # Meters of track, as the crow flies between neighbouring locations, from
+    # each location to each GTFS stop
+    def meters(self, loc_ids, gtfs_ids):
+        return self._gather(self._meters, loc_ids, gtfs_ids)
+
+    # Unknown codes are -1, which picks the last row or column, the one left
+    # unreachable for them
+    def _gather(self, table, loc_ids, gtfs_ids):
+        return table[
+            self.location_registry.encode(loc_ids),
+            column_schema.positions(self.stop_ids, pd.Series(gtfs_ids))
+        ]
+
+    # The location code at each end of every edge, and the default_rt of the
+    # location the edge leaves, NaN where it has none
+    def _edges(self, locations):
+        if 'next_loc_ids' not in locations.columns:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), \
+                np.zeros(0)
+
+        next_loc_ids = locations['next_loc_ids'].dropna().astype(str). \
+            str.split('|').explode().str.strip()
+        rows = locations.index.get_indexer(next_loc_ids.index)
+        sources = self.location_registry.encode(
+            locations['loc_id'].to_numpy(dtype=object)[rows]
+        )
+        targets = self.location_registry.encode(next_loc_ids.to_numpy())
+        run_seconds = pd.to_numeric(
+            locations['default_rt'],
+            errors='coerce'
+        ).to_numpy(np.float64)[rows] \
+            if 'default_rt' in locations.columns \
+            else np.full(len(rows), np.nan)
+
+        known = (sources >= 0) & (targets >= 0) & (sources != targets)
+        return sources[known], targets[known], run_seconds[known]
+
+    # Great circle distance between the ends of each edge, NaN without
+    # coordinates
+    def _edge_meters(self, locations, sources, targets):
+        coordinates = np.full((len(self.location_registry), 2), np.nan)
+        if {'latitude', 'longitude'}.issubset(locations.columns):
+            codes = self.location_registry.encode(
+                locations['loc_id'].to_numpy(dtype=object)
+            )
+            coordinates[codes] = np.radians(
+                locations[['latitude', 'longitude']].apply(
+                    pd.to_numeric,
+                    errors='coerce'
+                ).to_numpy(np.float64)
+            )
+
+        latitudes, longitudes = coordinates[sources].T
+        next_latitudes, next_longitudes = coordinates[targets].T
+        haversine = np.sin((next_latitudes - latitudes) / 2) ** 2 + \
+            np.cos(latitudes) * np.cos(next_latitudes) * \
+            np.sin((next_longitudes - longitudes) / 2) ** 2
+        return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(haversine))
+
+    # The shortest path by the edge weights from every location to every
+    # stop, as a locations by stops table with an extra row and column of NaN
+    # for unknown codes. Each stop is as near as the nearest of its
+    # locations.
+    def _to_stops(self, sources, targets, weights, stop_locations, stop_codes):
+        n_locations = len(self.location_registry)
+        n_stops = len(self.stop_ids)
+        table = np.full((n_locations + 1, n_stops + 1), np.nan)
+        if not n_stops:
+            return table
+
+        known = ~np.isnan(weights)
+        # Keep the lightest of any parallel edges, since a sparse matrix
+        # would add them up
+        edges = pd.DataFrame({
+            'source': sources[known],
+            'target': targets[known],
+            'weight': weights[known]
+        }).groupby(['source', 'target'], sort=False)['weight'].min()
+        reversed_graph = csr_matrix(
+            (
+                edges.to_numpy(),
+                (
+                    edges.index.get_level_values('target'),
+                    edges.index.get_level_values('source')
+                )
+            ),
+            shape=(n_locations, n_locations)
+        )
+        from_stop_locations = dijkstra(
+            reversed_graph,
+            directed=True,
+            indices=stop_locations
+        )
+        to_stops = np.full((n_stops, n_locations), np.inf)
+        np.minimum.at(to_stops, stop_codes, from_stop_locations)
+        to_stops[np.isinf(to_stops)] = np.nan
+        table[:n_locations, :n_stops] = to_stops.T
+        return table